@@ -3,6 +3,7 @@
 
 from UM.i18n import i18nCatalog
 from UM.Logger import Logger
+from UM.Message import Message
 from UM.Settings.DefinitionContainer import DefinitionContainer
 from UM.OutputDevice.OutputDevicePlugin import OutputDevicePlugin
 from UM.Settings.ContainerRegistry import ContainerRegistry
@@ -18,18 +19,21 @@ from PyQt6.QtWidgets import QMessageBox
 from PyQt6.QtNetwork import QNetworkRequest, QNetworkAccessManager, QNetworkReply
 from .NetworkReplyTimeout import NetworkReplyTimeout
 from .RepetierOutputDevicePlugin import RepetierOutputDevicePlugin
-from .RepetierOutputDevice import RepetierOutputDevice
+from .RepetierInstance import RepetierInstance
+from .RepetierPreferences import RepetierPreferences
+from .RepetierInstanceTransfer import RepetierInstanceTransfer
 
 QNetworkAccessManagerOperations = QNetworkAccessManager.Operation
 QNetworkRequestKnownHeaders = QNetworkRequest.KnownHeaders
 QNetworkRequestAttributes = QNetworkRequest.Attribute
 QNetworkReplyNetworkErrors = QNetworkReply.NetworkError
 
-import re
 import os.path
 import json
 import base64
 
+from time import monotonic
+
 from typing import cast, Any, Tuple, Dict, List, Optional, TYPE_CHECKING
 if TYPE_CHECKING:
     from UM.Settings.ContainerInterface import ContainerInterface
@@ -37,6 +41,8 @@ if TYPE_CHECKING:
 catalog = i18nCatalog("cura")
 
 class DiscoverRepetierAction(MachineAction):
+    _lookup_cache_time = 60.0  # in seconds
+
     def __init__(self, parent: QObject = None) -> None:
         super().__init__("DiscoverRepetierAction", catalog.i18nc("@action", "Connect Repetier"))
 
@@ -52,10 +58,14 @@ class DiscoverRepetierAction(MachineAction):
         self._printers = [""]
         self._groups = [""]
         self._printerlist_reply = None
-        self._groupslist_reply = None
+        self._grouplist_reply = None
         self._settings_reply = None
         self._settings_reply_timeout = None # type: Optional[NetworkReplyTimeout]
 
+        # Responses to printer/info, listModelGroups and getPrinterConfig by url, so the dialog can show them
+        # right away when it is opened again; stale responses are shown while they are refreshed
+        self._lookup_cache = {} # type: Dict[str, Tuple[float, Dict[str, Any]]]
+
         self._instance_supports_appkeys = False
         self._appkey_reply = None # type: Optional[QNetworkReply]
         self._appkey_request = None # type: Optional[QNetworkRequest]
@@ -97,16 +107,11 @@ class DiscoverRepetierAction(MachineAction):
         self._instance_webcamrot90 = False
         self._instance_webcamrot270 = False
 
-        # Load keys cache from preferences
-        self._preferences = self._application.getPreferences()
-        self._preferences.addPreference("Repetier/keys_cache", "")
+        # API keys of instances that are not linked to the active machine
+        self._plugin_preferences = RepetierPreferences.getInstance()
 
-        try:
-            self._keys_cache = json.loads(self._preferences.getValue("Repetier/keys_cache"))
-        except ValueError:
-            self._keys_cache = {}
-        if not isinstance(self._keys_cache, dict):
-            self._keys_cache = {}
+        self._instance_transfer = RepetierInstanceTransfer()
+        self._instance_transfer.setUserAgent(self._user_agent)
 
         self._additional_components = None
 
@@ -129,9 +134,9 @@ class DiscoverRepetierAction(MachineAction):
             self._network_plugin.removeInstanceSignal.connect(self._onInstanceDiscovery)
             self._network_plugin.instanceListChanged.connect(self._onInstanceDiscovery)
             self.instancesChanged.emit()
-        else:
-            # Restart bonjour discovery
-            self._network_plugin.startDiscovery()
+
+        # Look for changed manual instances, and scan the network for Repetier servers
+        self._network_plugin.startDiscovery()
 
     def _onInstanceDiscovery(self, *args) -> None:
         self.instancesChanged.emit()
@@ -147,11 +152,83 @@ class DiscoverRepetierAction(MachineAction):
     def setManualInstance(self, name, address, port, path, useHttps, userName, password,repetierid):
         if not self._network_plugin:
             return
-        # This manual printer could replace a current manual printer
-        self._network_plugin.removeManualInstance(name)
-        
+        # This manual printer could replace a current manual printer; it is only reconnected if its settings changed
         self._network_plugin.addManualInstance(name, address, port, path, useHttps, userName, password, repetierid)
 
+    ##  Write the manual instances and the Repetier settings of their machines to a JSON or CSV file
+    @pyqtSlot(QUrl)
+    def exportInstances(self, file_url: QUrl) -> None:
+        registry = ContainerRegistry.getInstance()
+        records = []  # type: List[Dict[str, Any]]
+        for name, properties in self._plugin_preferences.getManualInstances().items():
+            record = dict(properties)
+            record["name"] = name
+            metadata = registry.findContainerStacksMetadata(id = name)
+            if metadata:
+                for key in RepetierInstanceTransfer.metadata_keys:
+                    if key in metadata[0]:
+                        record[key] = metadata[0][key]
+            else:
+                # The machine was not created yet; export the settings that were imported for it
+                record.update(self._plugin_preferences.getImportedSettings(name))
+                if self._plugin_preferences.getCachedApiKey(name):
+                    record["repetier_api_key"] = self._plugin_preferences.getCachedApiKey(name)
+            records.append(record)
+
+        file_path = file_url.toLocalFile()
+        try:
+            RepetierInstanceTransfer.writeFile(file_path, records)
+        except OSError as e:
+            Logger.log("e", "Could not export printers to %s: %s", file_path, str(e))
+            Message(catalog.i18nc("@info:status", "Could not export the printers: {0}").format(str(e)), title = catalog.i18nc("@info:title", "Export printers")).show()
+            return
+        Message(catalog.i18nc("@info:status", "Exported {0} printers.").format(len(records)), title = catalog.i18nc("@info:title", "Export printers")).show()
+
+    ##  Add the instances from a JSON or CSV file, after checking that their servers respond
+    @pyqtSlot(QUrl)
+    def importInstances(self, file_url: QUrl) -> None:
+        file_path = file_url.toLocalFile()
+        try:
+            (records, errors) = RepetierInstanceTransfer.readFile(file_path)
+        except (OSError, ValueError) as e:
+            Logger.log("e", "Could not import printers from %s: %s", file_path, str(e))
+            Message(catalog.i18nc("@info:status", "Could not import the printers: {0}").format(str(e)), title = catalog.i18nc("@info:title", "Import printers")).show()
+            return
+
+        self._instance_transfer.probe(records, lambda accepted, rejected: self._onImportProbed(accepted, errors + rejected))
+
+    def _onImportProbed(self, records: List[Dict[str, Any]], errors: List[str]) -> None:
+        if records and not self._network_plugin:
+            self.startDiscovery()
+        if records and self._network_plugin:
+            registry = ContainerRegistry.getInstance()
+            instances = {}  # type: Dict[str, Dict[str, Any]]
+            for record in records:
+                instances[record["name"]] = {key: record[key] for key in RepetierInstanceTransfer.instance_fields if key != "name"}
+
+                settings = {key: record[key] for key in RepetierInstanceTransfer.metadata_keys if key in record}
+                if record["repetier_id"]:
+                    settings["repetier_id"] = record["repetier_id"]  # the printer slug, which links the machine
+                stacks = registry.findContainerStacks(id = record["name"])
+                if stacks:
+                    for key, value in settings.items():
+                        stacks[0].setMetaDataEntry(key, value)
+                else:
+                    # Applied when a machine is linked to the instance (see RepetierOutputDevicePlugin)
+                    self._plugin_preferences.setImportedSettings(record["name"], settings)
+                if "repetier_api_key" in settings:
+                    self._plugin_preferences.setCachedApiKey(record["name"], settings["repetier_api_key"])
+
+            self._network_plugin.addManualInstances(instances)
+            self._plugin_preferences.flush()
+            self._network_plugin.reCheckConnections()
+
+        text = catalog.i18nc("@info:status", "Imported {0} printers.").format(len(records))
+        if errors:
+            Logger.log("w", "Printers that were not imported: %s", "; ".join(errors))
+            text += "\n" + catalog.i18nc("@info:status", "Not imported:") + "\n" + "\n".join(errors)
+        Message(text, title = catalog.i18nc("@info:title", "Import printers")).show()
+
     def _onContainerAdded(self, container: "ContainerInterface") -> None:
         # Add this action as a supported action to all machine definitions
         if (
@@ -245,8 +322,6 @@ class DiscoverRepetierAction(MachineAction):
         if not base_url or not instance:
             return
 
-        instance.getAdditionalData()
-
         self._instance_supports_appkeys = False
         self.appKeysSupportedChanged.emit()
 
@@ -257,24 +332,27 @@ class DiscoverRepetierAction(MachineAction):
         self._appkey_reply = self._network_manager.get(appkey_probe_request)
 
     @pyqtSlot(str)
-    def getPrinterList(self, base_url):        
-        self._instance_responded = False
-        Logger.log("d", "getPrinterList:base_url:" + base_url)
-        url = QUrl( base_url + "printer/info")
-        Logger.log("d", "getPrinterList:" + url.toString())
-        settings_request = QNetworkRequest(url)        
-        settings_request.setRawHeader("User-Agent".encode(), self._user_agent)
-        self._printerlist_reply=self._network_manager.get(settings_request)
+    def getPrinterList(self, base_url):
+        url = base_url + "printer/info"
+        if self._getCachedLookup(url, self._applyPrinterList):
+            return self._printers
+        if self._isLookupRunning(self._printerlist_reply, url):
+            return self._printers
+
+        Logger.log("d", "getPrinterList:" + url)
+        self._printerlist_reply = self._network_manager.get(self._createLookupRequest(url))
         return self._printers
 
     @pyqtSlot(str)
-    def getModelGroups(self, base_url,slug,key):        
-        self._instance_responded = False        
-        url = QUrl( base_url + "/printer/api/" + slug +"?a=listModelGroups&apikey=" + key)
-        Logger.log("d", "getModelGroups:" + url.toString())
-        settings_request = QNetworkRequest(url)        
-        settings_request.setRawHeader("User-Agent".encode(), self._user_agent)        
-        self._grouplist_reply=self._network_manager.get(settings_request)
+    def getModelGroups(self, base_url,slug,key):
+        url = base_url + "/printer/api/" + slug +"?a=listModelGroups&apikey=" + key
+        if self._getCachedLookup(url, self._applyModelGroups):
+            return self._groups
+        if self._isLookupRunning(self._grouplist_reply, url):
+            return self._groups
+
+        Logger.log("d", "getModelGroups:" + url)
+        self._grouplist_reply = self._network_manager.get(self._createLookupRequest(url))
         return self._groups
 
     @pyqtSlot(str, str, str, str, str, str)
@@ -288,7 +366,6 @@ class DiscoverRepetierAction(MachineAction):
         self._instance_webcamrot90 = False
         self._instance_webcamrot270 = False
         self._instance_supports_camera = False
-        self.selectedInstanceSettingsChanged.emit()
         if self._settings_reply:
             if self._settings_reply.isRunning():
                 self._settings_reply.abort()
@@ -296,21 +373,97 @@ class DiscoverRepetierAction(MachineAction):
         if self._settings_reply_timeout:
             self._settings_reply_timeout = None
         if ((api_key != "") and (api_key != None) and (work_id != "")):
-            Logger.log("d", "Trying to access Repetier instance at %s with the provided API key." % base_url)
-            Logger.log("d", "Using %s as work_id" % work_id)
-            Logger.log("d", "Using %s as api_key" % api_key)
-            url = QUrl(base_url + "/printer/api/" + work_id + "?a=getPrinterConfig&apikey=" + api_key)            
-            settings_request = QNetworkRequest(url)
-            settings_request.setRawHeader("x-api-key".encode(), api_key.encode())
-            settings_request.setRawHeader("User-Agent".encode(), self._user_agent)
-            if basic_auth_username and basic_auth_password:
-                data = base64.b64encode(("%s:%s" % (basic_auth_username, basic_auth_password)).encode()).decode("utf-8")
-                settings_request.setRawHeader("Authorization".encode(), ("Basic %s" % data).encode())
-            self._settings_reply = self._network_manager.get(settings_request)
             self._settings_instance = instance
+            url = base_url + "/printer/api/" + work_id + "?a=getPrinterConfig&apikey=" + api_key
+            if not self._getCachedLookup(url, self._applyPrinterConfig):
+                Logger.log("d", "Trying to access Repetier instance at %s with the provided API key." % base_url)
+                Logger.log("d", "Using %s as work_id" % work_id)
+                settings_request = self._createLookupRequest(url)
+                settings_request.setRawHeader("x-api-key".encode(), api_key.encode())
+                if basic_auth_username and basic_auth_password:
+                    data = base64.b64encode(("%s:%s" % (basic_auth_username, basic_auth_password)).encode()).decode("utf-8")
+                    settings_request.setRawHeader("Authorization".encode(), ("Basic %s" % data).encode())
+                self._settings_reply = self._network_manager.get(settings_request)
             self.getModelGroups(base_url,work_id,api_key)
         else:
             self.getPrinterList(base_url)
+        self.selectedInstanceSettingsChanged.emit()
+
+    ##  Forget cached responses, so they are requested again the next time they are needed
+    #   \param base_url Only forget the responses of this instance; by default all responses are forgotten
+    @pyqtSlot()
+    @pyqtSlot(str)
+    def invalidateLookups(self, base_url: str = "") -> None:
+        if not base_url:
+            self._lookup_cache = {}
+            return
+        for url in [url for url in self._lookup_cache if url.startswith(base_url)]:
+            del self._lookup_cache[url]
+
+    ##  Apply the cached response for a url, if there is one
+    #   \return True if the cached response is still fresh, False if it needs to be requested (again)
+    def _getCachedLookup(self, url: str, apply_function) -> bool:
+        cached = self._lookup_cache.get(url)
+        if not cached:
+            return False
+        apply_function(cached[1])
+        return cached[0] > monotonic()
+
+    def _isLookupRunning(self, reply: Optional[QNetworkReply], url: str) -> bool:
+        if not reply:
+            return False
+        try:
+            return reply.isRunning() and reply.request().attribute(QNetworkRequestAttributes.User) == url
+        except RuntimeError:
+            return False  # It can happen that the wrapped c++ object is already deleted.
+
+    ##  Create a request for a lookup; the url is stored with the request, so the response can be cached by url
+    def _createLookupRequest(self, url: str) -> QNetworkRequest:
+        request = QNetworkRequest(QUrl(url))
+        request.setRawHeader("User-Agent".encode(), self._user_agent)
+        request.setAttribute(QNetworkRequestAttributes.User, url)
+        return request
+
+    def _storeLookup(self, reply: QNetworkReply, json_data: Dict[str, Any]) -> None:
+        url = reply.request().attribute(QNetworkRequestAttributes.User)
+        if url:
+            self._lookup_cache[url] = (monotonic() + self._lookup_cache_time, json_data)
+
+    def _applyPrinterList(self, json_data: Dict[str, Any]) -> None:
+        if "printers" in json_data:
+            Logger.log("d", "DiscoverRepetierAction: printers: %s",len(json_data["printers"]))
+            if len(json_data["printers"])>0:
+                self._printers = [""]
+                for printerinfo in json_data["printers"]:
+                    self._printers.append(printerinfo["slug"])
+                self.printersChanged.emit()
+
+    def _applyModelGroups(self, json_data: Dict[str, Any]) -> None:
+        if "groupNames" in json_data:
+            Logger.log("d", "DiscoverRepetierAction: groupNames: %s",len(json_data["groupNames"]))
+            if len(json_data["groupNames"])>0:
+                self._groups = [""]
+                for gname in json_data["groupNames"]:
+                    self._groups.append(gname)
+                self.groupsChanged.emit()
+
+    def _applyPrinterConfig(self, json_data: Dict[str, Any]) -> None:
+        self._instance_api_key_accepted = True
+
+        if "general" in json_data and "sdcard" in json_data["general"]:
+            self._instance_supports_sd = json_data["general"]["sdcard"]
+
+        webcams = json_data.get("webcams", [])
+        if not webcams and "webcam" in json_data:
+            webcams = [json_data["webcam"]]
+        Logger.log("d", "DiscoverRepetierAction: webcams: %s", len(webcams))
+        for webcam in webcams:
+            if webcam.get("dynamicUrl", ""): #not empty string or None
+                self._instance_supports_camera = True
+                break
+
+        self._instance_responded = True
+        self.selectedInstanceSettingsChanged.emit()
 
     @pyqtSlot(str)
     def setApiKey(self, api_key: str) -> None:
@@ -318,15 +471,15 @@ class DiscoverRepetierAction(MachineAction):
         if not global_container_stack:
             return
         global_container_stack.setMetaDataEntry("repetier_api_key", api_key)
-        self._keys_cache[self.getInstanceId()] = api_key
-        keys_cache = base64.b64encode(json.dumps(self._keys_cache).encode("ascii")).decode("ascii")
-        self._preferences.setValue("Repetier/keys_cache", keys_cache)
+        # API keys are cached by the key of the instance, which is the id of the machine that is linked to it
+        self._plugin_preferences.setCachedApiKey(global_container_stack.getId(), api_key)
 
         if self._network_plugin:
             # Ensure that the connection states are refreshed.
             self._network_plugin.reCheckConnections()
 
-    #  Get the stored API key of this machine
+    #  Get the stored API key of an instance
+    #   \param instance_id The key of the instance
     #   \return key String containing the key of the machine.
     @pyqtSlot(str, result=str)
     def getApiKey(self, instance_id: str) -> str:
@@ -334,19 +487,22 @@ class DiscoverRepetierAction(MachineAction):
         if not global_container_stack:
             return ""
         Logger.log("d", "APIKEY read %s" % global_container_stack.getMetaDataEntry("repetier_api_key",""))
-        if instance_id == self.getInstanceId():
+        if instance_id == global_container_stack.getId():
             api_key = global_container_stack.getMetaDataEntry("repetier_api_key","")
         else:
-            api_key = self._keys_cache.get(instance_id, "")
+            api_key = self._plugin_preferences.getCachedApiKey(instance_id)
         return api_key
 
     selectedInstanceSettingsChanged = pyqtSignal()
 
-    @pyqtProperty(list)
+    printersChanged = pyqtSignal()
+    groupsChanged = pyqtSignal()
+
+    @pyqtProperty(list, notify = printersChanged)
     def getPrinters(self):
         return self._printers
 
-    @pyqtProperty(list)
+    @pyqtProperty(list, notify = groupsChanged)
     def getGroups(self):
         return self._groups
 
@@ -493,7 +649,7 @@ class DiscoverRepetierAction(MachineAction):
 #        if reply.operation() == QNetworkAccessManager.GetOperation:
         if reply.operation() == QNetworkAccessManagerOperations.GetOperation:
             Logger.log("d",reply.url().toString())
-            if "printer/info" in reply.url().toString():  # Repetier settings dump from printer/info:            
+            if "printer/info" in reply.url().toString():  # Repetier settings dump from printer/info:
                 if http_status_code == 200:
                     try:
                         json_data = json.loads(bytes(reply.readAll()).decode("utf-8"))
@@ -503,13 +659,8 @@ class DiscoverRepetierAction(MachineAction):
                         Logger.log("w", "Received invalid JSON from Repetier instance.")
                         json_data = {}
 
-                    if "printers" in json_data:
-                        Logger.log("d", "DiscoverRepetierAction: printers: %s",len(json_data["printers"]))
-                        if len(json_data["printers"])>0:
-                            self._printers = [""]
-                            for printerinfo in json_data["printers"]:
-                                 Logger.log("d", "Slug: %s",printerinfo["slug"])
-                                 self._printers.append(printerinfo["slug"])
+                    self._storeLookup(reply, json_data)
+                    self._applyPrinterList(json_data)
 
                     if "apikey" in json_data:
                         Logger.log("d", "DiscoverRepetierAction: apikey: %s",json_data["apikey"])
@@ -517,11 +668,9 @@ class DiscoverRepetierAction(MachineAction):
                         if not global_container_stack:
                             return
                         global_container_stack.setMetaDataEntry("repetier_api_key", json_data["apikey"])
-                        self._keys_cache[self.getInstanceId()] = json_data["apikey"]
-                        keys_cache = base64.b64encode(json.dumps(self._keys_cache).encode("ascii")).decode("ascii")
-                        self._preferences.setValue("Repetier/keys_cache", keys_cache)
+                        self._plugin_preferences.setCachedApiKey(global_container_stack.getId(), json_data["apikey"])
                         self.appKeyReceived.emit()
-            if "listModelGroups" in reply.url().toString():  # Repetier settings dump from listModelGroups:            
+            if "listModelGroups" in reply.url().toString():  # Repetier settings dump from listModelGroups:
                 if http_status_code == 200:
                     try:
                         json_data = json.loads(bytes(reply.readAll()).decode("utf-8"))
@@ -530,22 +679,13 @@ class DiscoverRepetierAction(MachineAction):
                     except json.decoder.JSONDecodeError:
                         Logger.log("w", "Received invalid JSON from Repetier instance.")
                         json_data = {}
-                    if "groupNames" in json_data:
-                        Logger.log("d", "DiscoverRepetierAction: groupNames: %s",len(json_data["groupNames"]))
-                        if len(json_data["groupNames"])>0:
-                            self._groups = [""]
-                            for gname in json_data["groupNames"]:
-                                 Logger.log("d", "groupName: %s",gname)
-                                 self._groups.append(gname)
-        if self._network_plugin:
-            # Ensure that the connection states are refreshed.
-            self._network_plugin.reCheckConnections()
 
-            if "getPrinterConfig" in reply.url().toString():  # Repetier settings dump from getPrinterConfig:            
+                    self._storeLookup(reply, json_data)
+                    self._applyModelGroups(json_data)
+
+            if "getPrinterConfig" in reply.url().toString():  # Repetier settings dump from getPrinterConfig:
                 if http_status_code == 200:
                     Logger.log("d", "API key accepted by Repetier.")
-                    self._instance_api_key_accepted = True
-
                     try:
                         json_data = json.loads(bytes(reply.readAll()).decode("utf-8"))
                         Logger.log("d",reply.url().toString())
@@ -554,42 +694,18 @@ class DiscoverRepetierAction(MachineAction):
                         Logger.log("w", "Received invalid JSON from Repetier instance.")
                         json_data = {}
 
-                    if "general" in json_data and "sdcard" in json_data["general"]:
-                        self._instance_supports_sd = json_data["general"]["sdcard"]
-
-                    if "webcam" in json_data and "dynamicUrl" in json_data["webcam"]:
-                        Logger.log("d", "DiscoverRepetierAction: Checking streamurl")
-                        Logger.log("d", "DiscoverRepetierAction: %s", reply.url())
-                        if not json_data["webcam"]["dynamicUrl"]: #empty string or None
-                             stream_url = ""
-                        else:
-                             stream_url = json_data["webcam"]["dynamicUrl"].replace("127.0.0.1",re.findall( r'[0-9]+(?:\.[0-9]+){3}', reply.url().toString())[0])
-                        Logger.log("d", "DiscoverRepetierAction: stream_url: %s",stream_url)
-                        Logger.log("d", "DiscoverRepetierAction: reply_url: %s",reply.url())
-                        if stream_url: #not empty string or None
-                            self._instance_supports_camera = True
-                    if "webcams" in json_data:
-                        Logger.log("d", "DiscoverRepetierAction: webcams: %s",len(json_data["webcams"]))
-                        if len(json_data["webcams"])>0:
-                            if "dynamicUrl" in json_data["webcams"][0]:
-                                Logger.log("d", "DiscoverRepetierAction: Checking streamurl")                                
-                                Logger.log("d", "DiscoverRepetierAction: reply_url: %s",reply.url())								
-                                stream_url = ""                                
-                                if len(re.findall( r'[0-9]+(?:\.[0-9]+){3}', reply.url().toString()))>0:
-                                     if not json_data["webcams"][0]["dynamicUrl"]: #empty string or None
-                                          stream_url = ""
-                                     else:
-                                          stream_url = json_data["webcams"][0]["dynamicUrl"].replace("127.0.0.1",re.findall( r'[0-9]+(?:\.[0-9]+){3}', reply.url().toString())[0])
-                                Logger.log("d", "DiscoverRepetierAction: stream_url: %s",stream_url)
-                                if stream_url: #not empty string or None
-                                    self._instance_supports_camera = True
-                elif http_status_code == 401:
-                    Logger.log("d", "Invalid API key for Repetier.")
+                    self._storeLookup(reply, json_data)
+                    self._applyPrinterConfig(json_data)
+                else:
+                    if http_status_code == 401:
+                        Logger.log("d", "Invalid API key for Repetier.")
+                        self._instance_in_error = True
+                    url = reply.request().attribute(QNetworkRequestAttributes.User)
+                    if url in self._lookup_cache:
+                        del self._lookup_cache[url]
                     self._instance_api_key_accepted = False
-                    self._instance_in_error = True
-
-                self._instance_responded = True
-                self.selectedInstanceSettingsChanged.emit()
+                    self._instance_responded = True
+                    self.selectedInstanceSettingsChanged.emit()
 
     def _createRequest(self, url: str, basic_auth_username: str = "", basic_auth_password: str = "") -> QNetworkRequest:
         request = QNetworkRequest(url)
@@ -614,7 +730,7 @@ class DiscoverRepetierAction(MachineAction):
         except UnicodeDecodeError:
             return source
 
-    def _getInstanceInfo(self, instance_id: str) -> Tuple[Optional[RepetierOutputDevice], str, str, str]:
+    def _getInstanceInfo(self, instance_id: str) -> Tuple[Optional[RepetierInstance], str, str, str]:
         if not self._network_plugin:
             return (None, "","","")
         instance = self._network_plugin.getInstanceById(instance_id)
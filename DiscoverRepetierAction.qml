@@ -1,5 +1,6 @@
 import QtQuick 2.1
 import QtQuick.Controls 2.0
+import QtQuick.Dialogs
 
 import UM 1.5 as UM
 import Cura 1.0 as Cura
@@ -141,11 +142,48 @@ Cura.MachineAction
                 onClicked: manager.removeManualInstance(base.selectedInstance.name)
             }
 
+            Cura.SecondaryButton
+            {
+                id: importButton
+                text: catalog.i18nc("@action:button", "Import...")
+                onClicked: importInstancesDialog.open()
+            }
+
+            Cura.SecondaryButton
+            {
+                id: exportButton
+                text: catalog.i18nc("@action:button", "Export...")
+                onClicked: exportInstancesDialog.open()
+            }
+
             Cura.SecondaryButton
             {
                 id: rediscoverButton
                 text: catalog.i18nc("@action:button", "Refresh")
-                onClicked: manager.startDiscovery()
+                onClicked:
+                {
+                    manager.invalidateLookups()
+                    manager.startDiscovery()
+                    apiCheckDelay.check()
+                }
+            }
+
+            UM.CheckBox
+            {
+                id: scanNetworkCheckBox
+                anchors.verticalCenter: parent.verticalCenter
+                text: catalog.i18nc("@label", "Scan the local network for Repetier servers")
+                checked: UM.Preferences.getValue("Repetier/scan_network")
+                onClicked: UM.Preferences.setValue("Repetier/scan_network", checked)
+            }
+
+            UM.CheckBox
+            {
+                id: backgroundMonitoringCheckBox
+                anchors.verticalCenter: parent.verticalCenter
+                text: catalog.i18nc("@label", "Monitor all printers in the background")
+                checked: UM.Preferences.getValue("Repetier/background_monitoring")
+                onClicked: UM.Preferences.setValue("Repetier/background_monitoring", checked)
             }
         }
 
@@ -191,8 +229,8 @@ Cura.MachineAction
                     onCurrentIndexChanged:
                     {
                         base.selectedInstance = listview.model[currentIndex];
-                        apiCheckDelay.throttledCheck();
 						comboGroups.clear();
+                        apiCheckDelay.throttledCheck();
                     }
 
                     Component.onCompleted: manager.startDiscovery()
@@ -297,8 +335,8 @@ Cura.MachineAction
                         text: base.selectedInstance ? Cura.ContainerManager.getContainerMetaDataEntry(base.selectedInstance.name, "repetier_api_key") : ""
                         onTextChanged:
                         {
-                            apiCheckDelay.throttledCheck()
 							comboGroups.clear()
+                            apiCheckDelay.throttledCheck()
                         }
                     }
                     Connections
@@ -496,32 +534,17 @@ Cura.MachineAction
 							}
 						}
                     }
-					Timer
+                    Connections
                     {
-                        id: groupTimer
-                        interval: 500; running: true; repeat: true
-
-                        function check()
-                        {							
-							if(base.selectedInstance != null)
-							{
-								if ((base.selectedInstance.baseURL.trim() != "") && (apiKey.text.trim() != ""))
-								{	
-									if (manager.getGroups != undefined)
-									{										
-										if (manager.getGroups.length > 0)
-										{
-											comboGroups.populateModel();
-										}
-									}
-								}
-							}							
-                        }
-                        onTriggered:
+                        target: manager
+                        function onGroupsChanged()
                         {
-							check();
+                            if(base.selectedInstance != null && apiKey.text.trim() != "")
+                            {
+                                comboGroups.populateModel();
+                            }
                         }
-                    }		
+                    }
                     UM.CheckBox
                     {
                         id: showCameraCheckBox
@@ -589,6 +612,105 @@ Cura.MachineAction
                         }
                     }
                     UM.CheckBox
+                    {
+                        id: snapshotCheckBox
+                        text: catalog.i18nc("@label", "Show webcam snapshots instead of a stream (for slow connections)")
+                        enabled: manager.instanceSupportsCamera
+                        checked: manager.instanceApiKeyAccepted && Cura.ContainerManager.getContainerMetaDataEntry(Cura.MachineManager.activeMachine.id, "repetier_webcam_snapshot") == "true"
+                        onClicked:
+                        {
+                            manager.setContainerMetaDataEntry(Cura.MachineManager.activeMachine.id, "repetier_webcam_snapshot", String(checked))
+                        }
+                    }
+                    Row
+                    {
+                        visible: snapshotCheckBox.checked
+                        spacing: UM.Theme.getSize("default_margin").width
+                        UM.Label
+                        {
+                            anchors.verticalCenter: parent.verticalCenter
+                            text: catalog.i18nc("@label", "Seconds between snapshots (0 adapts to the connection)")
+                        }
+                        Cura.TextField
+                        {
+                            id: snapshotIntervalField
+                            width: UM.Theme.getSize("default_margin").width * 4
+                            enabled: manager.instanceSupportsCamera
+                            validator: IntValidator { bottom: 0; top: 3600 }
+                            text:
+                            {
+                                var value = Cura.ContainerManager.getContainerMetaDataEntry(Cura.MachineManager.activeMachine.id, "repetier_webcam_snapshot_interval")
+                                return (value != undefined && value != "") ? value : "0"
+                            }
+                            onEditingFinished:
+                            {
+                                manager.setContainerMetaDataEntry(Cura.MachineManager.activeMachine.id, "repetier_webcam_snapshot_interval", text)
+                            }
+                        }
+                    }
+                    Row
+                    {
+                        spacing: UM.Theme.getSize("default_margin").width
+                        UM.Label
+                        {
+                            anchors.verticalCenter: parent.verticalCenter
+                            text: catalog.i18nc("@label", "Maximum webcam frame rate (0 is unlimited)")
+                        }
+                        Cura.TextField
+                        {
+                            id: maxFpsField
+                            width: UM.Theme.getSize("default_margin").width * 4
+                            enabled: manager.instanceSupportsCamera
+                            validator: IntValidator { bottom: 0; top: 60 }
+                            text:
+                            {
+                                var value = Cura.ContainerManager.getContainerMetaDataEntry(Cura.MachineManager.activeMachine.id, "repetier_webcam_max_fps")
+                                return (value != undefined && value != "") ? value : "15"
+                            }
+                            onEditingFinished:
+                            {
+                                manager.setContainerMetaDataEntry(Cura.MachineManager.activeMachine.id, "repetier_webcam_max_fps", text)
+                            }
+                        }
+                    }
+                    UM.CheckBox
+                    {
+                        id: timelapseCheckBox
+                        text: catalog.i18nc("@label", "Record a timelapse of the webcam while printing")
+                        enabled: manager.instanceSupportsCamera
+                        checked: manager.instanceApiKeyAccepted && Cura.ContainerManager.getContainerMetaDataEntry(Cura.MachineManager.activeMachine.id, "repetier_timelapse") == "true"
+                        onClicked:
+                        {
+                            manager.setContainerMetaDataEntry(Cura.MachineManager.activeMachine.id, "repetier_timelapse", String(checked))
+                        }
+                    }
+                    Row
+                    {
+                        visible: timelapseCheckBox.checked
+                        spacing: UM.Theme.getSize("default_margin").width
+                        UM.Label
+                        {
+                            anchors.verticalCenter: parent.verticalCenter
+                            text: catalog.i18nc("@label", "Seconds between timelapse frames (0 records a frame per layer)")
+                        }
+                        Cura.TextField
+                        {
+                            id: timelapseIntervalField
+                            width: UM.Theme.getSize("default_margin").width * 4
+                            enabled: manager.instanceSupportsCamera
+                            validator: IntValidator { bottom: 0; top: 3600 }
+                            text:
+                            {
+                                var value = Cura.ContainerManager.getContainerMetaDataEntry(Cura.MachineManager.activeMachine.id, "repetier_timelapse_interval")
+                                return (value != undefined && value != "") ? value : "0"
+                            }
+                            onEditingFinished:
+                            {
+                                manager.setContainerMetaDataEntry(Cura.MachineManager.activeMachine.id, "repetier_timelapse_interval", text)
+                            }
+                        }
+                    }
+                    UM.CheckBox
                     {
                         id: storeOnSdCheckBox
                         text: catalog.i18nc("@label", "Store G-code on the printer SD card")
@@ -663,6 +785,25 @@ Cura.MachineAction
         storeIndex: 4
     }
 
+    FileDialog
+    {
+        id: importInstancesDialog
+        title: catalog.i18nc("@title:window", "Import printers")
+        fileMode: FileDialog.OpenFile
+        nameFilters: [catalog.i18nc("@item:inlistbox", "Printer lists (*.json *.csv)")]
+        onAccepted: manager.importInstances(selectedFile)
+    }
+
+    FileDialog
+    {
+        id: exportInstancesDialog
+        title: catalog.i18nc("@title:window", "Export printers")
+        fileMode: FileDialog.SaveFile
+        defaultSuffix: "json"
+        nameFilters: [catalog.i18nc("@item:inlistbox", "JSON files (*.json)"), catalog.i18nc("@item:inlistbox", "CSV files (*.csv)")]
+        onAccepted: manager.exportInstances(selectedFile)
+    }
+
     UM.Dialog
     {
         id: manualPrinterDialog
@@ -785,14 +926,19 @@ Cura.MachineAction
                 text: catalog.i18nc("@action:button","Get Printers")
                 onClicked:
                     {
+                        manager.invalidateLookups("http://" + manualPrinterDialog.addressText.trim()+":"+manualPrinterDialog.portText.trim()+"/")
                         manager.getPrinterList("http://" + manualPrinterDialog.addressText.trim()+":"+manualPrinterDialog.portText.trim()+"/")
-                        if (manager.getPrinters.length>0)
-                            {
-                                comboPrinters.clear()
-                                for (var i =0;i<manager.getPrinters.length;i++)
-                                    if(comboPrinters[i] != "")
-                                        comboPrinters.append({ label: catalog.i18nc("@action:ComboBox option", manager.getPrinters[i]), key: manager.getPrinters[i] })
-                            }                        
+                    }
+                }
+                Connections
+                {
+                    target: manager
+                    function onPrintersChanged()
+                    {
+                        comboPrinters.clear()
+                        for (var i = 0; i < manager.getPrinters.length; i++)
+                            if(manager.getPrinters[i] != "")
+                                comboPrinters.append({ label: catalog.i18nc("@action:ComboBox option", manager.getPrinters[i]), key: manager.getPrinters[i] })
                     }
                 }
                 UM.Label
@@ -0,0 +1,124 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# MJPGStreamParser is released under the terms of the LGPLv3 or higher.
+
+import re
+
+from typing import List
+
+#
+# Picks apart the body of an MJPEG stream into individual jpeg frames.
+#
+# Most MJPEG servers send a multipart/x-mixed-replace response, where each part has a
+# Content-Length header. In that case the frames are sliced from the stream by their declared
+# length, so the jpeg data itself never has to be scanned. Parts without a Content-Length, and
+# streams without a multipart boundary, fall back to looking for the jpeg start and end markers.
+#
+class MJPGStreamParser:
+    _start_marker = b"\xff\xd8"
+    _end_marker = b"\xff\xd9"
+
+    _boundary_regex = re.compile(r"boundary=\"?([^\";]+)\"?", re.IGNORECASE)
+    _content_length_regex = re.compile(rb"^content-length\s*:\s*(\d+)\s*$", re.IGNORECASE | re.MULTILINE)
+
+    def __init__(self, content_type: str = "") -> None:
+        self._buffer = bytearray()
+        self._scan_index = 0  # position from which to continue looking for an end marker
+
+        self._boundary = b""
+        if content_type.strip().lower().startswith("multipart/"):
+            matches = self._boundary_regex.search(content_type)
+            if matches:
+                # Servers disagree on whether the leading dashes are part of the boundary or not,
+                # so look for the boundary without them.
+                self._boundary = matches.group(1).strip().lstrip("-").encode("latin-1")
+
+        self._in_part = False  # the headers of the current part have been read
+        self._part_length = 0  # declared length of the current part, 0 if it has no Content-Length
+
+    def isMultipart(self) -> bool:
+        return bool(self._boundary)
+
+    ##  Number of bytes that are buffered, waiting for the rest of a frame
+    def bufferSize(self) -> int:
+        return len(self._buffer)
+
+    def reset(self) -> None:
+        self._buffer = bytearray()
+        self._scan_index = 0
+        self._in_part = False
+        self._part_length = 0
+
+    ##  Add data received from the stream
+    #   \return The jpeg frames that were completed by this data, oldest first
+    def feed(self, data: bytes) -> List[bytes]:
+        self._buffer += data
+        if self._boundary:
+            return self._readParts()
+        return self._readMarkedFrames(self._buffer)
+
+    def _readParts(self) -> List[bytes]:
+        frames = []  # type: List[bytes]
+        while True:
+            if not self._in_part:
+                boundary_index = self._buffer.find(self._boundary)
+                if boundary_index == -1:
+                    # Keep the tail of the buffer, which may hold the start of the next boundary
+                    del self._buffer[:max(0, len(self._buffer) - len(self._boundary))]
+                    break
+
+                headers_start = boundary_index + len(self._boundary)
+                headers_end = self._buffer.find(b"\r\n\r\n", headers_start)
+                separator_length = 4
+                if headers_end == -1:
+                    # Some servers only use line feeds
+                    headers_end = self._buffer.find(b"\n\n", headers_start)
+                    separator_length = 2
+                if headers_end == -1:
+                    break
+
+                matches = self._content_length_regex.search(bytes(self._buffer[headers_start:headers_end]))
+                self._part_length = int(matches.group(1)) if matches else 0
+                del self._buffer[:headers_end + separator_length]
+                self._in_part = True
+
+            if self._part_length > 0:
+                if len(self._buffer) < self._part_length:
+                    break
+                frames.append(bytes(self._buffer[:self._part_length]))
+                del self._buffer[:self._part_length]
+            else:
+                # Without a Content-Length, the part ends where the next boundary starts
+                boundary_index = self._buffer.find(self._boundary)
+                if boundary_index == -1:
+                    break
+                self._scan_index = 0
+                frames.extend(self._readMarkedFrames(bytearray(self._buffer[:boundary_index])))
+                del self._buffer[:boundary_index]
+                self._scan_index = 0
+
+            self._in_part = False
+
+        return frames
+
+    def _readMarkedFrames(self, buffer: bytearray) -> List[bytes]:
+        frames = []  # type: List[bytes]
+        while True:
+            start_index = buffer.find(self._start_marker)
+            if start_index == -1:
+                # Keep the last byte, which may be the first half of a marker
+                del buffer[:max(0, len(buffer) - 1)]
+                self._scan_index = 0
+                break
+
+            end_index = buffer.find(self._end_marker, max(start_index + 2, self._scan_index))
+            if end_index == -1:
+                del buffer[:start_index]
+                # Don't scan the same data again when more data arrives
+                self._scan_index = max(2, len(buffer) - 1)
+                break
+
+            frames.append(bytes(buffer[start_index:end_index + 2]))
+            del buffer[:end_index + 2]
+            self._scan_index = 0
+
+        return frames
@@ -1,48 +1,134 @@
 # Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
 # NetworkMJPGImage is released under the terms of the LGPLv3 or higher.
 
-from PyQt6.QtCore import QUrl, pyqtProperty, pyqtSignal, pyqtSlot, QRect, QByteArray
-from PyQt6.QtGui import QImage, QPainter
-from PyQt6.QtQuick import QQuickPaintedItem
-from PyQt6.QtNetwork import QNetworkRequest, QNetworkReply, QNetworkAccessManager
+from PyQt6.QtCore import QUrl, pyqtProperty, pyqtSignal, pyqtSlot, QSize, QRectF
+from PyQt6.QtGui import QImage, QMatrix4x4, QWindow
+from PyQt6.QtQuick import QQuickItem, QSGNode, QSGSimpleTextureNode, QSGTexture, QSGTransformNode
 
 from UM.Logger import Logger
 
+from .NetworkMJPGStream import NetworkMJPGStream
+
+from typing import Optional
+
+#
+# A QQuickItem that shows a network mjpeg stream.
+#
+# The stream itself is downloaded and decoded by a NetworkMJPGStream, which is shared by all
+# items that show the same camera. Each decoded frame is uploaded directly as a scene graph
+# texture, without first being painted into an intermediate image. Frames are decoded at
+# (roughly) the size the item is displayed at, and mirroring and rotation are done by the
+# transform of the scene graph node.
 #
-# A QQuickPaintedItem that progressively downloads a network mjpeg stream,
-# picks it apart in individual jpeg frames, and paints it.
+# The number of frames that get decoded is capped by maximumFps. If decoding takes longer than
+# the frame interval allows, the frame rate is lowered automatically.
 #
-class NetworkMJPGImage(QQuickPaintedItem):
+# For slow connections, the item can instead poll single jpeg snapshots (snapshotMode). The
+# snapshots are requested conditionally, so an unchanged image is not transferred again.
+#
+# While the item is not shown (it is hidden, or its window is minimized) the stream is released,
+# so nothing is downloaded or decoded for it. It resumes as soon as the item is shown again.
+#
+# Stalled streams are reconnected automatically; connectionHealth reflects the state of the
+# connection, so it can be shown next to the image.
+#
+class NetworkMJPGImage(QQuickItem):
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
-        self._stream_buffer = QByteArray()
-        self._stream_buffer_start_index = -1
-        self._network_manager = None  # type: QNetworkAccessManager
-        self._image_request = None  # type: QNetworkRequest
-        self._image_reply = None  # type: QNetworkReply
+        self._stream = None  # type: Optional[NetworkMJPGStream]
         self._image = QImage()
-        self._image_rect = QRect()
+        self._image_changed = False  # the image needs to be uploaded to a new texture
+        self._frame_size = QSize()  # size of the camera frames, regardless of the size they are decoded at
+        self._texture = None  # type: Optional[QSGTexture]
+        self._texture_node = None  # type: Optional[QSGSimpleTextureNode]
+        self._transform_node = None  # type: Optional[QSGTransformNode]
 
         self._source_url = QUrl()
         self._started = False
+        self._window = None  # type: Optional[QWindow]
+
+        self._snapshot_mode = False
+        self._snapshot_url = QUrl()
+        self._snapshot_interval = 0  # in milliseconds, 0 means adapt the interval to the speed of the connection
 
         self._mirror = False
+        self._image_rotation = 0
+
+        self._maximum_fps = 0.0  # 0 means no limit
 
         self.setAntialiasing(True)
+        self.setFlag(QQuickItem.Flag.ItemHasContents, True)
 
     ##  Ensure that close gets called when object is destroyed
     def __del__(self) -> None:
         self.stop()
 
 
-    def paint(self, painter: "QPainter") -> None:
+    def updatePaintNode(self, old_node: Optional[QSGNode], update_data: "QQuickItem.UpdatePaintNodeData") -> Optional[QSGNode]:
+        if self._image.isNull() or not self.window():
+            self._transform_node = None
+            self._texture_node = None
+            self._texture = None
+            return None
+
+        if old_node is None or self._transform_node is None or self._texture_node is None:
+            # Keep references to the nodes, so they are not garbage collected while the scene graph uses them
+            self._transform_node = QSGTransformNode()
+            self._texture_node = QSGSimpleTextureNode()
+            self._texture_node.setFiltering(QSGTexture.Filtering.Linear)
+            self._transform_node.appendChildNode(self._texture_node)
+            self._image_changed = True
+        transform_node = self._transform_node
+
+        if self._image_changed:
+            # The node is pointed at the new texture before the reference to the previous texture is
+            # dropped, so the node never points at a released texture
+            texture = self.window().createTextureFromImage(self._image)
+            self._texture_node.setTexture(texture)
+            self._texture = texture
+            self._image_changed = False
+
+        width = self.width()
+        height = self.height()
+        if self._image_rotation % 180:
+            frame_rect = QRectF(0, 0, height, width)
+        else:
+            frame_rect = QRectF(0, 0, width, height)
+        self._texture_node.setRect(frame_rect)
+
+        # Mirror the frame, then rotate it around the center of the item
+        matrix = QMatrix4x4()
+        matrix.translate(width / 2, height / 2)
+        matrix.rotate(self._image_rotation, 0, 0, 1)
         if self._mirror:
-            painter.drawImage(self.contentsBoundingRect(), self._image.mirrored())
-            return
+            matrix.scale(1, -1)
+        matrix.translate(-frame_rect.width() / 2, -frame_rect.height() / 2)
+        transform_node.setMatrix(matrix)
 
-        painter.drawImage(self.contentsBoundingRect(), self._image)
+        return transform_node
+
+    def itemChange(self, change: "QQuickItem.ItemChange", value: "QQuickItem.ItemChangeData") -> None:
+        super().itemChange(change, value)
+        if change == QQuickItem.ItemChange.ItemSceneChange:
+            if self._window:
+                try:
+                    self._window.visibilityChanged.disconnect(self._updateSuspended)
+                except TypeError:
+                    pass
+            self._window = self.window()
+            if self._window:
+                self._window.visibilityChanged.connect(self._updateSuspended)
+            self._updateSuspended()
+        elif change == QQuickItem.ItemChange.ItemVisibleHasChanged:
+            self._updateSuspended()
+
+    def geometryChange(self, new_geometry: QRectF, old_geometry: QRectF) -> None:
+        super().geometryChange(new_geometry, old_geometry)
+        if new_geometry.size() != old_geometry.size():
+            self._updateStreamOptions()
+            self.update()
 
 
     def setSourceURL(self, source_url: "QUrl") -> None:
@@ -57,6 +143,49 @@ class NetworkMJPGImage(QQuickPaintedItem):
     sourceURLChanged = pyqtSignal()
     source = pyqtProperty(QUrl, fget = getSourceURL, fset = setSourceURL, notify = sourceURLChanged)
 
+    def setSnapshotMode(self, snapshot_mode: bool) -> None:
+        if snapshot_mode == self._snapshot_mode:
+            return
+        self._snapshot_mode = snapshot_mode
+        self.snapshotModeChanged.emit()
+        if self._started:
+            self.start()
+
+    def getSnapshotMode(self) -> bool:
+        return self._snapshot_mode
+
+    snapshotModeChanged = pyqtSignal()
+    snapshotMode = pyqtProperty(bool, fget = getSnapshotMode, fset = setSnapshotMode, notify = snapshotModeChanged)
+
+    def setSnapshotSourceURL(self, snapshot_url: "QUrl") -> None:
+        if snapshot_url == self._snapshot_url:
+            return
+        self._snapshot_url = snapshot_url
+        self.snapshotSourceURLChanged.emit()
+        if self._started and self._snapshot_mode:
+            self.start()
+
+    def getSnapshotSourceURL(self) -> "QUrl":
+        return self._snapshot_url
+
+    snapshotSourceURLChanged = pyqtSignal()
+    snapshotSource = pyqtProperty(QUrl, fget = getSnapshotSourceURL, fset = setSnapshotSourceURL, notify = snapshotSourceURLChanged)
+
+    ##  Time between snapshots in milliseconds; 0 adapts the interval to the time it takes to get a snapshot
+    def setSnapshotInterval(self, snapshot_interval: int) -> None:
+        snapshot_interval = max(0, snapshot_interval)
+        if snapshot_interval == self._snapshot_interval:
+            return
+        self._snapshot_interval = snapshot_interval
+        self.snapshotIntervalChanged.emit()
+        self._updateStreamOptions()
+
+    def getSnapshotInterval(self) -> int:
+        return self._snapshot_interval
+
+    snapshotIntervalChanged = pyqtSignal()
+    snapshotInterval = pyqtProperty(int, fget = getSnapshotInterval, fset = setSnapshotInterval, notify = snapshotIntervalChanged)
+
     def setMirror(self, mirror: bool) -> None:
         if mirror == self._mirror:
             return
@@ -70,84 +199,166 @@ class NetworkMJPGImage(QQuickPaintedItem):
     mirrorChanged = pyqtSignal()
     mirror = pyqtProperty(bool, fget = getMirror, fset = setMirror, notify = mirrorChanged)
 
+    ##  Rotation (in degrees, a multiple of 90) of the camera image.
+    #   Unlike the rotation property of the item itself, this rotates the image inside the item.
+    def setImageRotation(self, rotation: int) -> None:
+        rotation = rotation % 360
+        if rotation == self._image_rotation:
+            return
+        transposed = (rotation - self._image_rotation) % 180 != 0
+        self._image_rotation = rotation
+        self.imageRotationChanged.emit()
+        if transposed:
+            self.imageSizeChanged.emit()
+            self._updateStreamOptions()
+        self.update()
+
+    def getImageRotation(self) -> int:
+        return self._image_rotation
+
+    imageRotationChanged = pyqtSignal()
+    imageRotation = pyqtProperty(int, fget = getImageRotation, fset = setImageRotation, notify = imageRotationChanged)
+
+    ##  Maximum number of frames per second to decode and display; 0 means no limit
+    def setMaximumFps(self, maximum_fps: float) -> None:
+        maximum_fps = max(0.0, maximum_fps)
+        if maximum_fps == self._maximum_fps:
+            return
+        self._maximum_fps = maximum_fps
+        self.maximumFpsChanged.emit()
+        self._updateStreamOptions()
+
+    def getMaximumFps(self) -> float:
+        return self._maximum_fps
+
+    maximumFpsChanged = pyqtSignal()
+    maximumFps = pyqtProperty(float, fget = getMaximumFps, fset = setMaximumFps, notify = maximumFpsChanged)
+
+    statisticsChanged = pyqtSignal()
+
+    ##  Number of frames that were actually displayed during the last second
+    @pyqtProperty(float, notify = statisticsChanged)
+    def fps(self) -> float:
+        return self._stream.fps() if self._stream else 0.0
+
+    ##  Average time spent decoding a frame, in milliseconds
+    @pyqtProperty(float, notify = statisticsChanged)
+    def decodeTime(self) -> float:
+        return self._stream.decodeTime() * 1000 if self._stream else 0.0
+
+    ##  Number of frames that were skipped without decoding them since the stream was started
+    @pyqtProperty(int, notify = statisticsChanged)
+    def droppedFrames(self) -> int:
+        return self._stream.droppedFrames() if self._stream else 0
+
+    connectionHealthChanged = pyqtSignal()
+
+    ##  State of the connection to the camera: "closed", "connecting", "ok" or "reconnecting"
+    @pyqtProperty(str, notify = connectionHealthChanged)
+    def connectionHealth(self) -> str:
+        return self._stream.health() if self._stream else "closed"
+
     imageSizeChanged = pyqtSignal()
 
+    ##  Size of the camera image (after rotation), regardless of the size the frames are decoded at
     @pyqtProperty(int, notify = imageSizeChanged)
     def imageWidth(self) -> int:
-        return self._image.width()
+        if self._image_rotation % 180:
+            return self._frame_size.height()
+        return self._frame_size.width()
 
     @pyqtProperty(int, notify = imageSizeChanged)
     def imageHeight(self) -> int:
-        return self._image.height()
+        if self._image_rotation % 180:
+            return self._frame_size.width()
+        return self._frame_size.height()
 
 
     @pyqtSlot()
     def start(self) -> None:
         self.stop()  # Ensure that previous requests (if any) are stopped.
 
-        if not self._source_url:
+        if self._source_url.isEmpty() and (not self._snapshot_mode or self._snapshot_url.isEmpty()):
             Logger.log("w", "Unable to start camera stream without target!")
             return
         self._started = True
-        Logger.log("w", "MJPEG starting stream...")
-        self._image_request = QNetworkRequest(self._source_url)
-        if self._network_manager is None:
-            self._network_manager = QNetworkAccessManager()
 
-        self._image_reply = self._network_manager.get(self._image_request)
-        self._image_reply.downloadProgress.connect(self._onStreamDownloadProgress)
+        if self._isShown():
+            self._acquireStream()
 
     @pyqtSlot()
     def stop(self) -> None:
-        Logger.log("w", "MJPEG stopping stream...")	
-        self._stream_buffer = QByteArray()
-        self._stream_buffer_start_index = -1
-
-        if self._image_reply:
-            try:
-                try:
-                    self._image_reply.downloadProgress.disconnect(self._onStreamDownloadProgress)
-                except Exception:
-                    pass
-
-                if not self._image_reply.isFinished():
-                    self._image_reply.close()
-            except Exception as e:  # RuntimeError
-                pass  # It can happen that the wrapped c++ object is already deleted.
-
-            self._image_reply = None
-            self._image_request = None
-
-        self._network_manager = None
-
+        self._releaseStream()
         self._started = False
 
+    ##  The item is visible, and its window is not minimized or hidden
+    def _isShown(self) -> bool:
+        window = self.window()
+        if window is None or not self.isVisible():
+            return False
+        return window.visibility() not in (QWindow.Visibility.Hidden, QWindow.Visibility.Minimized)
 
-    def _onStreamDownloadProgress(self, bytes_received: int, bytes_total: int) -> None:
-        # An MJPG stream is (for our purpose) a stream of concatenated JPG images.
-        # JPG images start with the marker 0xFFD8, and end with 0xFFD9
-        if self._image_reply is None:
+    ##  Release the stream while the item is not shown, and acquire it again when it is
+    def _updateSuspended(self, *args) -> None:
+        if not self._started:
             return
-        self._stream_buffer += self._image_reply.readAll()
-#        if len(self._stream_buffer) > 2000000:  # No single camera frame should be 2 Mb or larger
-#            Logger.log("w", "MJPEG buffer exceeds reasonable size. Restarting stream...%d",len(self._stream_buffer))
-#            self.stop()  # resets stream buffer and start index
-#            self.start()
-#            return
-
-        if self._stream_buffer_start_index == -1:
-            self._stream_buffer_start_index = self._stream_buffer.indexOf(b'\xff\xd8')
-        stream_buffer_end_index = self._stream_buffer.lastIndexOf(b'\xff\xd9')
-        # If this happens to be more than a single frame, then so be it; the JPG decoder will
-        # ignore the extra data. We do it like this in order not to get a buildup of frames
-
-        if self._stream_buffer_start_index != -1 and stream_buffer_end_index != -1:
-            jpg_data = self._stream_buffer[self._stream_buffer_start_index:stream_buffer_end_index + 2]
-            self._stream_buffer = self._stream_buffer[stream_buffer_end_index + 2:]
-            self._stream_buffer_start_index = -1
-            self._image.loadFromData(jpg_data)
-
-            if self._image.rect() != self._image_rect:
-                self.imageSizeChanged.emit()
+        shown = self._isShown()
+        if shown and self._stream is None:
+            self._acquireStream()
+        elif not shown and self._stream is not None:
+            self._releaseStream()
+
+    def _acquireStream(self) -> None:
+        self._stream = NetworkMJPGStream.acquire(self, self._source_url, self._snapshot_url if self._snapshot_mode else None)
+        self._stream.frameDecoded.connect(self._onFrameDecoded)
+        self._stream.frameSizeChanged.connect(self._onFrameSizeChanged)
+        self._stream.statisticsChanged.connect(self.statisticsChanged)
+        self._stream.healthChanged.connect(self.connectionHealthChanged)
+        self._updateStreamOptions()
+        self.statisticsChanged.emit()
+        self.connectionHealthChanged.emit()
+
+        if not self._stream.image().isNull():
+            # The stream was already shown elsewhere
+            self._onFrameSizeChanged()
+            self._onFrameDecoded()
+
+    def _releaseStream(self) -> None:
+        if self._stream:
+            try:
+                self._stream.frameDecoded.disconnect(self._onFrameDecoded)
+                self._stream.frameSizeChanged.disconnect(self._onFrameSizeChanged)
+                self._stream.statisticsChanged.disconnect(self.statisticsChanged)
+                self._stream.healthChanged.disconnect(self.connectionHealthChanged)
+            except TypeError:
+                pass
+            self._stream.release(self)
+            self._stream = None
+            self.connectionHealthChanged.emit()
+
+    def _onFrameDecoded(self) -> None:
+        if not self._stream:
+            return
+        self._image = self._stream.image()
+        self._image_changed = True
+        self.update()
 
-            self.update()
+    def _onFrameSizeChanged(self) -> None:
+        if not self._stream:
+            return
+        frame_size = self._stream.frameSize()
+        if frame_size != self._frame_size:
+            self._frame_size = frame_size
+            self.imageSizeChanged.emit()
+
+    ##  Tell the stream what size the frames are shown at, and how often
+    def _updateStreamOptions(self) -> None:
+        if not self._stream:
+            return
+
+        device_pixel_ratio = self.window().devicePixelRatio() if self.window() else 1.0
+        target_size = QSize(round(self.width() * device_pixel_ratio), round(self.height() * device_pixel_ratio))
+        if self._image_rotation % 180:
+            target_size = target_size.transposed()
+
+        self._stream.setSubscriberOptions(self, target_size, self._maximum_fps, self._snapshot_interval)
@@ -0,0 +1,473 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# NetworkMJPGStream is released under the terms of the LGPLv3 or higher.
+
+from PyQt6.QtCore import QObject, QUrl, pyqtSignal, QSize, QByteArray, QBuffer, QIODevice, QTimer, Qt
+from PyQt6.QtGui import QImage, QImageReader
+from PyQt6.QtNetwork import QNetworkRequest, QNetworkReply, QNetworkAccessManager
+
+from UM.Logger import Logger
+
+from .MJPGStreamParser import MJPGStreamParser
+from .NetworkReplyTimeout import NetworkReplyTimeout
+
+from time import monotonic
+from typing import Any, Optional
+
+#
+# Downloads a network mjpeg stream (or polls jpeg snapshots), picks it apart in individual
+# jpeg frames and decodes them.
+#
+# Streams are shared between every NetworkMJPGImage that shows the same camera, so the
+# camera is only downloaded and decoded once no matter how many views show it. Views
+# subscribe to a stream through acquire() and unsubscribe with release(); the stream is
+# closed when its last subscriber is released.
+#
+# The number of frames that get decoded is capped by the highest maximum fps of the
+# subscribers; frames that arrive before the next frame is due are dropped before they are
+# decoded. If decoding takes longer than the frame interval allows, the frame rate is lowered
+# automatically. Frames are decoded at the largest size that any subscriber displays them at.
+#
+# Every jpeg frame that is received is also announced as is (before it is decoded or dropped)
+# with jpegReceived, so it can be recorded without encoding it again. Subscribers that only
+# need those raw frames can subscribe without decoding; if no subscriber needs decoded frames,
+# no frames are decoded at all.
+#
+# A watchdog reconnects the stream (with an increasing delay) when no complete frame arrived
+# for a while, when the buffered data grows beyond what a single frame could be, or when the
+# server closes the stream. The state of the connection is reported as its health:
+# "connecting", "ok" or "reconnecting".
+#
+class NetworkMJPGStream(QObject):
+    _minimum_snapshot_interval = 1.0  # in seconds, when the snapshot interval is adaptive
+    _stall_timeout = 10.0  # in seconds without a complete frame, before the stream is reconnected
+    _maximum_buffer_size = 4 * 1024 * 1024  # no single camera frame should be this large
+    _minimum_reconnect_delay = 1.0  # in seconds
+    _maximum_reconnect_delay = 30.0  # in seconds
+
+    _streams = {}  # type: dict[str, NetworkMJPGStream]
+
+    ##  Get the shared stream for a camera, and subscribe to it
+    #   \param subscriber Object to identify the subscriber with when changing its options or releasing the stream
+    #   \param snapshot_url If not empty, poll single snapshots from this url instead of streaming source_url
+    @classmethod
+    def acquire(cls, subscriber: Any, source_url: QUrl, snapshot_url: Optional[QUrl] = None) -> "NetworkMJPGStream":
+        if snapshot_url is not None and not snapshot_url.isEmpty():
+            key = "snapshot:" + snapshot_url.toString()
+        else:
+            snapshot_url = QUrl()
+            key = "stream:" + source_url.toString()
+
+        stream = cls._streams.get(key)
+        if stream is None:
+            stream = NetworkMJPGStream(key, source_url, snapshot_url)
+            cls._streams[key] = stream
+        stream._subscribe(subscriber)
+        return stream
+
+    def __init__(self, key: str, source_url: QUrl, snapshot_url: QUrl) -> None:
+        super().__init__()
+
+        self._key = key
+        self._source_url = source_url
+        self._snapshot_url = snapshot_url
+
+        self._subscribers = {}  # type: dict[int, dict[str, Any]]
+
+        self._stream_parser = None  # type: Optional[MJPGStreamParser]
+        self._network_manager = None  # type: Optional[QNetworkAccessManager]
+        self._image_request = None  # type: Optional[QNetworkRequest]
+        self._image_reply = None  # type: Optional[QNetworkReply]
+        self._image = QImage()
+        self._frame_size = QSize()  # size of the camera frames, regardless of the size they are decoded at
+        self._started = False
+
+        self._snapshot_etag = b""
+        self._snapshot_last_modified = b""
+        self._snapshot_request_time = 0.0
+        self._snapshot_reply_timeout = None  # type: Optional[NetworkReplyTimeout]
+        self._snapshot_timer = QTimer()
+        self._snapshot_timer.setSingleShot(True)
+        self._snapshot_timer.timeout.connect(self._requestSnapshot)
+
+        self._health = "connecting"
+        self._last_frame_received_time = 0.0  # including frames that were dropped
+        self._reconnect_delay = self._minimum_reconnect_delay
+        self._watchdog_timer = QTimer()
+        self._watchdog_timer.setInterval(1000)
+        self._watchdog_timer.timeout.connect(self._checkStream)
+        self._reconnect_timer = QTimer()
+        self._reconnect_timer.setSingleShot(True)
+        self._reconnect_timer.timeout.connect(self._reconnect)
+
+        # Combined options of all subscribers
+        self._maximum_fps = 0.0  # 0 means no limit
+        self._snapshot_interval = 0  # in milliseconds, 0 means adapt the interval to the speed of the connection
+        self._target_size = QSize()  # the largest size any of the subscribers shows the frames at
+        self._decode = True  # at least one of the subscribers needs decoded frames
+
+        self._frame_interval = 0.0  # minimum time between decoded frames, in seconds
+        self._last_frame_time = 0.0
+        self._decode_time = 0.0  # moving average of the time spent decoding a frame, in seconds
+        self._dropped_frames = 0
+        self._fps = 0.0
+        self._fps_frame_count = 0
+        self._fps_period_start = 0.0
+
+    jpegReceived = pyqtSignal(bytes)
+    frameDecoded = pyqtSignal()
+    frameSizeChanged = pyqtSignal()
+    statisticsChanged = pyqtSignal()
+    healthChanged = pyqtSignal()
+
+    ##  Unsubscribe from the stream, and close it if there are no subscribers left
+    def release(self, subscriber: Any) -> None:
+        self._subscribers.pop(id(subscriber), None)
+        if self._subscribers:
+            self._updateOptions()
+            return
+
+        self._stop()
+        if NetworkMJPGStream._streams.get(self._key) is self:
+            del NetworkMJPGStream._streams[self._key]
+
+    ##  Set the options of a subscriber; the stream uses the most demanding options of all subscribers
+    #   \param target_size The size (in device pixels, in the orientation of the camera) the subscriber shows the frames at
+    #   \param maximum_fps The maximum number of frames per second the subscriber wants to show, 0 for no limit
+    #   \param snapshot_interval Time between snapshots in milliseconds, 0 to adapt to the connection
+    #   \param decode False if the subscriber only needs the raw jpeg frames
+    def setSubscriberOptions(self, subscriber: Any, target_size: QSize, maximum_fps: float, snapshot_interval: int = 0, decode: bool = True) -> None:
+        if id(subscriber) not in self._subscribers:
+            return
+        self._subscribers[id(subscriber)] = {
+            "target_size": target_size,
+            "maximum_fps": maximum_fps,
+            "snapshot_interval": snapshot_interval,
+            "decode": decode
+        }
+        self._updateOptions()
+
+    def isSnapshotStream(self) -> bool:
+        return not self._snapshot_url.isEmpty()
+
+    ##  The most recently decoded frame
+    def image(self) -> QImage:
+        return self._image
+
+    ##  Size of the camera frames, regardless of the size they are decoded at
+    def frameSize(self) -> QSize:
+        return self._frame_size
+
+    ##  Number of frames that were decoded during the last second
+    def fps(self) -> float:
+        return self._fps
+
+    ##  Average time spent decoding a frame, in seconds
+    def decodeTime(self) -> float:
+        return self._decode_time
+
+    ##  Number of frames that were skipped without decoding them since the stream was started
+    def droppedFrames(self) -> int:
+        return self._dropped_frames
+
+    ##  State of the connection to the camera: "connecting", "ok" or "reconnecting"
+    def health(self) -> str:
+        return self._health
+
+    def _subscribe(self, subscriber: Any) -> None:
+        self._subscribers[id(subscriber)] = {
+            "target_size": QSize(),
+            "maximum_fps": 0.0,
+            "snapshot_interval": 0,
+            "decode": True
+        }
+        self._updateOptions()
+        if not self._started:
+            self._start()
+
+    def _updateOptions(self) -> None:
+        options = list(self._subscribers.values())
+        if not options:
+            return
+
+        snapshot_interval = [option["snapshot_interval"] for option in options]
+        self._snapshot_interval = 0 if 0 in snapshot_interval else min(snapshot_interval)
+
+        # The size and frame rate of subscribers that don't need decoded frames don't matter
+        options = [option for option in options if option["decode"]]
+        self._decode = bool(options)
+        if not options:
+            return
+
+        maximum_fps = [option["maximum_fps"] for option in options]
+        self._maximum_fps = 0.0 if 0 in maximum_fps else max(maximum_fps)
+
+        target_size = QSize(0, 0)
+        for option in options:
+            if option["target_size"].isEmpty():
+                # This subscriber does not know its size yet; decode at full size
+                target_size = QSize()
+                break
+            target_size = target_size.expandedTo(option["target_size"])
+        self._target_size = target_size
+
+        self._updateFrameInterval()
+
+    def _start(self) -> None:
+        self._started = True
+        self._resetStatistics()
+        self._reconnect_delay = self._minimum_reconnect_delay
+        if self._network_manager is None:
+            self._network_manager = QNetworkAccessManager()
+
+        self._connect()
+        if not self.isSnapshotStream():
+            self._watchdog_timer.start()
+
+    def _stop(self) -> None:
+        self._started = False
+        self._watchdog_timer.stop()
+        self._reconnect_timer.stop()
+        self._snapshot_timer.stop()
+        self._snapshot_etag = b""
+        self._snapshot_last_modified = b""
+
+        self._disconnect()
+        self._network_manager = None
+
+    def _connect(self) -> None:
+        self._setHealth("connecting")
+        self._last_frame_received_time = monotonic()
+
+        if self.isSnapshotStream():
+            Logger.log("d", "MJPEG starting snapshots...")
+            self._requestSnapshot()
+            return
+
+        Logger.log("w", "MJPEG starting stream...")
+        self._image_request = QNetworkRequest(self._source_url)
+        self._image_reply = self._network_manager.get(self._image_request)
+        self._image_reply.downloadProgress.connect(self._onStreamDownloadProgress)
+        self._image_reply.finished.connect(self._onStreamFinished)
+
+    def _disconnect(self) -> None:
+        Logger.log("w", "MJPEG stopping stream...")
+        self._stream_parser = None
+        self._snapshot_reply_timeout = None
+
+        if self._image_reply:
+            try:
+                try:
+                    self._image_reply.downloadProgress.disconnect(self._onStreamDownloadProgress)
+                except Exception:
+                    pass
+                try:
+                    self._image_reply.finished.disconnect()
+                except Exception:
+                    pass
+
+                if not self._image_reply.isFinished():
+                    self._image_reply.close()
+                # Finished and stalled replies are not reused; delete them so reconnects do not leak replies
+                self._image_reply.deleteLater()
+            except Exception as e:  # RuntimeError
+                pass  # It can happen that the wrapped c++ object is already deleted.
+
+            self._image_reply = None
+            self._image_request = None
+
+    def _setHealth(self, health: str) -> None:
+        if health != self._health:
+            self._health = health
+            self.healthChanged.emit()
+
+    ##  Close the connection, and open it again after a delay that increases with every attempt
+    def _scheduleReconnect(self, reason: str) -> None:
+        Logger.log("w", "MJPEG %s; reconnecting in %.0f seconds", reason, self._reconnect_delay)
+        self._disconnect()
+        self._setHealth("reconnecting")
+        self._reconnect_timer.setInterval(round(self._reconnect_delay * 1000))
+        self._reconnect_timer.start()
+        self._reconnect_delay = min(self._reconnect_delay * 2, self._maximum_reconnect_delay)
+
+    def _reconnect(self) -> None:
+        if not self._started:
+            return
+        self._connect()
+
+    def _checkStream(self) -> None:
+        if not self._started or self._reconnect_timer.isActive():
+            return
+        if monotonic() - self._last_frame_received_time > self._stall_timeout:
+            self._scheduleReconnect("stream stalled")
+
+    def _onFrameReceived(self) -> None:
+        self._last_frame_received_time = monotonic()
+        if self._health != "ok":
+            self._setHealth("ok")
+            self._reconnect_delay = self._minimum_reconnect_delay
+
+    def _onStreamFinished(self) -> None:
+        # A camera stream should never finish by itself
+        if self._started and self._image_reply is not None:
+            self._scheduleReconnect("stream closed by the server (%s)" % self._image_reply.errorString())
+
+    def _onStreamDownloadProgress(self, bytes_received: int, bytes_total: int) -> None:
+        if self._image_reply is None:
+            return
+        if self._stream_parser is None:
+            # The multipart boundary (if any) is declared in the headers of the response
+            content_type = bytes(self._image_reply.rawHeader(b"Content-Type")).decode("latin-1")
+            self._stream_parser = MJPGStreamParser(content_type)
+
+        frames = self._stream_parser.feed(bytes(self._image_reply.readAll()))
+        if self._stream_parser.bufferSize() > self._maximum_buffer_size:
+            self._scheduleReconnect("buffer exceeds reasonable size")
+            return
+        if not frames:
+            return
+        self._onFrameReceived()
+        for jpg_data in frames:
+            self.jpegReceived.emit(jpg_data)
+        if not self._decode:
+            return
+
+        # Only the most recent frame is of interest; don't let frames build up
+        self._dropped_frames += len(frames) - 1
+        jpg_data = frames[-1]
+
+        now = monotonic()
+        if now - self._last_frame_time < self._frame_interval:
+            self._dropped_frames += 1
+            return
+        self._last_frame_time = now
+
+        self._decodeFrame(QByteArray(jpg_data))
+        self._updateStatistics(now, monotonic() - now)
+
+    def _requestSnapshot(self) -> None:
+        if not self._started or self._network_manager is None:
+            return
+
+        self._image_request = QNetworkRequest(self._snapshot_url)
+        # Only transfer the snapshot if it changed since the previous one
+        if self._snapshot_etag:
+            self._image_request.setRawHeader(b"If-None-Match", self._snapshot_etag)
+        if self._snapshot_last_modified:
+            self._image_request.setRawHeader(b"If-Modified-Since", self._snapshot_last_modified)
+
+        self._snapshot_request_time = monotonic()
+        self._image_reply = self._network_manager.get(self._image_request)
+        self._image_reply.finished.connect(self._onSnapshotFinished)
+        self._snapshot_reply_timeout = NetworkReplyTimeout(self._image_reply, round(self._stall_timeout * 1000))
+
+    def _onSnapshotFinished(self) -> None:
+        reply = self._image_reply
+        if reply is None:
+            return
+        self._image_reply = None
+        self._image_request = None
+        self._snapshot_reply_timeout = None
+
+        request_duration = monotonic() - self._snapshot_request_time
+        http_status_code = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        snapshot_failed = False
+        if reply.error() == QNetworkReply.NetworkError.NoError and http_status_code == 200:
+            self._onFrameReceived()
+            self._snapshot_etag = bytes(reply.rawHeader(b"ETag"))
+            self._snapshot_last_modified = bytes(reply.rawHeader(b"Last-Modified"))
+
+            jpg_data = reply.readAll()
+            self.jpegReceived.emit(bytes(jpg_data))
+            if self._decode:
+                decode_start = monotonic()
+                self._last_frame_time = decode_start
+                self._decodeFrame(jpg_data)
+                self._updateStatistics(decode_start, monotonic() - decode_start)
+        elif http_status_code == 304:  # the snapshot has not changed
+            self._onFrameReceived()
+        else:
+            Logger.log("w", "Could not get camera snapshot: %s", reply.errorString())
+            snapshot_failed = True
+        reply.deleteLater()
+
+        if not self._started:
+            return
+        if snapshot_failed:
+            self._setHealth("reconnecting")
+            self._snapshot_timer.setInterval(round(self._reconnect_delay * 1000))
+            self._reconnect_delay = min(self._reconnect_delay * 2, self._maximum_reconnect_delay)
+        elif self._snapshot_interval > 0:
+            self._snapshot_timer.setInterval(self._snapshot_interval)
+        else:
+            # Keep the link mostly free for other traffic, however slow it is
+            interval = max(self._minimum_snapshot_interval, self._frame_interval, 4 * request_duration)
+            self._snapshot_timer.setInterval(round(interval * 1000))
+        self._snapshot_timer.start()
+
+    def _resetStatistics(self) -> None:
+        self._last_frame_time = 0.0
+        self._decode_time = 0.0
+        self._dropped_frames = 0
+        self._fps = 0.0
+        self._fps_frame_count = 0
+        self._fps_period_start = monotonic()
+        self._updateFrameInterval()
+        self.statisticsChanged.emit()
+
+    def _updateStatistics(self, frame_time: float, decode_time: float) -> None:
+        if self._decode_time:
+            self._decode_time = 0.8 * self._decode_time + 0.2 * decode_time
+        else:
+            self._decode_time = decode_time
+        self._updateFrameInterval()
+
+        self._fps_frame_count += 1
+        period = frame_time - self._fps_period_start
+        if period >= 1.0:
+            # Only update the statistics once per second, so they can be shown without causing a rebinding every frame
+            self._fps = self._fps_frame_count / period
+            self._fps_frame_count = 0
+            self._fps_period_start = frame_time
+            self.statisticsChanged.emit()
+
+    def _updateFrameInterval(self) -> None:
+        frame_interval = 1 / self._maximum_fps if self._maximum_fps > 0 else 0.0
+        # Never spend more than half of the time decoding frames; if decoding can not keep up
+        # with the requested frame rate, the frame rate is lowered instead.
+        self._frame_interval = max(frame_interval, 2 * self._decode_time)
+
+    def _decodeFrame(self, jpg_data: QByteArray) -> None:
+        buffer = QBuffer(jpg_data)
+        buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+        reader = QImageReader(buffer, b"jpg")
+
+        frame_size = reader.size()
+        if frame_size.isValid():
+            decode_size = self._getDecodeSize(frame_size)
+            if decode_size != frame_size:
+                # The jpeg reader uses this to decode at a reduced (DCT) scale, which is a lot
+                # cheaper than decoding the full frame and scaling it down afterwards.
+                reader.setScaledSize(decode_size)
+
+        image = reader.read()
+        buffer.close()
+        if image.isNull():
+            Logger.log("d", "Could not decode MJPEG frame: %s", reader.errorString())
+            return
+
+        self._image = image
+
+        if frame_size.isValid() and frame_size != self._frame_size:
+            self._frame_size = frame_size
+            self.frameSizeChanged.emit()
+
+        self.frameDecoded.emit()
+
+    ##  Get the size to decode a frame at, so it fits the largest size it is shown at
+    def _getDecodeSize(self, frame_size: QSize) -> QSize:
+        target_size = self._target_size
+        if not target_size.isValid() or target_size.isEmpty() or (target_size.width() >= frame_size.width() and target_size.height() >= frame_size.height()):
+            # Never upscale while decoding; the texture sampler can do that just as well
+            return frame_size
+
+        return frame_size.scaled(target_size, Qt.AspectRatioMode.KeepAspectRatioByExpanding).boundedTo(frame_size)
@@ -0,0 +1,166 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierDiscovery is released under the terms of the AGPLv3 or higher.
+
+from PyQt6.QtCore import QObject, QUrl, pyqtSignal
+from PyQt6.QtNetwork import QAbstractSocket, QNetworkAccessManager, QNetworkInterface, QNetworkReply, QNetworkRequest
+
+from UM.Logger import Logger
+
+from .NetworkReplyTimeout import NetworkReplyTimeout
+
+import ipaddress
+import json
+
+from time import monotonic
+from typing import List, Optional
+
+#
+# Finds Repetier servers on the local network, by asking every address on the local subnets
+# for printer/info.
+#
+# Probes run in parallel, but no more than a fixed number at a time, and each probe is aborted
+# if it gets no answer within a short timeout. Hosts that do not exist mostly time out, so a /24
+# subnet is swept in a few seconds. Results (including addresses that are not Repetier servers)
+# are cached for a while, so scanning again shortly after does not probe the same addresses.
+#
+# Every server that is found is announced with serverFound, with the contents of printer/info.
+# Instead of the local subnets, a list of addresses can be passed to start(), for instance to
+# check a list of known servers or a server on localhost.
+#
+class RepetierDiscovery(QObject):
+    _default_ports = [3344]  # the default port of Repetier Server
+    _probe_timeout = 1000  # in milliseconds
+    _maximum_concurrent_probes = 64
+    _cache_time = 300.0  # in seconds, for servers that were found
+    _negative_cache_time = 60.0  # in seconds, for addresses that are not a Repetier server
+    _maximum_prefix_length = 24  # larger subnets are only scanned around the own address
+
+    serverFound = pyqtSignal(str, int, "QVariantMap")  # address, port, contents of printer/info
+    discoveryFinished = pyqtSignal()
+
+    def __init__(self, ports: Optional[List[int]] = None, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+
+        self._ports = ports if ports else self._default_ports
+        self._network_manager = None  # type: Optional[QNetworkAccessManager]
+        self._user_agent = b"RepetierIntegration"
+
+        self._pending_probes = []  # type: List[tuple[str, int]]
+        self._active_probes = {}  # type: dict[QNetworkReply, tuple[str, int, NetworkReplyTimeout]]
+        self._cache = {}  # type: dict[tuple[str, int], tuple[float, dict[str, object] | None]]
+
+    def setUserAgent(self, user_agent: bytes) -> None:
+        self._user_agent = user_agent
+
+    def isRunning(self) -> bool:
+        return bool(self._pending_probes or self._active_probes)
+
+    ##  Start looking for Repetier servers
+    #   \param addresses The addresses to probe; by default every address on the local subnets
+    def start(self, addresses: Optional[List[str]] = None) -> None:
+        self.stop()
+
+        if addresses is None:
+            addresses = self.getLocalSubnetAddresses()
+        Logger.log("d", "Probing %d addresses for Repetier servers", len(addresses))
+
+        now = monotonic()
+        for address in addresses:
+            for port in self._ports:
+                cached = self._cache.get((address, port))
+                if cached and cached[0] > now:
+                    if cached[1] is not None:
+                        self.serverFound.emit(address, port, cached[1])
+                    continue
+                self._pending_probes.append((address, port))
+
+        if not self._pending_probes:
+            self.discoveryFinished.emit()
+            return
+
+        if self._network_manager is None:
+            self._network_manager = QNetworkAccessManager()
+        self._startProbes()
+
+    def stop(self) -> None:
+        self._pending_probes = []
+        active_probes = self._active_probes
+        self._active_probes = {}
+        for reply in active_probes:
+            try:
+                reply.finished.disconnect()
+                if reply.isRunning():
+                    reply.abort()
+                reply.deleteLater()
+            except (RuntimeError, TypeError):
+                pass  # It can happen that the wrapped c++ object is already deleted.
+
+    ##  Forget the cached probe results, so the next scan probes every address again
+    def clearCache(self) -> None:
+        self._cache = {}
+
+    ##  The addresses on the subnets of the network interfaces of this computer, except its own
+    @classmethod
+    def getLocalSubnetAddresses(cls) -> List[str]:
+        addresses = []  # type: List[str]
+        own_addresses = set()
+        for interface in QNetworkInterface.allInterfaces():
+            flags = interface.flags()
+            if not flags & QNetworkInterface.InterfaceFlag.IsUp or not flags & QNetworkInterface.InterfaceFlag.IsRunning or flags & QNetworkInterface.InterfaceFlag.IsLoopBack:
+                continue
+
+            for entry in interface.addressEntries():
+                ip = entry.ip()
+                if ip.protocol() != QAbstractSocket.NetworkLayerProtocol.IPv4Protocol:
+                    continue
+                own_address = ip.toString()
+                own_addresses.add(own_address)
+                prefix_length = max(entry.prefixLength(), cls._maximum_prefix_length)
+                try:
+                    network = ipaddress.ip_network("%s/%d" % (own_address, prefix_length), strict = False)
+                except ValueError:
+                    continue
+                for host in network.hosts():
+                    address = str(host)
+                    if address not in addresses:
+                        addresses.append(address)
+
+        return [address for address in addresses if address not in own_addresses]
+
+    def _startProbes(self) -> None:
+        while self._pending_probes and len(self._active_probes) < self._maximum_concurrent_probes:
+            (address, port) = self._pending_probes.pop(0)
+
+            request = QNetworkRequest(QUrl("http://%s:%d/printer/info" % (address, port)))
+            request.setRawHeader(b"User-Agent", self._user_agent)
+            reply = self._network_manager.get(request)
+            reply.finished.connect(lambda reply = reply: self._onProbeFinished(reply))
+            self._active_probes[reply] = (address, port, NetworkReplyTimeout(reply, self._probe_timeout))
+
+    def _onProbeFinished(self, reply: QNetworkReply) -> None:
+        probe = self._active_probes.pop(reply, None)
+        if probe is None:
+            return
+        (address, port, _) = probe
+
+        info = None  # type: dict[str, object] | None
+        http_status_code = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        if reply.error() == QNetworkReply.NetworkError.NoError and http_status_code == 200:
+            try:
+                json_data = json.loads(bytes(reply.readAll()).decode("utf-8"))
+                if isinstance(json_data, dict) and isinstance(json_data.get("printers", None), list):
+                    info = json_data
+            except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+                pass
+        reply.deleteLater()
+
+        if info is not None:
+            Logger.log("d", "Found Repetier server on %s:%d", address, port)
+            self._cache[(address, port)] = (monotonic() + self._cache_time, info)
+            self.serverFound.emit(address, port, info)
+        else:
+            self._cache[(address, port)] = (monotonic() + self._negative_cache_time, None)
+
+        self._startProbes()
+        if not self.isRunning():
+            self.discoveryFinished.emit()
@@ -0,0 +1,65 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierFarmModel is released under the terms of the AGPLv3 or higher.
+
+from PyQt6.QtCore import Qt
+
+from UM.Qt.ListModel import ListModel
+
+from typing import Any, Dict, List
+
+#
+# A compact overview of all monitored printers: their state, progress and remaining time.
+#
+class RepetierFarmModel(ListModel):
+    InstanceIdRole = Qt.ItemDataRole.UserRole + 1
+    NameRole = Qt.ItemDataRole.UserRole + 2
+    StateRole = Qt.ItemDataRole.UserRole + 3
+    JobNameRole = Qt.ItemDataRole.UserRole + 4
+    ProgressRole = Qt.ItemDataRole.UserRole + 5
+    TimeRemainingRole = Qt.ItemDataRole.UserRole + 6
+    ActiveRole = Qt.ItemDataRole.UserRole + 7
+
+    def __init__(self, parent = None) -> None:
+        super().__init__(parent)
+
+        self.addRoleName(self.InstanceIdRole, "instanceId")
+        self.addRoleName(self.NameRole, "name")
+        self.addRoleName(self.StateRole, "state")
+        self.addRoleName(self.JobNameRole, "jobName")
+        self.addRoleName(self.ProgressRole, "progress")
+        self.addRoleName(self.TimeRemainingRole, "timeRemaining")
+        self.addRoleName(self.ActiveRole, "active")
+
+    ##  Turn the listPrinter entry of a printer into an item of the model
+    #   \param printer The listPrinter entry of the printer, or None if the server could not be reached
+    @staticmethod
+    def createItem(instance_id: str, name: str, printer: Any, active: bool) -> Dict[str, Any]:
+        state = "offline"
+        job_name = ""
+        progress = 0.0
+        time_remaining = 0
+        if printer and printer.get("online", 0):
+            state = "idle"
+            if printer.get("job", "none") != "none":
+                state = "paused" if printer.get("paused", False) else "printing"
+                job_name = printer.get("job", "")
+                progress = float(printer.get("done", 0) or 0)
+                print_time = printer.get("printTime", 0) or 0
+                printed_time = printer.get("printedTimeComp", 0) or 0
+                time_remaining = max(0, int(print_time - printed_time))
+
+        return {
+            "instanceId": instance_id,
+            "name": name,
+            "state": state,
+            "jobName": job_name,
+            "progress": progress,
+            "timeRemaining": time_remaining,
+            "active": active
+        }
+
+    ##  Replace the items, but only if anything changed, so views are not rebuilt needlessly
+    def updateItems(self, items: List[Dict[str, Any]]) -> None:
+        items.sort(key = lambda item: item["name"])
+        if items != self.items:
+            self.setItems(items)
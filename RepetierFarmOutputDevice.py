@@ -0,0 +1,158 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierFarmOutputDevice is released under the terms of the AGPLv3 or higher.
+
+from UM.i18n import i18nCatalog
+from UM.Logger import Logger
+from UM.Message import Message
+from UM.Mesh.MeshWriter import MeshWriter
+from UM.OutputDevice.OutputDevice import OutputDevice
+from UM.PluginRegistry import PluginRegistry
+
+from cura.CuraApplication import CuraApplication
+
+from .RepetierServerMonitor import RepetierServerMonitor
+
+from io import StringIO
+from time import monotonic
+from typing import cast, Any, Callable, Dict, List, Optional, TYPE_CHECKING
+if TYPE_CHECKING:
+    from UM.Scene.SceneNode import SceneNode #For typing.
+    from UM.FileHandler.FileHandler import FileHandler #For typing.
+
+i18n_catalog = i18nCatalog("cura")
+
+#
+# Prints on any idle printer of the same type as the active machine, instead of on a printer picked by hand.
+#
+# The printer is chosen from the state the server monitors already keep (see RepetierServerMonitor), so
+# choosing takes no requests: idle printers come first, then printers with fewer waiting jobs, then the
+# printer that has been idle longest. If no printer is idle, the job is queued on the printer with the
+# shortest queue and the least remaining print time.
+#
+# A printer that was just sent a job counts as busy, with that job waiting, until its server monitor
+# reports the job (the printer became busy, or the number of waiting jobs grew), so several jobs that are
+# sent in a row go to different printers.
+#
+# The job is handed to the output device of the chosen printer (see RepetierOutputDevice.spoolJob), so it
+# is spooled, uploaded with the print settings of the machine of that printer, and started once Repetier
+# analysed it, exactly like a job that is sent to that printer directly.
+#
+class RepetierFarmOutputDevice(OutputDevice):
+    _assignment_time = 60.0  # in seconds, the longest time a sent job keeps a printer reserved
+
+    def __init__(self, device_id: str = "repetier_farm") -> None:
+        super().__init__(device_id)
+
+        self.setPriority(1)  # below the output device of the active machine
+        self.setName(i18n_catalog.i18nc("@item:inmenu", "Any idle Repetier printer"))
+        self.setShortDescription(i18n_catalog.i18nc("@action:button", "Print on any idle printer"))
+        self.setDescription(i18n_catalog.i18nc("@properties:tooltip", "Print on the Repetier printer of this type that is available first"))
+        self.setIconName("print")
+
+        self._candidates_function = None  # type: Optional[Callable[[], List[Dict[str, Any]]]]
+        # Jobs that were sent but not yet reported by the server monitor, by instance id: the time the last
+        # job was sent, the number of jobs, and the state of the printer when the first job was sent
+        self._assignments = {}  # type: Dict[str, Dict[str, Any]]
+        self._send_function = None  # type: Optional[Callable[[str, str, StringIO], bool]]
+
+    ##  Set the function that returns the printers to choose from: every printer of the same type as the
+    #   active machine, with the last state its server monitor received
+    def setCandidatesFunction(self, candidates_function: Callable[[], List[Dict[str, Any]]]) -> None:
+        self._candidates_function = candidates_function
+
+    ##  Set the function that sends a job to the chosen printer: it is called with the instance id of the
+    #   printer, the file name and the g-code, and returns whether the job was accepted
+    def setSendFunction(self, send_function: Callable[[str, str, StringIO], bool]) -> None:
+        self._send_function = send_function
+
+    ##  Choose the printer to print on
+    #   \return The chosen candidate, or None if no printer of this type is online
+    def selectPrinter(self) -> Optional[Dict[str, Any]]:
+        candidates = self._candidates_function() if self._candidates_function else []
+        now = monotonic()
+        self._assignments = {
+            instance_id: assignment for instance_id, assignment in self._assignments.items()
+            if now - assignment["time"] < self._assignment_time
+        }
+
+        best_candidate = None  # type: Optional[Dict[str, Any]]
+        best_rank = None  # type: Any
+        for candidate in candidates:
+            printer = candidate["printer"]
+            if not printer or not printer.get("online", 0):
+                continue
+            jobs_waiting = int(printer.get("jobsWaiting", 0) or 0)
+            idle = RepetierServerMonitor.isIdle(printer)
+            assignment = self._assignments.get(candidate["instanceId"])
+            if assignment:
+                expected_jobs_waiting = self._getExpectedJobsWaiting(assignment)
+                if jobs_waiting >= expected_jobs_waiting and not (assignment["idle"] and idle):
+                    del self._assignments[candidate["instanceId"]]  # the monitor reports the jobs that were sent
+                else:
+                    idle = False
+                    jobs_waiting = max(jobs_waiting, expected_jobs_waiting)
+            if idle:
+                idle_since = candidate["idleSince"]
+                rank = (0, jobs_waiting, idle_since if idle_since is not None else now)
+            else:
+                time_remaining = max(0.0, float(printer.get("printTime", 0) or 0) - float(printer.get("printedTimeComp", 0) or 0))
+                rank = (1, jobs_waiting, time_remaining)
+            if best_rank is None or rank < best_rank:
+                best_candidate = candidate
+                best_rank = rank
+        return best_candidate
+
+    ##  The number of waiting jobs the server monitor reports once it knows about the jobs that were sent;
+    #   the first job sent to an idle printer is started right away instead of waiting
+    def _getExpectedJobsWaiting(self, assignment: Dict[str, Any]) -> int:
+        return assignment["jobsWaiting"] + assignment["jobs"] - (1 if assignment["idle"] else 0)
+
+    ##  Reserve a printer for a job that is sent to it
+    def _assignPrinter(self, candidate: Dict[str, Any]) -> None:
+        assignment = self._assignments.get(candidate["instanceId"])
+        if assignment is None:
+            printer = candidate["printer"]
+            assignment = {
+                "jobs": 0,
+                "jobsWaiting": int(printer.get("jobsWaiting", 0) or 0),
+                "idle": RepetierServerMonitor.isIdle(printer)
+            }
+            self._assignments[candidate["instanceId"]] = assignment
+        assignment["jobs"] += 1
+        assignment["time"] = monotonic()
+
+    def requestWrite(self, nodes: List["SceneNode"], file_name: Optional[str] = None, limit_mimetypes: bool = False, file_handler: Optional["FileHandler"] = None, **kwargs: str) -> None:
+        candidate = self.selectPrinter()
+        if candidate is None or not self._send_function:
+            Message(
+                i18n_catalog.i18nc("@info:status", "None of the Repetier printers of this type are online."),
+                title=i18n_catalog.i18nc("@label", "Repetier error")
+            ).show()
+            return
+
+        self.writeStarted.emit(self)
+
+        # Get the g-code through the GCodeWriter plugin, like the output device of a single printer
+        gcode_stream = StringIO()
+        gcode_writer = cast(MeshWriter, PluginRegistry.getInstance().getPluginObject("GCodeWriter"))
+        if not gcode_writer.write(gcode_stream, None):
+            Logger.log("e", "GCodeWrite failed: %s" % gcode_writer.getInformation())
+            self.writeError.emit(self)
+            return
+
+        job_name = CuraApplication.getInstance().getPrintInformation().jobName.strip()
+        if job_name == "":
+            job_name = "untitled_print"
+        Logger.log("d", "Sending %s to %s, the first available printer", job_name, candidate["name"])
+        if not self._send_function(candidate["instanceId"], "%s.gcode" % job_name, gcode_stream):
+            self.writeError.emit(self)
+            self.writeFinished.emit(self)
+            return
+
+        self._assignPrinter(candidate)
+        Message(
+            i18n_catalog.i18nc("@info:status", "Sending the print job to {0}").format(candidate["name"]),
+            title=i18n_catalog.i18nc("@label", "Repetier")
+        ).show()
+        self.writeSuccess.emit(self)
+        self.writeFinished.emit(self)
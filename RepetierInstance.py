@@ -0,0 +1,90 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierInstance is released under the terms of the AGPLv3 or higher.
+
+from PyQt6.QtCore import QObject, pyqtProperty, pyqtSlot
+
+import re
+
+from typing import Dict, Optional
+
+#
+# A lightweight description of a known Repetier instance: where it is and how to reach it.
+#
+# The RepetierOutputDevicePlugin keeps one of these for every configured instance, and only
+# creates the (much heavier) RepetierOutputDevice for the instance of the active machine. The
+# connection dialog lists these descriptions, so it does not need devices for every instance.
+#
+class RepetierInstance(QObject):
+    def __init__(self, instance_id: str, address: str, port: int, properties: Dict[bytes, bytes], parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+
+        self._id = instance_id
+        self._address = address
+        self._port = port
+        self._properties = properties  # Properties dict as provided by zero conf
+
+        self._path = properties.get(b"path", b"/").decode("utf-8")
+        if self._path[-1:] != "/":
+            self._path += "/"
+        self._repetier_id = properties.get(b"repetier_id", b"").decode("utf-8")
+
+        protocol = "https" if properties.get(b"useHttps") == b"true" else "http"
+        self._base_url = "%s://%s:%d%s" % (protocol, self._address, self._port, self._path)
+
+        name = self._id
+        matches = re.search(r"^\"(.*)\"\._Repetier\._tcp.local$", name)
+        if matches:
+            name = matches.group(1)
+        self._name = name
+
+    ##  True if the instance was created with the same address, port and properties
+    def hasSettings(self, address: str, port: int, properties: Dict[bytes, bytes]) -> bool:
+        return (self._address, self._port, self._properties) == (address, port, properties)
+
+    def getProperties(self) -> Dict[bytes, bytes]:
+        return self._properties
+
+    @pyqtSlot(str, result = str)
+    def getProperty(self, key: str) -> str:
+        return self._properties.get(key.encode("utf-8"), b"").decode("utf-8")
+
+    #  Get the unique key of this machine
+    #   \return key String containing the key of the machine.
+    @pyqtSlot(result = str)
+    def getId(self) -> str:
+        return self._id
+
+    #  Name of the instance (as returned from the zeroConf properties)
+    @pyqtProperty(str, constant = True)
+    def name(self) -> str:
+        return self._name
+
+    #  Name of the printer in repetier
+    @pyqtProperty(str, constant = True)
+    def repetier_id(self) -> str:
+        return self._repetier_id
+
+    #  Version (as returned from the zeroConf properties)
+    @pyqtProperty(str, constant = True)
+    def repetierVersion(self) -> str:
+        return self._properties.get(b"version", b"").decode("utf-8")
+
+    # IP address of this instance
+    @pyqtProperty(str, constant = True)
+    def ipAddress(self) -> str:
+        return self._address
+
+    # port of this instance
+    @pyqtProperty(int, constant = True)
+    def port(self) -> int:
+        return self._port
+
+    # path of this instance
+    @pyqtProperty(str, constant = True)
+    def path(self) -> str:
+        return self._path
+
+    # absolute url of this instance
+    @pyqtProperty(str, constant = True)
+    def baseURL(self) -> str:
+        return self._base_url
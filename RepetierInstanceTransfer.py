@@ -0,0 +1,244 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierInstanceTransfer is released under the terms of the AGPLv3 or higher.
+
+from PyQt6.QtCore import QObject, QUrl
+from PyQt6.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest, QSslConfiguration, QSslSocket
+
+from UM.Logger import Logger
+from UM.Util import parseBool
+
+from .NetworkReplyTimeout import NetworkReplyTimeout
+
+import base64
+import csv
+import json
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+#
+# Reads and writes manually added instances, with the settings of their machines, from and to JSON or
+# CSV files, so many Cura installations can be provisioned with the same printers.
+#
+# Both formats hold one flat record per instance: the properties of the instance (name, address, port,
+# path, useHttps, userName, password, repetier_id) and the Repetier settings of the machine that is
+# linked to it (repetier_api_key, repetier_store_group, ...). A JSON file holds a list of records; a CSV
+# file holds a header with the field names and a row per record.
+#
+# Before imported instances are added, their servers are probed in parallel; only instances of which
+# the server responds and the printer exists are accepted.
+#
+class RepetierInstanceTransfer(QObject):
+    _probe_timeout = 5000  # in milliseconds
+    _maximum_concurrent_probes = 16
+
+    instance_fields = ["name", "address", "port", "path", "useHttps", "userName", "password", "repetier_id"]
+    metadata_keys = [
+        "repetier_api_key", "repetier_store_group", "repetier_store_print", "repetier_auto_print",
+        "repetier_show_camera", "repetier_webcam_index", "repetier_webcam_max_fps",
+        "repetier_webcam_snapshot", "repetier_webcam_snapshot_interval",
+        "repetier_webcamflip_y", "repetier_webcamflip_x",
+        "repetier_webcamrot_90", "repetier_webcamrot_180", "repetier_webcamrot_270",
+        "repetier_timelapse", "repetier_timelapse_interval"
+    ]
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+
+        self._network_manager = None  # type: Optional[QNetworkAccessManager]
+        self._user_agent = b"RepetierIntegration"
+
+        self._records = []  # type: List[Dict[str, Any]]
+        self._pending_probes = []  # type: List[Tuple[str, str, str]]
+        self._active_probes = {}  # type: Dict[QNetworkReply, Tuple[str, NetworkReplyTimeout]]
+        self._server_printers = {}  # type: Dict[str, Optional[set[str]]]  # printers per server, None if it did not respond
+        self._on_finished = None  # type: Optional[Callable[[List[Dict[str, Any]], List[str]], None]]
+
+    def setUserAgent(self, user_agent: bytes) -> None:
+        self._user_agent = user_agent
+
+    def isRunning(self) -> bool:
+        return bool(self._pending_probes or self._active_probes)
+
+    ##  Write instance records to a file; the format is chosen by the extension of the file
+    @classmethod
+    def writeFile(cls, file_path: str, records: List[Dict[str, Any]]) -> None:
+        fields = cls.instance_fields + cls.metadata_keys
+        with open(file_path, "w", newline = "", encoding = "utf-8") as file:
+            if file_path.lower().endswith(".csv"):
+                writer = csv.DictWriter(file, fieldnames = fields, extrasaction = "ignore")
+                writer.writeheader()
+                writer.writerows(records)
+            else:
+                json.dump([{key: record[key] for key in fields if key in record} for record in records], file, indent = 2)
+
+    ##  Read and validate instance records from a file; the format is chosen by the extension of the file
+    #   \return The valid records, and a description of each invalid record
+    @classmethod
+    def readFile(cls, file_path: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        with open(file_path, newline = "", encoding = "utf-8-sig") as file:
+            if file_path.lower().endswith(".csv"):
+                entries = list(csv.DictReader(file))  # type: List[Any]
+            else:
+                entries = json.load(file)
+        if not isinstance(entries, list):
+            raise ValueError("The file does not contain a list of printers")
+
+        records = []  # type: List[Dict[str, Any]]
+        errors = []  # type: List[str]
+        names = set()  # type: set[str]
+        for index, entry in enumerate(entries):
+            try:
+                record = cls._createRecord(entry)
+            except ValueError as e:
+                errors.append("Entry %d: %s" % (index + 1, str(e)))
+                continue
+            if record["name"] in names:
+                errors.append("%s: the name is used more than once" % record["name"])
+                continue
+            names.add(record["name"])
+            records.append(record)
+        return records, errors
+
+    @classmethod
+    def _createRecord(cls, entry: Any) -> Dict[str, Any]:
+        if not isinstance(entry, dict):
+            raise ValueError("not a printer")
+
+        name = str(entry.get("name", "") or "").strip()
+        if not name:
+            raise ValueError("the name is missing")
+        address = str(entry.get("address", "") or "").strip()
+        if not address:
+            raise ValueError("%s has no address" % name)
+        try:
+            port = int(entry.get("port", "") or 3344)
+        except ValueError:
+            raise ValueError("%s has an invalid port" % name)
+        if not 0 < port < 65536:
+            raise ValueError("%s has an invalid port" % name)
+        path = str(entry.get("path", "") or "/").strip()
+        if not path.startswith("/"):
+            path = "/" + path
+        if not path.endswith("/"):
+            path += "/"
+
+        record = {
+            "name": name,
+            "address": address,
+            "port": port,
+            "path": path,
+            "useHttps": parseBool(entry.get("useHttps", False) or False),
+            "userName": str(entry.get("userName", "") or ""),
+            "password": str(entry.get("password", "") or ""),
+            "repetier_id": str(entry.get("repetier_id", "") or "").strip()
+        }  # type: Dict[str, Any]
+        for key in cls.metadata_keys:
+            value = entry.get(key, None)
+            if value is not None and value != "":
+                record[key] = str(value).lower() if isinstance(value, bool) else str(value)
+        return record
+
+    ##  Check that the servers of the records respond and have the printers of the records
+    #   \param on_finished Called with the accepted records (with their repetier_id filled in if the server
+    #   has a single printer) and a description of each rejected record
+    def probe(self, records: List[Dict[str, Any]], on_finished: Callable[[List[Dict[str, Any]], List[str]], None]) -> None:
+        self.stop()
+        self._records = records
+        self._on_finished = on_finished
+        self._server_printers = {}
+
+        for record in records:
+            base_url = self._getBaseUrl(record)
+            server_key = self._getServerKey(record)
+            if server_key not in self._server_printers:
+                self._server_printers[server_key] = None
+                self._pending_probes.append((base_url, record["userName"], record["password"]))
+
+        if self._network_manager is None:
+            self._network_manager = QNetworkAccessManager()
+        self._startProbes()
+        if not self.isRunning():
+            self._finish()
+
+    def stop(self) -> None:
+        self._pending_probes = []
+        active_probes = self._active_probes
+        self._active_probes = {}
+        for reply in active_probes:
+            try:
+                reply.finished.disconnect()
+                if reply.isRunning():
+                    reply.abort()
+                reply.deleteLater()
+            except (RuntimeError, TypeError):
+                pass  # It can happen that the wrapped c++ object is already deleted.
+
+    def _getBaseUrl(self, record: Dict[str, Any]) -> str:
+        return "%s://%s:%d%s" % ("https" if record["useHttps"] else "http", record["address"], record["port"], record["path"])
+
+    def _getServerKey(self, record: Dict[str, Any]) -> str:
+        return "%s|%s|%s" % (self._getBaseUrl(record), record["userName"], record["password"])
+
+    def _startProbes(self) -> None:
+        while self._pending_probes and len(self._active_probes) < self._maximum_concurrent_probes:
+            (base_url, user_name, password) = self._pending_probes.pop(0)
+
+            request = QNetworkRequest(QUrl(base_url + "printer/info"))
+            request.setRawHeader(b"User-Agent", self._user_agent)
+            if user_name and password:
+                data = base64.b64encode(("%s:%s" % (user_name, password)).encode()).decode("utf-8")
+                request.setRawHeader(b"Authorization", ("Basic %s" % data).encode())
+
+            # ignore SSL errors (eg for self-signed certificates)
+            ssl_configuration = QSslConfiguration.defaultConfiguration()
+            ssl_configuration.setPeerVerifyMode(QSslSocket.PeerVerifyMode.VerifyNone)
+            request.setSslConfiguration(ssl_configuration)
+
+            reply = self._network_manager.get(request)
+            reply.finished.connect(lambda reply = reply: self._onProbeFinished(reply))
+            self._active_probes[reply] = ("%s|%s|%s" % (base_url, user_name, password), NetworkReplyTimeout(reply, self._probe_timeout))
+
+    def _onProbeFinished(self, reply: QNetworkReply) -> None:
+        probe = self._active_probes.pop(reply, None)
+        if probe is None:
+            return
+        server_key = probe[0]
+
+        http_status_code = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        if reply.error() == QNetworkReply.NetworkError.NoError and http_status_code == 200:
+            try:
+                json_data = json.loads(bytes(reply.readAll()).decode("utf-8"))
+                if isinstance(json_data, dict) and isinstance(json_data.get("printers", None), list):
+                    self._server_printers[server_key] = {
+                        printer["slug"] for printer in json_data["printers"] if isinstance(printer, dict) and "slug" in printer
+                    }
+            except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+                pass
+        reply.deleteLater()
+
+        self._startProbes()
+        if not self.isRunning():
+            self._finish()
+
+    def _finish(self) -> None:
+        accepted = []  # type: List[Dict[str, Any]]
+        rejected = []  # type: List[str]
+        for record in self._records:
+            printers = self._server_printers.get(self._getServerKey(record))
+            if printers is None:
+                rejected.append("%s: no Repetier server responded at %s" % (record["name"], self._getBaseUrl(record)))
+            elif record["repetier_id"] and record["repetier_id"] not in printers:
+                rejected.append("%s: the server has no printer %s" % (record["name"], record["repetier_id"]))
+            elif not record["repetier_id"] and len(printers) != 1:
+                rejected.append("%s: the server has %d printers, but no repetier_id is given" % (record["name"], len(printers)))
+            else:
+                if not record["repetier_id"]:
+                    record["repetier_id"] = next(iter(printers))
+                accepted.append(record)
+        Logger.log("d", "Probed printers to import: %d accepted, %d rejected", len(accepted), len(rejected))
+
+        on_finished = self._on_finished
+        self._records = []
+        self._on_finished = None
+        if on_finished:
+            on_finished(accepted, rejected)
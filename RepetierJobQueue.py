@@ -0,0 +1,235 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierJobQueue is released under the terms of the AGPLv3 or higher.
+
+from PyQt6.QtCore import Qt, QTimer, pyqtProperty, pyqtSignal, pyqtSlot
+
+from UM.Logger import Logger
+from UM.Qt.ListModel import ListModel
+
+import hashlib
+import json
+
+from typing import Any, Callable, Dict, List
+
+#
+# The job queue of a printer on the Repetier server.
+#
+# The queue is only synchronised while it is shown. Responses to listJobs that are identical to the
+# previous response are not parsed again, and a changed queue is applied row by row, so views keep their
+# state and only the jobs that changed are updated.
+#
+# Changes to the queue (removing, moving and starting jobs) are shown right away, and sent to the server
+# together after a short delay: the removals first, then the moves that turn the queue of the server into
+# the queue that is shown, from the first position to the last. The commands are sent one at a time, each
+# after the server handled the previous one, and the queue is fetched again once, after all of them.
+#
+class RepetierJobQueue(ListModel):
+    IdRole = Qt.ItemDataRole.UserRole + 1
+    NameRole = Qt.ItemDataRole.UserRole + 2
+    PrintTimeRole = Qt.ItemDataRole.UserRole + 3
+    SizeRole = Qt.ItemDataRole.UserRole + 4
+
+    _poll_interval = 5000  # in milliseconds, while the queue is shown
+    _command_delay = 300  # in milliseconds, to collect changes before they are sent
+
+    def __init__(self, parent = None) -> None:
+        super().__init__(parent)
+
+        self.addRoleName(self.IdRole, "id")
+        self.addRoleName(self.NameRole, "name")
+        self.addRoleName(self.PrintTimeRole, "printTime")
+        self.addRoleName(self.SizeRole, "size")
+
+        self._request_function = None  # type: Callable[[], None] | None
+        self._command_function = None  # type: Callable[[str, Dict[str, Any]], None] | None
+
+        self._active = False
+        self._request_running = False
+        self._response_digest = b""
+
+        self._server_job_ids = []  # type: List[int]  # the queue of the server, after the commands that were sent
+        self._pending_removals = []  # type: List[int]
+        self._pending_start = None  # type: int | None
+        self._commands = []  # type: List[tuple[str, Dict[str, Any]]]  # commands that were not sent yet
+        self._command_running = False
+
+        self._poll_timer = QTimer()
+        self._poll_timer.setInterval(self._poll_interval)
+        self._poll_timer.timeout.connect(self.refresh)
+        self._command_timer = QTimer()
+        self._command_timer.setInterval(self._command_delay)
+        self._command_timer.setSingleShot(True)
+        self._command_timer.timeout.connect(self._sendCommands)
+
+    ##  Set the function that requests listJobs; the response is passed to updateFromResponse
+    def setRequestFunction(self, request_function: Callable[[], None]) -> None:
+        self._request_function = request_function
+
+    ##  Set the function that sends a command (eg removeJob) with its data; commandFinished must be
+    #   called when it was handled
+    def setCommandFunction(self, command_function: Callable[[str, Dict[str, Any]], None]) -> None:
+        self._command_function = command_function
+
+    activeChanged = pyqtSignal()
+
+    ##  Whether the queue is shown, and should be kept up to date
+    @pyqtProperty(bool, notify = activeChanged)
+    def active(self) -> bool:
+        return self._active
+
+    @pyqtSlot(bool)
+    def setActive(self, active: bool) -> None:
+        if active == self._active:
+            return
+        self._active = active
+        if active:
+            self._poll_timer.start()
+            self.refresh()
+        else:
+            self._poll_timer.stop()
+        self.activeChanged.emit()
+
+    ##  Fetch the queue, unless changes to the queue are still being sent
+    @pyqtSlot()
+    def refresh(self) -> None:
+        if self._request_running or self._isSendingCommands() or not self._request_function:
+            return
+        self._request_running = True
+        self._request_function()
+
+    def requestFailed(self) -> None:
+        self._request_running = False
+
+    ##  Update the queue from the response to listJobs
+    def updateFromResponse(self, data: bytes) -> None:
+        self._request_running = False
+        if self._isSendingCommands():
+            return  # the response does not include the changes that are being sent
+
+        digest = hashlib.sha1(data).digest()
+        if digest == self._response_digest:
+            return
+        try:
+            json_data = json.loads(data.decode("utf-8"))
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+            Logger.log("w", "Received invalid JSON from Repetier instance.")
+            return
+        if isinstance(json_data, dict):
+            json_data = json_data.get("data", [])
+        if not isinstance(json_data, list):
+            return
+        self._response_digest = digest
+
+        jobs = []  # type: List[Dict[str, Any]]
+        for job in json_data:
+            if isinstance(job, dict) and "id" in job:
+                jobs.append({
+                    "id": int(job["id"]),
+                    "name": str(job.get("name", "")),
+                    "printTime": float(job.get("printTime", 0) or 0),
+                    "size": int(job.get("length", 0) or 0)
+                })
+        self._applyJobs(jobs)
+
+    ##  Remove a job from the queue
+    @pyqtSlot(int)
+    def removeJob(self, job_id: int) -> None:
+        index = self.find("id", job_id)
+        if index < 0:
+            return
+        self.removeItem(index)
+        if self._pending_start == job_id:
+            self._pending_start = None
+        self._pending_removals.append(job_id)
+        self._scheduleCommands()
+
+    ##  Move a job to another position in the queue
+    @pyqtSlot(int, int)
+    def moveJob(self, job_id: int, position: int) -> None:
+        index = self.find("id", job_id)
+        position = max(0, min(position, self.count - 1))
+        if index < 0 or index == position:
+            return
+        item = self.getItem(index)
+        self.removeItem(index)
+        self.insertItem(position, item)
+        self._scheduleCommands()
+
+    ##  Start the first job in the queue
+    @pyqtSlot()
+    def startNext(self) -> None:
+        if self.count == 0:
+            return
+        self._pending_start = self.getItem(0)["id"]
+        self._scheduleCommands()
+
+    def _scheduleCommands(self) -> None:
+        self._command_timer.start()
+
+    def _isSendingCommands(self) -> bool:
+        return self._command_running or bool(self._commands) or self._command_timer.isActive()
+
+    def _sendCommands(self) -> None:
+        if not self._command_function:
+            return
+
+        for job_id in self._pending_removals:
+            self._commands.append(("removeJob", {"id": job_id}))
+        server_job_ids = [job_id for job_id in self._server_job_ids if job_id not in self._pending_removals]
+
+        # Move the jobs to their positions in the queue that is shown, from the first position to the last;
+        # a job is always moved from a later position, so the jobs before it, which are in place, stay in place
+        job_ids = [job_id for job_id in (item["id"] for item in self.items) if job_id in server_job_ids]
+        for position, job_id in enumerate(job_ids):
+            if server_job_ids[position] == job_id:
+                continue
+            server_job_ids.remove(job_id)
+            server_job_ids.insert(position, job_id)
+            self._commands.append(("moveJob", {"id": job_id, "pos": position}))
+
+        if self._pending_start is not None:
+            self._commands.append(("startJob", {"id": self._pending_start}))
+        self._server_job_ids = server_job_ids
+        self._pending_removals = []
+        self._pending_start = None
+
+        if not self._command_running:
+            self._sendNextCommand()
+
+    def _sendNextCommand(self) -> None:
+        if not self._commands or not self._command_function:
+            self._commands = []
+            if self._active:
+                self.refresh()
+            return
+        self._command_running = True
+        (action, data) = self._commands.pop(0)
+        self._command_function(action, data)
+
+    def commandFinished(self, success: bool) -> None:
+        self._command_running = False
+        if not success:
+            # The commands that are left were made for a queue the server does not have; show its queue again
+            self._commands = []
+            self._response_digest = b""
+        self._sendNextCommand()
+
+    ##  Update the rows of the model to match the jobs, moving, inserting and removing as few rows as possible
+    def _applyJobs(self, jobs: List[Dict[str, Any]]) -> None:
+        self._server_job_ids = [job["id"] for job in jobs]
+        job_ids = {job["id"] for job in jobs}
+        for index in reversed(range(self.count)):
+            if self.getItem(index)["id"] not in job_ids:
+                self.removeItem(index)
+
+        for position, job in enumerate(jobs):
+            index = self.find("id", job["id"])
+            if index == position:
+                item = self.getItem(index)
+                for key, value in job.items():
+                    if item.get(key) != value:
+                        self.setProperty(index, key, value)
+                continue
+            if index >= 0:
+                self.removeItem(index)
+            self.insertItem(position, job)
@@ -0,0 +1,159 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierModelIndex is released under the terms of the AGPLv3 or higher.
+
+import datetime
+import re
+
+from bisect import bisect_left
+from typing import Any, Dict, List, Set
+
+#
+# An index of the models that are stored on a Repetier server, to find them by name, group, date and size.
+#
+# The words in the name and group of every model are kept in a sorted list, with the ids of the models
+# they occur in. A search term matches every word it is the start of, which is found by bisecting the
+# list, so a search takes a few lookups instead of a pass over all models.
+#
+# The index is updated with the complete list of models, but only the models that were added, removed or
+# changed since the previous update are (re)indexed.
+#
+# A query consists of words, which must all match, and optional filters:
+#   group:<name>        only models in the group (use quotes for names with spaces: group:"my parts")
+#   after:<yyyy-mm-dd>  only models stored on or after the date
+#   before:<yyyy-mm-dd> only models stored before the date
+#   larger:<MB>         only models larger than the size in megabytes
+#   smaller:<MB>        only models smaller than the size in megabytes
+#
+class RepetierModelIndex:
+    _word_pattern = re.compile(r"[^\W_]+")
+    _query_pattern = re.compile(r"(\w+):\"([^\"]*)\"|(\w+):(\S+)|\"([^\"]*)\"|(\S+)")
+
+    def __init__(self) -> None:
+        self._models = {}  # type: Dict[int, Dict[str, Any]]
+        self._words = []  # type: List[str]  # sorted
+        self._word_ids = {}  # type: Dict[str, Set[int]]
+        self._model_words = {}  # type: Dict[int, Set[str]]
+        self._group_ids = {}  # type: Dict[str, Set[int]]
+        self._ordered_ids = None  # type: List[int] | None  # all models, newest first
+        self._ranks = None  # type: Dict[int, int] | None  # position of every model in _ordered_ids
+
+    ##  Update the index with the complete list of models, by id
+    #   \return True if any model was added, removed or changed
+    def update(self, models: Dict[int, Dict[str, Any]]) -> bool:
+        removed_ids = [model_id for model_id in self._models if model_id not in models]
+        changed_ids = [model_id for model_id, model in models.items() if self._models.get(model_id) != model]
+        if not removed_ids and not changed_ids:
+            return False
+
+        for model_id in removed_ids + changed_ids:
+            self._removeModel(model_id)
+        for model_id in changed_ids:
+            self._addModel(models[model_id])
+        self._ordered_ids = None
+        self._ranks = None
+        return True
+
+    ##  Find the models that match a query
+    #   \param group Only find models in this group, in addition to any group in the query
+    #   \return The ids of the matching models, newest first
+    def search(self, query: str = "", group: str = "") -> List[int]:
+        ids = None  # type: Set[int] | None
+        groups = [group.lower()] if group else []
+        after = None  # type: int | None
+        before = None  # type: int | None
+        larger = None  # type: float | None
+        smaller = None  # type: float | None
+
+        for match in self._query_pattern.finditer(query):
+            key = (match.group(1) or match.group(3) or "").lower()
+            value = match.group(2) if match.group(1) else (match.group(4) or "")
+            try:
+                if key == "group":
+                    groups.append(value.lower())
+                    continue
+                elif key == "after":
+                    after = self._parseDate(value)
+                    continue
+                elif key == "before":
+                    before = self._parseDate(value)
+                    continue
+                elif key == "larger":
+                    larger = float(value) * 1024 * 1024
+                    continue
+                elif key == "smaller":
+                    smaller = float(value) * 1024 * 1024
+                    continue
+            except ValueError:
+                continue  # ignore filters that can not be parsed
+            text = match.group(0) if key else (match.group(5) or match.group(6) or "")
+            for word in self._word_pattern.findall(text.lower()):
+                word_ids = self._findWord(word)
+                ids = word_ids if ids is None else ids & word_ids
+                if not ids:
+                    return []
+
+        for name in groups:
+            group_ids = self._group_ids.get(name, set())
+            ids = group_ids if ids is None else ids & group_ids
+            if not ids:
+                return []
+        if after is not None or before is not None or larger is not None or smaller is not None:
+            models = (self._models[model_id] for model_id in ids) if ids is not None else self._models.values()
+            ids = {
+                model["id"] for model in models
+                if (after is None or model["created"] >= after)
+                and (before is None or model["created"] < before)
+                and (larger is None or model["size"] > larger)
+                and (smaller is None or model["size"] < smaller)
+            }
+
+        if self._ordered_ids is None or self._ranks is None:
+            ordered = sorted(self._models.values(), key = lambda model: (-model["created"], model["name"]))
+            self._ordered_ids = [model["id"] for model in ordered]
+            self._ranks = {model_id: rank for rank, model_id in enumerate(self._ordered_ids)}
+        if ids is None:
+            return list(self._ordered_ids)
+        if len(ids) > len(self._ordered_ids) // 8:
+            # Picking the matches from the ordered list is quicker than sorting many matches
+            return [model_id for model_id in self._ordered_ids if model_id in ids]
+        return sorted(ids, key = self._ranks.__getitem__)
+
+    ##  The ids of the models with a word that starts with the search term
+    def _findWord(self, term: str) -> Set[int]:
+        ids = set()  # type: Set[int]
+        index = bisect_left(self._words, term)
+        while index < len(self._words) and self._words[index].startswith(term):
+            ids |= self._word_ids[self._words[index]]
+            index += 1
+        return ids
+
+    def _addModel(self, model: Dict[str, Any]) -> None:
+        model_id = model["id"]
+        self._models[model_id] = model
+        words = set(self._word_pattern.findall(("%s %s" % (model["name"], model["group"])).lower()))
+        self._model_words[model_id] = words
+        self._group_ids.setdefault(model["group"].lower(), set()).add(model_id)
+        for word in words:
+            if word not in self._word_ids:
+                self._word_ids[word] = set()
+                self._words.insert(bisect_left(self._words, word), word)
+            self._word_ids[word].add(model_id)
+
+    def _removeModel(self, model_id: int) -> None:
+        model = self._models.pop(model_id, None)
+        if model is not None:
+            group = model["group"].lower()
+            self._group_ids[group].discard(model_id)
+            if not self._group_ids[group]:
+                del self._group_ids[group]
+        for word in self._model_words.pop(model_id, set()):
+            word_ids = self._word_ids[word]
+            word_ids.discard(model_id)
+            if not word_ids:
+                del self._word_ids[word]
+                del self._words[bisect_left(self._words, word)]
+
+    ##  Repetier stores dates in milliseconds since the epoch
+    def _parseDate(self, value: str) -> int:
+        date = datetime.datetime.strptime(value, "%Y-%m-%d")
+        return int(date.timestamp() * 1000)
@@ -0,0 +1,215 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierModelLibrary is released under the terms of the AGPLv3 or higher.
+
+from PyQt6.QtCore import Qt, pyqtProperty, pyqtSignal, pyqtSlot
+
+from UM.Logger import Logger
+from UM.Qt.ListModel import ListModel
+
+from .RepetierModelIndex import RepetierModelIndex
+
+import hashlib
+import json
+
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional
+
+#
+# The models that are stored on the Repetier server for a printer, one page at a time.
+#
+# Repetier returns the complete list of stored models with listModels. The list is fetched once and
+# kept for a while, so paging through it, filtering it by group or opening the browser again does not
+# fetch it again. Repetier has no request for the changes since an earlier listModels, so the complete
+# list is fetched again, but a response that is identical to the previous response is not parsed again.
+# Otherwise the stored models are updated by id, and the page is only replaced if any of its items changed.
+#
+# The models can be searched with a query (see RepetierModelIndex); the index is updated together with
+# the list of models.
+#
+class RepetierModelLibrary(ListModel):
+    IdRole = Qt.ItemDataRole.UserRole + 1
+    NameRole = Qt.ItemDataRole.UserRole + 2
+    GroupRole = Qt.ItemDataRole.UserRole + 3
+    CreatedRole = Qt.ItemDataRole.UserRole + 4
+    SizeRole = Qt.ItemDataRole.UserRole + 5
+    PrintTimeRole = Qt.ItemDataRole.UserRole + 6
+
+    _page_size = 50
+    _cache_time = 60.0  # in seconds
+
+    def __init__(self, parent = None) -> None:
+        super().__init__(parent)
+
+        self.addRoleName(self.IdRole, "id")
+        self.addRoleName(self.NameRole, "name")
+        self.addRoleName(self.GroupRole, "group")
+        self.addRoleName(self.CreatedRole, "created")
+        self.addRoleName(self.SizeRole, "size")
+        self.addRoleName(self.PrintTimeRole, "printTime")
+
+        self._models = {}  # type: Dict[int, Dict[str, Any]]
+        self._index = RepetierModelIndex()
+        self._filtered_ids = []  # type: List[int]  # ids of the models that match the search, newest first
+        self._groups = []  # type: List[str]
+        self._group = ""  # all groups
+        self._search_text = ""
+        self._page = 0
+
+        self._request_function = None  # type: Optional[Callable[[], None]]
+        self._loading = False
+        self._expiry = 0.0
+        self._response_digest = b""
+
+    ##  Set the function that requests listModels and listModelGroups; the responses are passed to
+    #   updateModels and updateGroups, or requestFailed is called
+    def setRequestFunction(self, request_function: Callable[[], None]) -> None:
+        self._request_function = request_function
+
+    loadingChanged = pyqtSignal()
+    groupsChanged = pyqtSignal()
+    pageChanged = pyqtSignal()
+
+    @pyqtProperty(bool, notify = loadingChanged)
+    def loading(self) -> bool:
+        return self._loading
+
+    ##  Fetch the list of models, unless the list that was fetched before is still recent
+    @pyqtSlot()
+    def refresh(self) -> None:
+        if monotonic() < self._expiry:
+            return
+        self.reload()
+
+    ##  Fetch the list of models
+    @pyqtSlot()
+    def reload(self) -> None:
+        if self._loading or not self._request_function:
+            return
+        self._loading = True
+        self.loadingChanged.emit()
+        self._request_function()
+
+    ##  Forget the list of models, eg because a model was added or removed
+    def invalidate(self) -> None:
+        self._expiry = 0.0
+
+    def requestFailed(self) -> None:
+        if self._loading:
+            self._loading = False
+            self.loadingChanged.emit()
+
+    ##  Update the list of models from the (raw) response to listModels
+    def updateFromResponse(self, data: bytes) -> None:
+        digest = hashlib.sha1(data).digest()
+        if digest == self._response_digest:
+            self._expiry = monotonic() + self._cache_time
+            if self._loading:
+                self._loading = False
+                self.loadingChanged.emit()
+            return
+        try:
+            json_data = json.loads(data.decode("utf-8"))
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+            Logger.log("w", "Received invalid JSON from Repetier instance.")
+            json_data = None
+        if isinstance(json_data, dict):
+            json_data = json_data.get("data", None)
+        if not isinstance(json_data, list):
+            self.requestFailed()
+            return
+        self._response_digest = digest
+        self.updateModels(json_data)
+
+    ##  Update the list of models from the response to listModels
+    def updateModels(self, models: List[Dict[str, Any]]) -> None:
+        stored_models = {}  # type: Dict[int, Dict[str, Any]]
+        for model in models:
+            if not isinstance(model, dict) or "id" not in model:
+                continue
+            model_id = int(model["id"])
+            stored_models[model_id] = {
+                "id": model_id,
+                "name": str(model.get("name", "")),
+                "group": str(model.get("group", "")),
+                "created": int(model.get("created", 0) or 0),
+                "size": int(model.get("length", 0) or 0),
+                "printTime": float(model.get("printTime", 0) or 0)
+            }
+
+        self._expiry = monotonic() + self._cache_time
+        if self._loading:
+            self._loading = False
+            self.loadingChanged.emit()
+        if self._index.update(stored_models):
+            self._models = stored_models
+            self._updateFilter()
+
+    ##  Update the list of groups from the response to listModelGroups
+    def updateGroups(self, groups: List[str]) -> None:
+        groups = sorted(str(group) for group in groups)
+        if groups != self._groups:
+            self._groups = groups
+            self.groupsChanged.emit()
+
+    ##  The stored model with an id, or None if it is not (or no longer) stored
+    def getStoredModel(self, model_id: int) -> Optional[Dict[str, Any]]:
+        return self._models.get(model_id)
+
+    @pyqtProperty("QStringList", notify = groupsChanged)
+    def groups(self) -> List[str]:
+        return self._groups
+
+    ##  The group to show the models of, or an empty string to show the models of all groups
+    @pyqtProperty(str, notify = pageChanged)
+    def group(self) -> str:
+        return self._group
+
+    @pyqtSlot(str)
+    def setGroup(self, group: str) -> None:
+        if group != self._group:
+            self._group = group
+            self._page = 0
+            self._updateFilter()
+
+    ##  The query to search the models with; an empty query finds all models
+    @pyqtProperty(str, notify = pageChanged)
+    def searchText(self) -> str:
+        return self._search_text
+
+    @pyqtSlot(str)
+    def setSearchText(self, search_text: str) -> None:
+        if search_text != self._search_text:
+            self._search_text = search_text
+            self._page = 0
+            self._updateFilter()
+
+    @pyqtProperty(int, notify = pageChanged)
+    def page(self) -> int:
+        return self._page
+
+    @pyqtProperty(int, notify = pageChanged)
+    def pageCount(self) -> int:
+        return max(1, (len(self._filtered_ids) + self._page_size - 1) // self._page_size)
+
+    @pyqtProperty(int, notify = pageChanged)
+    def totalCount(self) -> int:
+        return len(self._filtered_ids)
+
+    @pyqtSlot(int)
+    def setPage(self, page: int) -> None:
+        page = max(0, min(page, self.pageCount - 1))
+        if page != self._page:
+            self._page = page
+            self._updatePage()
+
+    def _updateFilter(self) -> None:
+        self._filtered_ids = self._index.search(self._search_text, self._group)
+        self._page = max(0, min(self._page, self.pageCount - 1))
+        self._updatePage()
+
+    def _updatePage(self) -> None:
+        start = self._page * self._page_size
+        items = [self._models[model_id] for model_id in self._filtered_ids[start:start + self._page_size]]
+        if items != self.items:
+            self.setItems(items)
+        self.pageChanged.emit()
@@ -8,6 +8,8 @@ from UM.Message import Message
 from UM.Util import parseBool
 from UM.Mesh.MeshWriter import MeshWriter
 from UM.PluginRegistry import PluginRegistry
+from UM.Qt.ListModel import ListModel
+from UM.Resources import Resources
 
 from cura.CuraApplication import CuraApplication
 
@@ -18,9 +20,14 @@ from cura.PrinterOutput.Models.PrintJobOutputModel import PrintJobOutputModel
 
 from cura.PrinterOutput.GenericOutputController import GenericOutputController
 
+from .RepetierModelLibrary import RepetierModelLibrary
+from .RepetierJobQueue import RepetierJobQueue
+from .RepetierSpooler import RepetierSpooler
+from .TimelapseRecorder import TimelapseRecorder
+
 from PyQt6.QtNetwork import QHttpMultiPart, QHttpPart, QNetworkRequest, QNetworkAccessManager
 from PyQt6.QtNetwork import QNetworkReply, QSslConfiguration, QSslSocket
-from PyQt6.QtCore import QUrl, QTimer, pyqtSignal, pyqtProperty, pyqtSlot, QCoreApplication
+from PyQt6.QtCore import QObject, QUrl, QTimer, pyqtSignal, pyqtProperty, pyqtSlot, QCoreApplication, QFile, QIODevice, Qt
 from PyQt6.QtGui import QImage, QDesktopServices
 
 QNetworkAccessManagerOperations = QNetworkAccessManager.Operation
@@ -30,15 +37,17 @@ QNetworkReplyNetworkErrors = QNetworkReply.NetworkError
 QSslSocketPeerVerifyModes = QSslSocket.PeerVerifyMode
 
 import json
+import hashlib
 import os.path
 import re
 import datetime
+import urllib.parse
 from time import time
 import base64
 from io import StringIO, BytesIO
 from enum import IntEnum
 
-from typing import cast, Any, Callable, Dict, List, Optional, Union, TYPE_CHECKING
+from typing import cast, Any, Callable, Dict, List, Optional, Tuple, Union, TYPE_CHECKING
 if TYPE_CHECKING:
     from UM.Scene.SceneNode import SceneNode #For typing.
     from UM.FileHandler.FileHandler import FileHandler #For typing.
@@ -64,6 +73,20 @@ class UnifiedConnectionState(IntEnum):
 #  Repetier connected (wifi / lan) printer using the Repetier API
 @signalemitter
 class RepetierOutputDevice(NetworkedPrinterOutputDevice):
+    _update_interval = 2000  # in milliseconds, while Cura is the active application
+    _background_update_interval = 15000  # in milliseconds, while Cura is minimized or in the background
+    _analysis_initial_poll_delay = 500  # in milliseconds, doubled after every poll while the job is not analysed
+    _analysis_maximum_poll_delay = 4000  # in milliseconds
+    _spool_initial_retry_delay = 10.0  # in seconds, doubled after every failed upload of a spooled job
+    _spool_maximum_retry_delay = 300.0  # in seconds
+    _spool_hold_time = 60.0  # in seconds, the longest time the spool waits for the printer to start a job
+
+    # The last getPrinterConfig response of every printer as (ETag, digest, parsed response), by api url,
+    # so a device that is (re)created or reconnected does not need to wait for or re-parse an unchanged config
+    _printer_configs = {}  # type: Dict[str, Tuple[bytes, bytes, Dict[str, Any]]]
+
+    _plugin_version = None  # type: Optional[str]
+
     def __init__(
         self, instance_id: str, address: str, port: int, properties: dict, **kwargs
     ) -> None:
@@ -92,26 +115,8 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
         self._number_of_extruders_set = False
         self._number_of_extruders = 1
 
-        # Try to get version information from plugin.json
-        plugin_file_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)), "plugin.json"
-        )
-        try:
-            with open(plugin_file_path) as plugin_file:
-                plugin_info = json.load(plugin_file)
-                plugin_version = plugin_info["version"]
-        except:
-            # The actual version info is not critical to have so we can continue
-            plugin_version = "Unknown"
-            Logger.logException("w", "Could not get version information for the plugin")
-
         self._user_agent_header = "User-Agent".encode()
-        self._user_agent = ("%s/%s %s/%s" % (
-            CuraApplication.getInstance().getApplicationName(),
-            CuraApplication.getInstance().getVersion(),
-            "RepetierIntegration",
-            plugin_version
-        ))
+        self._user_agent = self.getUserAgent()
         Logger.log("d", "Repetier_ID: %s", self._repetier_id)
         self._api_prefix = "printer/api/" + self._repetier_id
         self._job_prefix = "printer/job/" + self._repetier_id
@@ -160,6 +165,17 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
 
         self._post_reply = None
 
+        # Every print job is spooled to disk first, and uploaded from there
+        safe_id = re.sub(r"[^\w\-. ]", "_", self._id)
+        self._spooler = RepetierSpooler(os.path.join(Resources.getDataStoragePath(), "repetier_spool", safe_id))
+        self._spooled_job = None  # type: Optional[Dict[str, Any]]  # the spooled job that is being uploaded
+        self._spooled_file = None  # type: Optional[QFile]
+        self._upload_cancelled = False
+        self._spool_retry_delay = self._spool_initial_retry_delay
+        self._spool_retry_time = 0.0  # spooled jobs are not sent before this time, after a failed upload
+        self._unreachable_message = None  # type: Optional[Message]
+        self._spool_held_until = 0.0  # no spooled jobs are sent until the printer started the job that was sent last
+
         self._progress_message = None # type: Union[None, Message]
         self._error_message = None # type: Union[None, Message]
         self._connection_message = None # type: Union[None, Message]
@@ -171,15 +187,50 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
         self._queued_gcode_timer.timeout.connect(self._sendQueuedGcode)
 
         self._update_timer = QTimer()
-        self._update_timer.setInterval(2000)  # TODO; Add preference for update interval
+        self._update_timer.setInterval(self._update_interval)  # TODO; Add preference for update interval
         self._update_timer.setSingleShot(False)
         self._update_timer.timeout.connect(self._update)
 
         self._show_camera = True
+        self._camera_maximum_fps = 15.0
         self._camera_mirror = False
         self._camera_rotation = 0
         self._camera_url = ""
         self._camera_shares_proxy = False
+        self._camera_snapshot_url = ""
+        self._camera_snapshot_mode = False
+        self._active_camera_index = 0
+        self._cameras = []  # type: List[Dict[str, Any]]
+        self._cameras_model = ListModel()
+        self._cameras_model.addRoleName(Qt.ItemDataRole.UserRole + 1, "name")
+        self._cameras_model.addRoleName(Qt.ItemDataRole.UserRole + 2, "url")
+        self._cameras_model.addRoleName(Qt.ItemDataRole.UserRole + 3, "snapshotUrl")
+        self._camera_snapshot_interval = 0
+        self._timelapse_enabled = False
+        self._timelapse_interval = 0.0  # in seconds, 0 means a frame per layer
+        self._timelapse_recorder = TimelapseRecorder()
+        self._suspended = False  # the machine is not active; the state is fed from the monitor of the server
+        self._timelapse_recording_key = None  # type: Optional[tuple[str, str, str]]  # job name, camera url and snapshot url
+        self._current_layer = -1
+        self._farm_model = None  # type: Optional[ListModel]
+        self._shared_manager = None  # type: Optional[QNetworkAccessManager]
+        self._model_library = RepetierModelLibrary()
+        self._model_library.setRequestFunction(self._requestModelLibrary)
+        self._job_queue = RepetierJobQueue()
+        self._job_queue.setRequestFunction(self._requestJobQueue)
+        self._job_queue.setCommandFunction(self._sendJobQueueCommand)
+
+        self._wait_for_analysis = True
+        self._waiting_message = None  # type: Optional[Message]
+        self._waiting_for_analysis = False
+        self._waiting_for_printer = False
+        self._analysis_file_name = ""
+        self._analysis_job_id = None  # type: Optional[int]
+        self._analysis_pending_action = None  # type: Optional[str]  # chosen before the job was found in the queue
+        self._analysis_poll_delay = self._analysis_initial_poll_delay
+        self._analysis_poll_timer = QTimer()
+        self._analysis_poll_timer.setSingleShot(True)
+        self._analysis_poll_timer.timeout.connect(self._pollAnalysis)
 
         self._sd_supported = False
 
@@ -187,6 +238,33 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
 
         self._output_controller = GenericOutputController(self)
         
+    ##  Get version information from plugin.json; it is only read once for all devices
+    @classmethod
+    def _getPluginVersion(cls) -> str:
+        if cls._plugin_version is None:
+            plugin_file_path = os.path.join(
+                os.path.dirname(os.path.abspath(__file__)), "plugin.json"
+            )
+            try:
+                with open(plugin_file_path) as plugin_file:
+                    plugin_info = json.load(plugin_file)
+                    cls._plugin_version = plugin_info["version"]
+            except:
+                # The actual version info is not critical to have so we can continue
+                cls._plugin_version = "Unknown"
+                Logger.logException("w", "Could not get version information for the plugin")
+        return cls._plugin_version
+
+    ##  The User-Agent of the requests to Repetier, with the versions of Cura and the plugin
+    @classmethod
+    def getUserAgent(cls) -> str:
+        return "%s/%s %s/%s" % (
+            CuraApplication.getInstance().getApplicationName(),
+            CuraApplication.getInstance().getVersion(),
+            "RepetierIntegration",
+            cls._getPluginVersion()
+        )
+
     def getProperties(self) -> Dict[bytes, bytes]:
         return self._properties
 
@@ -272,6 +350,51 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
     def cameraUrl(self) -> QUrl:
         return QUrl(self._camera_url)
 
+    @pyqtProperty("QUrl", notify = cameraUrlChanged)
+    def cameraSnapshotUrl(self) -> QUrl:
+        return QUrl(self._camera_snapshot_url)
+
+    ##  All webcams that are configured for this printer in Repetier
+    @pyqtProperty(QObject, constant = True)
+    def cameras(self) -> ListModel:
+        return self._cameras_model
+
+    @pyqtProperty(int, notify = cameraUrlChanged)
+    def activeCameraIndex(self) -> int:
+        return self._active_camera_index
+
+    ##  Select the webcam to show. Only the stream of the selected webcam is opened.
+    @pyqtSlot(int)
+    def setActiveCameraIndex(self, index: int) -> None:
+        if index == self._active_camera_index or index < 0 or index >= len(self._cameras):
+            return
+        self._active_camera_index = index
+
+        global_container_stack = CuraApplication.getInstance().getGlobalContainerStack()
+        if global_container_stack and global_container_stack.getMetaDataEntry("id") == self._id:
+            global_container_stack.setMetaDataEntry("repetier_webcam_index", str(index))
+
+        self._applyActiveCamera()
+
+    ##  Poll single snapshots instead of streaming the camera, for slow connections
+    def setCameraSnapshotMode(self, snapshot_mode: bool, snapshot_interval: int = 0) -> None:
+        if snapshot_mode != self._camera_snapshot_mode or snapshot_interval != self._camera_snapshot_interval:
+            self._camera_snapshot_mode = snapshot_mode
+            self._camera_snapshot_interval = snapshot_interval
+            self.cameraSnapshotModeChanged.emit()
+            self._updateTimelapse()
+
+    cameraSnapshotModeChanged = pyqtSignal()
+
+    @pyqtProperty(bool, notify = cameraSnapshotModeChanged)
+    def cameraSnapshotMode(self) -> bool:
+        return self._camera_snapshot_mode
+
+    ##  Time between snapshots in milliseconds, 0 for an interval that adapts to the connection
+    @pyqtProperty(int, notify = cameraSnapshotModeChanged)
+    def cameraSnapshotInterval(self) -> int:
+        return self._camera_snapshot_interval
+
     def setShowCamera(self, show_camera: bool) -> None:
         if show_camera != self._show_camera:
             self._show_camera = show_camera
@@ -283,7 +406,214 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
     def showCamera(self) -> bool:
         return self._show_camera
 
+    def setCameraMaximumFps(self, maximum_fps: float) -> None:
+        if maximum_fps != self._camera_maximum_fps:
+            self._camera_maximum_fps = maximum_fps
+            self.cameraMaximumFpsChanged.emit()
+
+    cameraMaximumFpsChanged = pyqtSignal()
+
+    @pyqtProperty(float, notify = cameraMaximumFpsChanged)
+    def cameraMaximumFps(self) -> float:
+        return self._camera_maximum_fps
+
+    ##  Record a timelapse of the webcam while printing
+    #   \param interval Time between frames in seconds, 0 to record a frame on every layer change
+    def setTimelapse(self, enabled: bool, interval: float = 0.0) -> None:
+        if enabled != self._timelapse_enabled or interval != self._timelapse_interval:
+            self._timelapse_enabled = enabled
+            self._timelapse_interval = interval
+            self.timelapseChanged.emit()
+            self._updateTimelapse()
+            # A timelapse per layer needs the fast poll interval, also while Cura is in the background
+            self._onApplicationStateChanged(CuraApplication.getInstance().applicationState())
+
+    timelapseChanged = pyqtSignal()
+    timelapseRecordingChanged = pyqtSignal()
+
+    ##  Whether a timelapse of the current print job is being recorded
+    @pyqtProperty(bool, notify = timelapseRecordingChanged)
+    def timelapseRecording(self) -> bool:
+        return self._timelapse_recorder.isRecording()
+
+    @pyqtProperty(bool, notify = timelapseChanged)
+    def timelapseEnabled(self) -> bool:
+        return self._timelapse_enabled
+
+    @pyqtProperty(float, notify = timelapseChanged)
+    def timelapseInterval(self) -> float:
+        return self._timelapse_interval
+
+    @pyqtProperty(str, constant = True)
+    def timelapseFolder(self) -> str:
+        safe_id = re.sub(r"[^\w\-. ]", "_", self._repetier_id)
+        return os.path.join(Resources.getDataStoragePath(), "repetier_timelapses", safe_id)
+
+    ##  Record the camera while a print job is printing or paused, if the timelapse is enabled
+    #   The recording is started for every new print job, and follows the camera that is selected. It is
+    #   driven by the state of the printer, so it does not depend on the camera being shown.
+    def _updateTimelapse(self) -> None:
+        print_job = self._printers[0].activePrintJob if self._printers else None
+        snapshot_url = self._camera_snapshot_url if self._camera_snapshot_mode else ""
+        if not self._timelapse_enabled or print_job is None or print_job.state not in ["printing", "paused"] or not (self._camera_url or snapshot_url):
+            self._stopTimelapse()
+            return
+
+        self._timelapse_recorder.setInterval(self._timelapse_interval)
+        recording_key = (print_job.name, self._camera_url, snapshot_url)
+        if self._timelapse_recorder.isRecording() and recording_key == self._timelapse_recording_key:
+            return
+        self._timelapse_recorder.start(QUrl(self._camera_url), QUrl(snapshot_url) if snapshot_url else None, self.timelapseFolder, print_job.name)
+        self._timelapse_recording_key = recording_key
+        self.timelapseRecordingChanged.emit()
+
+    def _stopTimelapse(self) -> None:
+        if self._timelapse_recorder.isRecording():
+            self._timelapse_recorder.stop()
+            self.timelapseRecordingChanged.emit()
+        self._timelapse_recording_key = None
+
+    ##  Use the connection pool of the server (shared with other devices on the same server)
+    #   instead of a network manager of its own; None to go back to a network manager of its own
+    def setNetworkManager(self, manager: Optional[QNetworkAccessManager]) -> None:
+        if manager is self._shared_manager:
+            return
+        self._disconnectNetworkManager()
+        self._manager = None
+        self._shared_manager = manager
+
+    def _createNetworkManager(self) -> None:
+        if self._shared_manager is None:
+            super()._createNetworkManager()
+            return
+
+        self._disconnectNetworkManager()
+        self._manager = self._shared_manager
+        self._manager.finished.connect(self._handleOnFinished)
+        self._manager.authenticationRequired.connect(self._onAuthenticationRequired)
+        self._last_manager_create_time = time()
+
+    def _disconnectNetworkManager(self) -> None:
+        if self._manager is None:
+            return
+        try:
+            self._manager.finished.disconnect(self._handleOnFinished)
+            self._manager.authenticationRequired.disconnect(self._onAuthenticationRequired)
+        except TypeError:
+            pass
+
+    def _handleOnFinished(self, reply: QNetworkReply) -> None:
+        # With a shared network manager, replies to the requests of other devices arrive here too
+        if reply.request().attribute(QNetworkRequestAttributes.User) != self._id:
+            return
+        super()._handleOnFinished(reply)
+
+    ##  Overview of all printers that are monitored in the background
+    def setFarmModel(self, farm_model: ListModel) -> None:
+        if farm_model != self._farm_model:
+            self._farm_model = farm_model
+            self.farmModelChanged.emit()
+
+    farmModelChanged = pyqtSignal()
+
+    @pyqtProperty(QObject, notify = farmModelChanged)
+    def farmPrinters(self) -> Optional[ListModel]:
+        return self._farm_model
+
+    ##  The models that are stored on the server for this printer
+    @pyqtProperty(QObject, constant = True)
+    def modelLibrary(self) -> RepetierModelLibrary:
+        return self._model_library
+
+    def _requestModelLibrary(self) -> None:
+        if self.isConnected():
+            self._validateManager()
+        if not self.isConnected() or not self._manager:
+            # The list can not be fetched until the device is connected again; stop showing it as loading
+            self._model_library.requestFailed()
+            return
+        self.get("listModelGroups", self._onModelGroupsReceived)
+        self.get("listModels", self._onModelsReceived)
+
+    def _onModelGroupsReceived(self, reply: QNetworkReply) -> None:
+        if reply.attribute(QNetworkRequestAttributes.HttpStatusCodeAttribute) != 200:
+            return
+        try:
+            json_data = json.loads(bytes(reply.readAll()).decode("utf-8"))
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+            Logger.log("w", "Received invalid JSON from Repetier instance.")
+            return
+        if isinstance(json_data, dict) and isinstance(json_data.get("groupNames", None), list):
+            self._model_library.updateGroups(json_data["groupNames"])
+
+    def _onModelsReceived(self, reply: QNetworkReply) -> None:
+        if reply.attribute(QNetworkRequestAttributes.HttpStatusCodeAttribute) != 200:
+            self._model_library.requestFailed()
+            return
+        self._model_library.updateFromResponse(bytes(reply.readAll()))
+
+    ##  Print a model that is stored on the server, without uploading it again
+    @pyqtSlot(int)
+    def printStoredModel(self, model_id: int) -> None:
+        data = urllib.parse.quote(json.dumps({"id": model_id, "autostart": True}))
+        self.get("copyModel&data=" + data, lambda reply: self._onStoredModelCopied(reply, model_id))
+
+    def _onStoredModelCopied(self, reply: QNetworkReply, model_id: int) -> None:
+        stored_model = self._model_library.getStoredModel(model_id)
+        name = stored_model["name"] if stored_model else str(model_id)
+        if reply.attribute(QNetworkRequestAttributes.HttpStatusCodeAttribute) != 200:
+            self._showErrorMessage(i18n_catalog.i18nc("@info:error", "Could not print {0} from Repetier.").format(name))
+            return
+        Message(i18n_catalog.i18nc("@info:status", "Sent {0} to the printer queue on Repetier").format(name), title = i18n_catalog.i18nc("@label", "Repetier")).show()
+
+    ##  The jobs that are queued on the server for this printer
+    @pyqtProperty(QObject, constant = True)
+    def jobQueue(self) -> RepetierJobQueue:
+        return self._job_queue
+
+    def _requestJobQueue(self) -> None:
+        self.get("listJobs", self._onJobQueueReceived)
+
+    def _onJobQueueReceived(self, reply: QNetworkReply) -> None:
+        if reply.attribute(QNetworkRequestAttributes.HttpStatusCodeAttribute) != 200:
+            self._job_queue.requestFailed()
+            return
+        self._job_queue.updateFromResponse(bytes(reply.readAll()))
+
+    def _sendJobQueueCommand(self, action: str, data: Dict[str, Any]) -> None:
+        self.get("%s&data=%s" % (action, urllib.parse.quote(json.dumps(data))), self._onJobQueueCommandFinished)
+
+    def _onJobQueueCommandFinished(self, reply: QNetworkReply) -> None:
+        success = reply.attribute(QNetworkRequestAttributes.HttpStatusCodeAttribute) == 200
+        if not success:
+            Logger.log("w", "Repetier did not accept a change to the job queue: %s", reply.url().toString())
+        self._job_queue.commandFinished(success)
+
+    currentLayerChanged = pyqtSignal()
+
+    ##  The layer that is being printed according to Repetier, -1 if unknown
+    @pyqtProperty(int, notify = currentLayerChanged)
+    def currentLayer(self) -> int:
+        return self._current_layer
+
+    ##  Poll less often while Cura is not the active application (eg minimized or in the background)
+    def _onApplicationStateChanged(self, state: Qt.ApplicationState) -> None:
+        active = state == Qt.ApplicationState.ApplicationActive
+        if not active and self._timelapse_enabled and self._timelapse_interval == 0:
+            # A timelapse per layer needs to see every layer change
+            active = True
+
+        update_interval = self._update_interval if active else self._background_update_interval
+        if update_interval == self._update_timer.interval():
+            return
+        self._update_timer.setInterval(update_interval)
+        if active and self._update_timer.isActive():
+            # Don't wait for the next poll to show the current state
+            self._update()
+
     def _update(self) -> None:
+        # Send jobs that were kept while the printer was offline or busy
+        self._sendSpooledJob()
         # Request 'general' printer data
         self.get("stateList", self._onRequestFinished)
         # Request print_job data
@@ -293,13 +623,86 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
 
 
 
+    ##  Stop polling while the machine of this device is not active
+    #   The state of the printer is then fed from the monitor of its server (see applyMonitorState), so
+    #   switching back to the machine does not need to connect again.
+    def suspend(self) -> None:
+        if self._suspended:
+            return
+        self._suspended = True
+        self._update_timer.stop()
+        self._job_queue.setActive(False)
+        try:
+            CuraApplication.getInstance().applicationStateChanged.disconnect(self._onApplicationStateChanged)
+        except TypeError:
+            pass
+
+    def isSuspended(self) -> bool:
+        return self._suspended
+
+    ##  Poll the instance again after it was suspended, without connecting again
+    def resume(self) -> None:
+        if not self._suspended:
+            return
+        self._suspended = False
+        application = CuraApplication.getInstance()
+        application.applicationStateChanged.connect(self._onApplicationStateChanged)
+        self._onApplicationStateChanged(application.applicationState())
+        self._update()
+        self._update_timer.start()
+
+    ##  Update the state of the printer from the listPrinter entry the monitor of the server received,
+    #   while the device is suspended
+    #   \param printer_entry The listPrinter entry of the printer, or None if the server could not be reached
+    def applyMonitorState(self, printer_entry: Optional[Dict[str, Any]]) -> None:
+        if not self._suspended or not self._printers:
+            return
+        printer = self._printers[0]
+        print_job = printer.activePrintJob
+
+        if not printer_entry or not printer_entry.get("online", 0):
+            printer.updateState("offline")
+            if print_job:
+                print_job.updateState("offline")
+        elif printer_entry.get("job", "none") == "none":
+            printer.updateState("idle")
+            if print_job is None or print_job.name:
+                print_job = PrintJobOutputModel(output_controller=self._output_controller)
+                printer.updateActivePrintJob(print_job)
+            print_job.updateState("idle")
+        else:
+            job_state = "paused" if printer_entry.get("paused", False) else "printing"
+            printer.updateState(job_state)
+            if print_job is None:
+                print_job = PrintJobOutputModel(output_controller=self._output_controller)
+                printer.updateActivePrintJob(print_job)
+            print_job.updateName(printer_entry.get("job", ""))
+            print_job.updateState(job_state)
+            print_job.updateTimeTotal(printer_entry.get("printTime", 0) or 0)
+            print_job.updateTimeElapsed(printer_entry.get("printedTimeComp", 0) or 0)
+
+        self._updateTimelapse()
+        self._sendSpooledJob()
+
     def close(self) -> None:
+        self._suspended = False
         self.setConnectionState(cast(ConnectionState, UnifiedConnectionState.Closed))
         if self._progress_message:
             self._progress_message.hide()
         if self._error_message:
             self._error_message.hide()
+        if self._unreachable_message:
+            self._unreachable_message.hide()
         self._update_timer.stop()
+        self._job_queue.setActive(False)
+        self._model_library.requestFailed()  # a pending request may never be answered
+        self._stopTimelapse()  # the state of the printer is no longer followed
+        if self._waiting_for_analysis:
+            self._stopWaitingForAnalysis()
+        try:
+            CuraApplication.getInstance().applicationStateChanged.disconnect(self._onApplicationStateChanged)
+        except TypeError:
+            pass
 
     def requestWrite(self, nodes: List["SceneNode"], file_name: Optional[str] = None, limit_mimetypes: bool = False, file_handler: Optional["FileHandler"] = None, **kwargs: str) -> None:
         self.writeStarted.emit(self)
@@ -310,16 +713,21 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
         if not gcode_writer.write(self._gcode_stream, None):
             Logger.log("e", "GCodeWrite failed: %s" % gcode_writer.getInformation())
             return
-        global_container_stack = CuraApplication.getInstance().getGlobalContainerStack()
-        if not global_container_stack or not self.activePrinter:
-            Logger.log("e", "There is no active printer to send the print")
-            return			
         self.startPrint()
 
     ##  Start requesting data from the instance
     def connect(self) -> None:
+        self._suspended = False
         self._createNetworkManager()
 
+        application = CuraApplication.getInstance()
+        try:
+            application.applicationStateChanged.disconnect(self._onApplicationStateChanged)
+        except TypeError:
+            pass
+        application.applicationStateChanged.connect(self._onApplicationStateChanged)
+        self._onApplicationStateChanged(application.applicationState())
+
         self.setConnectionState(cast(ConnectionState, UnifiedConnectionState.Connecting))
         self._update()  # Manually trigger the first update, as we don't want to wait a few secs before it starts.
         Logger.log("d", "Connection with instance %s with url %s started", self._repetier_id, self._base_url)
@@ -329,10 +737,15 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
         self._setAcceptsCommands(False)
         self.setConnectionText(i18n_catalog.i18nc("@info:status", "Connecting to Repetier on {0}").format(self._base_url))
 
-        ## Request 'settings' dump
-        self.get("getPrinterConfig", self._onRequestFinished)
-        self._settings_reply = self._manager.get(self._createEmptyRequest("getPrinterConfig"))
-        self._settings_reply = self._manager.get(self._createEmptyRequest("stateList"))
+        ## Request 'settings' dump; until it arrives, the last known settings of the printer are used
+        settings_request = self._createEmptyRequest("getPrinterConfig")
+        cached_config = self._printer_configs.get(self._api_url)
+        if cached_config:
+            self._applyPrinterConfig(cached_config[2])
+            if cached_config[0]:
+                settings_request.setRawHeader(b"If-None-Match", cached_config[0])
+        self._last_request_time = time()
+        self._registerOnFinishedCallback(self._manager.get(settings_request), self._onRequestFinished)
 
     ##  Stop requesting data from the instance
     def disconnect(self) -> None:
@@ -372,49 +785,177 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
         self._store_group = global_container_stack.getMetaDataEntry("repetier_store_group","#")
         self._forced_queue = False
 
+        if not self.activePrinter or self._connection_state != UnifiedConnectionState.Connected:
+            # keep the job until Repetier can be reached
+            if self._spoolPrint():
+                self._error_message = Message(
+                    i18n_catalog.i18nc("@info:status", "Repetier can not be reached right now. The job is kept, and will be sent when Repetier is back."),
+                    title=i18n_catalog.i18nc("@label", "Repetier")
+                )
+                self._error_message.show()
+            return
+
         if self.activePrinter.state not in ["idle", ""]:
             Logger.log("d", "Tried starting a print, but current state is %s" % self.activePrinter.state)
-            error_string = ""
             if not self._auto_print:
                 # allow queueing the job even if Repetier is currently busy if autoprinting is disabled
                 self._error_message = None
             elif self.activePrinter.state == "offline":
-                error_string = Message(i18n_catalog.i18nc("@info:status", "The printer is offline. Unable to start a new job."))
+                # keep the job until the printer is back
+                if self._spoolPrint():
+                    self._error_message = Message(
+                        i18n_catalog.i18nc("@info:status", "The printer is offline. The job is kept, and will be sent when the printer is back."),
+                        title=i18n_catalog.i18nc("@label", "Repetier")
+                    )
+                    self._error_message.show()
+                return
             else:
-                error_string = Message(i18n_catalog.i18nc("@info:status", "Repetier is busy. Unable to start a new job."))
-
-            if error_string:
-                if self._error_message:
-                    self._error_message.hide()
-                self._error_message = Message(error_string, title=i18n_catalog.i18nc("@label", "Repetier error"))
+                self._error_message = Message(
+                    i18n_catalog.i18nc("@info:status", "Repetier is busy. Unable to start a new job."),
+                    title=i18n_catalog.i18nc("@label", "Repetier error")
+                )
                 self._error_message.addAction(
                     "queue", i18n_catalog.i18nc("@action:button", "Queue job"), "",
                     i18n_catalog.i18nc("@action:tooltip", "Queue this print job so it can be printed later")
                 )
+                self._error_message.addAction(
+                    "spool", i18n_catalog.i18nc("@action:button", "Print when idle"), "",
+                    i18n_catalog.i18nc("@action:tooltip", "Keep this print job, and print it as soon as the printer is idle")
+                )
                 self._error_message.actionTriggered.connect(self._queuePrint)
                 self._error_message.show()
                 return
 
         self._startPrint()
 
+    ##  Wait until Repetier analysed an uploaded job, and start it as soon as it is analysed
+    #
+    #   Repetier only reports the analysis through the job queue, so the queue is polled; the first poll
+    #   is soon after the upload, and the delay between polls is doubled until the maximum delay.
+    def _startWaitingForAnalysis(self, file_name: str) -> None:
+        self._waiting_message = Message(
+            i18n_catalog.i18nc("@info:status", "Waiting for Repetier to complete Gcode analysis..."),
+            title=i18n_catalog.i18nc("@label", "Repetier"),
+            progress=-1, lifetime=0, dismissable=False, use_inactivity_timer=False
+        )
+        self._waiting_message.addAction(
+            "print", i18n_catalog.i18nc("@action:button", "Print now"), "",
+            i18n_catalog.i18nc("@action:tooltip", "Stop waiting for the Gcode analysis and start printing immediately"),
+            button_style=Message.ActionButtonStyle.SECONDARY
+        )
+        self._waiting_message.addAction(
+            "cancel", i18n_catalog.i18nc("@action:button", "Cancel"), "",
+            i18n_catalog.i18nc("@action:tooltip", "Abort the printjob")
+        )
+        self._waiting_message.actionTriggered.connect(self._stopWaitingForAnalysis)
+        self._waiting_message.show()
+
+        self._waiting_for_analysis = True
+        self._analysis_file_name = file_name
+        self._analysis_job_id = None
+        self._analysis_pending_action = None
+        self._analysis_poll_delay = self._analysis_initial_poll_delay
+        self._analysis_poll_timer.start(self._analysis_poll_delay)
+
+    def _pollAnalysis(self) -> None:
+        if self._waiting_for_analysis:
+            self.get("listJobs", self._onAnalysisJobsReceived)
+
+    def _onAnalysisJobsReceived(self, reply: QNetworkReply) -> None:
+        if not self._waiting_for_analysis:
+            return
+        if reply.attribute(QNetworkRequestAttributes.HttpStatusCodeAttribute) != 200:
+            self._scheduleAnalysisPoll()
+            return
+
+        data = bytes(reply.readAll())
+        if self._job_queue.active:
+            self._job_queue.updateFromResponse(data)  # no need to fetch the same queue again for the queue view
+        try:
+            json_data = json.loads(data.decode("utf-8"))
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+            Logger.log("w", "Received invalid JSON from Repetier instance.")
+            self._scheduleAnalysisPoll()
+            return
+        if isinstance(json_data, dict):
+            json_data = json_data.get("data", [])
+        jobs = [job for job in json_data if isinstance(job, dict) and "id" in job] if isinstance(json_data, list) else []
+
+        job = None  # type: Optional[Dict[str, Any]]
+        if self._analysis_job_id is not None:
+            job = next((job for job in jobs if int(job["id"]) == self._analysis_job_id), None)
+        else:
+            # Repetier may name the job with or without the extension of the uploaded file
+            names = {self._analysis_file_name, os.path.splitext(self._analysis_file_name)[0]}
+            matching_jobs = [job for job in jobs if job.get("name", "") in names]
+            if matching_jobs:
+                job = max(matching_jobs, key = lambda job: int(job["id"]))  # the newest job with this name
+
+        if job is None:
+            # The job is no longer queued, so Repetier started it by itself (or it was removed)
+            Logger.log("d", "Uploaded job %s is no longer in the queue of Repetier", self._analysis_file_name)
+            if self._analysis_pending_action:
+                self._showErrorMessage(i18n_catalog.i18nc("@info:error", "Could not find {0} in the queue of Repetier to start or remove it.").format(self._analysis_file_name))
+            self._stopWaitingForAnalysis()
+            self._holdSpool()  # until the printer reports the job it may have started
+            return
+
+        self._analysis_job_id = int(job["id"])
+        if self._analysis_pending_action:
+            self._stopWaitingForAnalysis(action_id = self._analysis_pending_action)
+            return
+        if not parseBool(job.get("analysed", True)):
+            self._scheduleAnalysisPoll()
+            return
+
+        Logger.log("d", "Repetier completed the Gcode analysis of job %d", self._analysis_job_id)
+        if not self.activePrinter or self.activePrinter.state not in ["idle", ""]:
+            # Another job was started in the meantime (or the printer is gone); this job stays in the queue
+            Logger.log("d", "Not starting job %d, the printer is %s", self._analysis_job_id, self.activePrinter.state if self.activePrinter else "unknown")
+            self._stopWaitingForAnalysis()
+            return
+        self._stopWaitingForAnalysis(action_id = "print")
+
+    def _scheduleAnalysisPoll(self) -> None:
+        self._analysis_poll_delay = min(self._analysis_poll_delay * 2, self._analysis_maximum_poll_delay)
+        self._analysis_poll_timer.start(self._analysis_poll_delay)
+
     def _stopWaitingForAnalysis(self, message_id: Optional[str] = None, action_id: Optional[str] = None) -> None:
         if self._waiting_message:
             self._waiting_message.hide()
+            self._waiting_message = None
+
+        if action_id in ["print", "cancel"] and self._analysis_job_id is None and self._waiting_for_analysis:
+            # The job was not found in the queue yet; the action is applied as soon as it is found
+            Logger.log("d", "Uploaded job %s is not identified yet, it is started or removed once it is", self._analysis_file_name)
+            self._analysis_pending_action = action_id
+            self._analysis_poll_delay = self._analysis_initial_poll_delay
+            self._analysis_poll_timer.start(self._analysis_poll_delay)
+            return
+
         self._waiting_for_analysis = False
+        self._analysis_poll_timer.stop()
+        self._analysis_pending_action = None
 
-        for end_point in self._polling_end_points:
-            if "files/" in end_point:
-                break
-        if "files/" not in end_point:
-            Logger.log("e", "Could not find files/ endpoint")
+        job_id = self._analysis_job_id
+        self._analysis_job_id = None
+        if action_id == "print" and job_id is not None:
+            self._holdSpool()  # until the printer reports the job that is started now
+        else:
+            self._releaseSpool()  # the job is not started, so the printer can take the next one
+        if action_id not in ["print", "cancel"] or job_id is None:
             return
 
-        self._polling_end_points = [point for point in self._polling_end_points if not point.startswith("files/")]
+        action = "startJob" if action_id == "print" else "removeJob"
+        self.get("%s&data=%s" % (action, urllib.parse.quote(json.dumps({"id": job_id}))), self._onAnalysisJobCommandFinished)
 
-        if action_id == "print":
-            self._selectAndPrint(end_point)
-        elif action_id == "cancel":
-            pass
+    def _onAnalysisJobCommandFinished(self, reply: QNetworkReply) -> None:
+        if reply.attribute(QNetworkRequestAttributes.HttpStatusCodeAttribute) != 200:
+            Logger.log("w", "Repetier did not accept a command for the uploaded job: %s", reply.url().toString())
+            self._showErrorMessage(i18n_catalog.i18nc("@info:error", "Repetier could not start or remove the uploaded job."))
+            self._releaseSpool()
+        if self._job_queue.active:
+            self._job_queue.refresh()
 
     def _stopWaitingForPrinter(self, message_id: Optional[str] = None, action_id: Optional[str] = None) -> None:
         if self._waiting_message:
@@ -429,15 +970,102 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
     def _queuePrint(self, message_id: Optional[str] = None, action_id: Optional[str] = None) -> None:
         if self._error_message:
             self._error_message.hide()
+        if action_id == "spool":
+            self._spoolPrint()
+            return
         self._forced_queue = True
         self._startPrint()
-        
-    def _startPrint(self) -> None:
+
+    ##  Add the current print job to the spool; it is sent as soon as the printer can take it
+    #   The settings of the job are stored with it, so they are not affected by jobs that are started later.
+    #   \return Whether the job was spooled
+    def _spoolPrint(self) -> bool:
+        job_name = CuraApplication.getInstance().getPrintInformation().jobName.strip()
+        if job_name == "":
+            job_name = "untitled_print"
+        try:
+            return self._addSpooledJob("%s.gcode" % job_name, self._gcode_stream, {
+                "auto_print": self._auto_print,
+                "forced_queue": self._forced_queue,
+                "store_print": self._store_print,
+                "store_group": self._store_group
+            })
+        finally:
+            self._gcode_stream = StringIO()
+
+    ##  Print g-code on this printer that was not written for it, eg because RepetierFarmOutputDevice chose
+    #   this printer; the job is spooled, and sent as soon as the printer can take it
+    #   \param settings How to send the job (auto_print, store_print and store_group), as set for the machine
+    #   of this printer
+    #   \return Whether the job was spooled
+    def spoolJob(self, file_name: str, gcode_stream: StringIO, settings: Dict[str, Any]) -> bool:
+        if not self._addSpooledJob(file_name, gcode_stream, dict(settings, forced_queue = False)):
+            return False
+        self._sendSpooledJob()
+        return True
+
+    def _addSpooledJob(self, file_name: str, gcode_stream: StringIO, settings: Dict[str, Any]) -> bool:
+        try:
+            self._spooler.addJob(file_name, gcode_stream, settings)
+        except OSError as e:
+            Logger.log("e", "Could not spool the print job: %s", str(e))
+            self._showErrorMessage(i18n_catalog.i18nc("@info:error", "Could not keep the print job for later: {0}").format(str(e)))
+            return False
+        return True
+
+    ##  Upload the oldest spooled job, if the printer can take it
+    #   Jobs that are printed right away wait until the printer is idle; other jobs only need the server
+    #   to be reachable. After an upload failed because the server could not be reached, the next upload
+    #   waits for a delay that grows with every failure. After a job that is printed right away was sent,
+    #   the spool is held until the printer started it (see _holdSpool).
+    def _sendSpooledJob(self) -> None:
+        job = self._spooler.firstJob()
+        if not job or self._spooled_job or self._connection_state != UnifiedConnectionState.Connected or not self.activePrinter:
+            return
+        if self._isSpoolHeld():
+            return
+        if job["auto_print"] and not job["forced_queue"] and self.activePrinter.state not in ["idle", ""]:
+            return
+        if time() < self._spool_retry_time:
+            return
+
+        self._startPrint(job)
+
+    ##  Hold the spool after a job that is printed right away was sent: the state of the printer is only
+    #   updated by the next poll, so until then an idle printer does not mean the printer can take the next job
+    def _holdSpool(self) -> None:
+        self._spool_held_until = time() + self._spool_hold_time
+
+    def _releaseSpool(self) -> None:
+        if self._spool_held_until:
+            self._spool_held_until = 0.0
+            CuraApplication.getInstance().callLater(self._sendSpooledJob)
+
+    ##  The spool is held until a poll reports the printer busy, or the analysis wait ended without starting
+    #   the job that was sent; the hold expires after a while, eg when the job was started and finished
+    #   between two polls
+    def _isSpoolHeld(self) -> bool:
+        if not self._spool_held_until or self._waiting_for_analysis:
+            return bool(self._spool_held_until)
+        if time() >= self._spool_held_until or (self.activePrinter and self.activePrinter.state not in ["idle", ""]):
+            self._spool_held_until = 0.0
+            return False
+        return True
+
+    def _startPrint(self, spooled_job: Optional[Dict[str, Any]] = None) -> None:
         global_container_stack = CuraApplication.getInstance().getGlobalContainerStack()
         if not global_container_stack:
             return
 
-        if self._auto_print and not self._forced_queue:
+        if spooled_job is None:
+            # The job is spooled first, so it is not lost if the upload fails; jobs that were spooled
+            # before it are sent first
+            self._spoolPrint()
+            self._sendSpooledJob()
+            return
+
+        print_now = spooled_job["auto_print"] and not spooled_job["forced_queue"]
+        if print_now and not self._suspended:
             CuraApplication.getInstance().getController().setActiveStage("MonitorStage")
 
             # cancel any ongoing preheat timer before starting a print
@@ -459,11 +1087,19 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
         self._progress_message.actionTriggered.connect(self._cancelSendGcode)
         self._progress_message.show()
 
-        job_name = CuraApplication.getInstance().getPrintInformation().jobName.strip()
-        Logger.log("d", "Print job: [%s]", job_name)
-        if job_name == "":
-            job_name = "untitled_print"
-        file_name = "%s.gcode" % job_name
+        file_name = spooled_job["file_name"]
+        Logger.log("d", "Print job: [%s]", file_name)
+
+        # The g-code is read from the spool while it is uploaded, so it is never completely in memory
+        self._spooled_file = QFile(self._spooler.getGCodePath(spooled_job))
+        if not self._spooled_file.open(QIODevice.OpenModeFlag.ReadOnly):
+            Logger.log("e", "Could not read spooled print job %s", spooled_job["id"])
+            self._spooler.removeJob(spooled_job)
+            self._spooled_file = None
+            self._progress_message.hide()
+            return
+        self._spooled_job = spooled_job
+        self._upload_cancelled = False
 
         ##  Create multi_part request
         post_parts = [] # type: List[QHttpPart]
@@ -475,7 +1111,7 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
         post_part.setBody(b"upload")
         post_parts.append(post_part)
 
-        if self._auto_print and not self._forced_queue:
+        if print_now:
             post_part = QHttpPart()
 #            post_part.setHeader(QNetworkRequest.ContentDispositionHeader, "form-data; name=\"%s\"" % file_name)
             post_part.setHeader(QNetworkRequestKnownHeaders.ContentDispositionHeader, "form-data; name=\"%s\"" % file_name)
@@ -485,7 +1121,7 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
         post_part = QHttpPart()
 #        post_part.setHeader(QNetworkRequest.ContentDispositionHeader, "form-data; name=\"file\"; filename=\"%s\"" % file_name)
         post_part.setHeader(QNetworkRequestKnownHeaders.ContentDispositionHeader, "form-data; name=\"file\"; filename=\"%s\"" % file_name)
-        post_part.setBody(self._gcode_stream.getvalue().encode())
+        post_part.setBodyDevice(self._spooled_file)
         post_parts.append(post_part)
 
         destination = "local"
@@ -496,14 +1132,20 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
             #  Post request + data
             #post_request = self._createApiRequest("files/" + destination)
             #post_request = self._createEmptyRequest("upload&name=%s" % file_name)
-            Logger.log("d", "_store_print: %s" % self._store_print)
-            Logger.log("d", "_store_group: %s" % self._store_group)
-            if self._store_print:
-                Logger.log("d", "upload&name=%s&group=%s" % (file_name,self._store_group))
-                self._post_reply = self.postFormWithParts("upload&name=%s&group=%s" % (file_name,self._store_group), post_parts, on_finished=self._onUploadFinished, on_progress=self._onUploadProgress)
+            Logger.log("d", "store_print: %s" % spooled_job["store_print"])
+            Logger.log("d", "store_group: %s" % spooled_job["store_group"])
+            on_finished = lambda reply, job = spooled_job: self._onUploadFinished(reply, job)
+            if spooled_job["store_print"]:
+                Logger.log("d", "upload&name=%s&group=%s" % (file_name, spooled_job["store_group"]))
+                self._post_reply = self.postFormWithParts("upload&name=%s&group=%s" % (file_name, spooled_job["store_group"]), post_parts, on_finished=on_finished, on_progress=self._onUploadProgress, spooled_job=spooled_job)
             else:
                 Logger.log("d", "upload&name=%s" % file_name)
-                self._post_reply = self.postFormWithParts("upload&name=%s" % file_name, post_parts, on_finished=self._onUploadFinished, on_progress=self._onUploadProgress)
+                self._post_reply = self.postFormWithParts("upload&name=%s" % file_name, post_parts, on_finished=on_finished, on_progress=self._onUploadProgress, spooled_job=spooled_job)
+            if self._post_reply is None:
+                # Nothing was sent, so the job stays in the spool until the next attempt
+                self._progress_message.hide()
+                self._closeSpooledFile()
+                self._spooled_job = None
 
             #self._post_reply = self._manager.post(post_request, self._post_multi_part)
             #self._post_reply.uploadProgress.connect(self._onUploadProgress)
@@ -517,8 +1159,8 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
             )
             self._error_message.show()
             Logger.log("e", "An exception occurred in network connection: %s" % str(e))
-
-        self._gcode_stream = StringIO()
+            self._closeSpooledFile()
+            self._spooled_job = None
 
     def _cancelSendGcode(self, message_id: Optional[str] = None, action_id: Optional[str] = None) -> None:
         if self._post_reply:
@@ -528,6 +1170,7 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
             except TypeError:
                 pass  # The disconnection can fail on mac in some cases. Ignore that.
 
+            self._upload_cancelled = True
             self._post_reply.abort()
             self._post_reply = None
         if self._progress_message:
@@ -557,6 +1200,7 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
 
     def _sendCommandToApi(self, end_point, commands):        
         command_request = QNetworkRequest(QUrl(self._api_url + "?a=" + end_point))
+        command_request.setAttribute(QNetworkRequestAttributes.User, self._id)
         command_request.setRawHeader(self._user_agent_header, self._user_agent.encode())
         command_request.setRawHeader(self._api_header, self._api_key)
         if self._basic_auth_data:
@@ -650,6 +1294,15 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
                                         extruder.updateTargetHotendTemperature(0)
                                         extruder.updateHotendTemperature(0)
                             #Logger.log("d", "json_data %s", json_data[self._key])
+                            try:
+                                current_layer = int(json_data[self._repetier_id].get("layer", -1) or -1)
+                            except (TypeError, ValueError):
+                                current_layer = -1  # Repetier sends no layer while it is idle
+                            if current_layer != self._current_layer:
+                                self._current_layer = current_layer
+                                self.currentLayerChanged.emit()
+                                if self._timelapse_interval == 0 and self._timelapse_recorder.isRecording():
+                                    self._timelapse_recorder.captureFrame()
                             if "heatedBed" in json_data[self._repetier_id]:
                                 bed_temperatures = json_data[self._repetier_id]["heatedBed"]
                                 actual_temperature = bed_temperatures["tempRead"] if bed_temperatures["tempRead"] is not None else -1
@@ -758,93 +1411,25 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
                     if printer.activePrintJob is not None:
                         printer.activePrintJob.updateState("offline")
                     self.setConnectionText(i18n_catalog.i18nc("@info:status", "Repetier on {0} bad response").format(self._repetier_id))
-            elif self._api_prefix + "?a=getPrinterConfig" in reply.url().toString():  # Repetier settings dump from /settings:                
-                if http_status_code == 200:
-                    try:
-                        json_data = json.loads(bytes(reply.readAll()).decode("utf-8"))
-                    except json.decoder.JSONDecodeError:
-                        Logger.log("w", "Received invalid JSON from Repetier instance.")
-                        json_data = {}
-
-                    if "general" in json_data and "sdcard" in json_data["general"]:
-                        self._sd_supported = json_data["general"]["sdcard"]
-
-                    if "webcam" in json_data and "dynamicUrl" in json_data["webcam"]:
-                        Logger.log("d", "RepetierOutputDevice: Detected Repetier 89.X")
-                        self._camera_shares_proxy = False
-                        Logger.log("d", "RepetierOutputDevice: Checking streamurl")                        
-                        stream_url = json_data["webcam"]["dynamicUrl"]
-                        if not stream_url: #empty string or None
-                            self._camera_url = ""
-                        else:
-                            stream_url = stream_url.replace("127.0.0.1",self._address)
-                        if not stream_url: #empty string or None
-                            self._camera_url = ""
-                        elif stream_url[:4].lower() == "http": # absolute uri                        Logger.log("d", "RepetierOutputDevice: stream_url: %s",stream_url)
-                            self._camera_url=stream_url
-                        elif stream_url[:2] == "//": # protocol-relative
-                            self._camera_url = "%s:%s" % (self._protocol, stream_url)
-                        elif stream_url[:1] == ":": # domain-relative (on another port)
-                            self._camera_url = "%s://%s%s" % (self._protocol, self._address, stream_url)
-                        elif stream_url[:1] == "/": # domain-relative (on same port)
-                            self._camera_url = "%s://%s:%d%s" % (self._protocol, self._address, self._port, stream_url)
-                            self._camera_shares_proxy = True
-                        else:
-                            Logger.log("w", "Unusable stream url received: %s", stream_url)
-                            self._camera_url = ""
-                        if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamflip_y", False)):
-                            self._camera_mirror = True
-                        else:
-                            self._camera_mirror = False
-                        if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamflip_x", False)):
-                            self._camera_rotation = 180
-                            self._camera_mirror = True
-                        if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamrot_90", False)):
-                            self._camera_rotation = 90
-                        if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamrot_180", False)):
-                            self._camera_rotation = 180
-                        if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamrot_270", False)):
-                            self._camera_rotation = 270
-                        Logger.log("d", "Set Repetier camera url to %s", self._camera_url)
-                        self.cameraUrlChanged.emit()
-                        self._camera_mirror = False
-                        #self.cameraOrientationChanged.emit()
-                    if "webcams" in json_data:
-                        Logger.log("d", "RepetierOutputDevice: Detected Repetier 90.X")
-                        if len(json_data["webcams"])>0:
-                            if "dynamicUrl" in json_data["webcams"][0]:
-                                self._camera_shares_proxy = False
-                                Logger.log("d", "RepetierOutputDevice: Checking streamurl")                        
-                                stream_url = json_data["webcams"][0]["dynamicUrl"].replace("127.0.0.1",self._address)
-                                if not stream_url: #empty string or None
-                                    self._camera_url = ""
-                                elif stream_url[:4].lower() == "http": # absolute uri                        Logger.log("d", "RepetierOutputDevice: stream_url: %s",stream_url)
-                                    self._camera_url=stream_url
-                                elif stream_url[:2] == "//": # protocol-relative
-                                    self._camera_url = "%s:%s" % (self._protocol, stream_url)
-                                elif stream_url[:1] == ":": # domain-relative (on another port)
-                                    self._camera_url = "%s://%s%s" % (self._protocol, self._address, stream_url)
-                                elif stream_url[:1] == "/": # domain-relative (on same port)
-                                    self._camera_url = "%s://%s:%d%s" % (self._protocol, self._address, self._port, stream_url)
-                                    self._camera_shares_proxy = True
-                                else:
-                                    Logger.log("w", "Unusable stream url received: %s", stream_url)
-                                    self._camera_url = ""
-                                Logger.log("d", "Set Repetier camera url to %s", self._camera_url)
-                                if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamflip_y", False)):
-                                    self._camera_mirror = True
-                                else:
-                                    self._camera_mirror = False
-                                if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamflip_x", False)):
-                                    self._camera_rotation = 180
-                                    self._camera_mirror = True
-                                if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamrot_90", False)):
-                                    self._camera_rotation = 90
-                                if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamrot_180", False)):
-                                    self._camera_rotation = 180
-                                if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamrot_270", False)):
-                                    self._camera_rotation = 270                                
-                                self.cameraUrlChanged.emit()
+                self._updateTimelapse()
+            elif self._api_prefix + "?a=getPrinterConfig" in reply.url().toString():  # Repetier settings dump from /settings:
+                cached_config = self._printer_configs.get(self._api_url)
+                if http_status_code == 304 and cached_config:
+                    self._applyPrinterConfig(cached_config[2])
+                elif http_status_code == 200:
+                    data = bytes(reply.readAll())
+                    digest = hashlib.sha1(data).digest()
+                    if cached_config and cached_config[1] == digest:
+                        json_data = cached_config[2]
+                    else:
+                        try:
+                            json_data = json.loads(data.decode("utf-8"))
+                        except json.decoder.JSONDecodeError:
+                            Logger.log("w", "Received invalid JSON from Repetier instance.")
+                            json_data = {}
+                    etag = bytes(reply.rawHeader(b"ETag"))
+                    self._printer_configs[self._api_url] = (etag, digest, json_data)
+                    self._applyPrinterConfig(json_data)
         elif reply.operation() == QNetworkAccessManager.PostOperation:
             if self._api_prefix + "?a=listModels" in reply.url().toString():  # Result from /files command:
                 if http_status_code == 201:
@@ -889,6 +1474,105 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
             self._error_message = Message(error_string, title=i18n_catalog.i18nc("@label", "Repetier error"))
             self._error_message.show()
             return
+    ##  Apply the settings dump of Repetier
+    #   Settings are only signalled if they differ from the current settings, so an unchanged config does not
+    #   restart the webcam stream.
+    def _applyPrinterConfig(self, json_data: Dict[str, Any]) -> None:
+        global_container_stack = CuraApplication.getInstance().getGlobalContainerStack()
+        if not global_container_stack:
+            return
+
+        if "general" in json_data and "sdcard" in json_data["general"]:
+            self._sd_supported = json_data["general"]["sdcard"]
+
+        webcams = []  # type: List[Dict[str, Any]]
+        if "webcams" in json_data:
+            webcams = json_data["webcams"]
+        elif "webcam" in json_data:
+            webcams = [json_data["webcam"]]
+        if not webcams:
+            return
+
+        camera_mirror = parseBool(global_container_stack.getMetaDataEntry("repetier_webcamflip_y", False))
+        camera_rotation = 0
+        if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamflip_x", False)):
+            camera_rotation = 180
+            camera_mirror = True
+        if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamrot_90", False)):
+            camera_rotation = 90
+        if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamrot_180", False)):
+            camera_rotation = 180
+        if parseBool(global_container_stack.getMetaDataEntry("repetier_webcamrot_270", False)):
+            camera_rotation = 270
+        if camera_mirror != self._camera_mirror or camera_rotation != self._camera_rotation:
+            self._camera_mirror = camera_mirror
+            self._camera_rotation = camera_rotation
+            self.cameraOrientationChanged.emit()
+
+        try:
+            self._active_camera_index = int(global_container_stack.getMetaDataEntry("repetier_webcam_index", 0))
+        except ValueError:
+            self._active_camera_index = 0
+        self._updateCameras(webcams)
+
+    ##  Make a (possibly relative) url from the webcam settings of Repetier absolute
+    def _resolveCameraUrl(self, camera_url: Optional[str]) -> str:
+        if not camera_url: #empty string or None
+            return ""
+        camera_url = camera_url.replace("127.0.0.1", self._address)
+        if camera_url[:4].lower() == "http": # absolute uri
+            return camera_url
+        elif camera_url[:2] == "//": # protocol-relative
+            return "%s:%s" % (self._protocol, camera_url)
+        elif camera_url[:1] == ":": # domain-relative (on another port)
+            return "%s://%s%s" % (self._protocol, self._address, camera_url)
+        elif camera_url[:1] == "/": # domain-relative (on same port)
+            return "%s://%s:%d%s" % (self._protocol, self._address, self._port, camera_url)
+        Logger.log("w", "Unusable camera url received: %s", camera_url)
+        return ""
+
+    ##  Update the list of webcams from the webcam settings of Repetier
+    def _updateCameras(self, webcams: List[Dict[str, Any]]) -> None:
+        self._cameras = []
+        for webcam in webcams:
+            stream_url = webcam.get("dynamicUrl", "")
+            camera_url = self._resolveCameraUrl(stream_url)
+            if not camera_url:
+                continue
+            self._cameras.append({
+                "name": webcam.get("name", "") or i18n_catalog.i18nc("@label", "Webcam {0}").format(len(self._cameras) + 1),
+                "url": camera_url,
+                "snapshotUrl": self._resolveCameraUrl(webcam.get("staticUrl", "")),
+                "sharesProxy": stream_url[:1] == "/"
+            })
+        if self._cameras != self._cameras_model.items:
+            self._cameras_model.setItems(self._cameras)
+        self._applyActiveCamera()
+
+    def _applyActiveCamera(self) -> None:
+        camera_url = ""
+        camera_snapshot_url = ""
+        camera_shares_proxy = False
+        if self._cameras:
+            if self._active_camera_index >= len(self._cameras):
+                self._active_camera_index = 0
+            camera = self._cameras[self._active_camera_index]
+            camera_url = camera["url"]
+            camera_snapshot_url = camera["snapshotUrl"]
+            camera_shares_proxy = camera["sharesProxy"]
+        else:
+            self._active_camera_index = 0
+
+        if (camera_url, camera_snapshot_url, camera_shares_proxy) == (self._camera_url, self._camera_snapshot_url, self._camera_shares_proxy):
+            return
+        self._camera_url = camera_url
+        self._camera_snapshot_url = camera_snapshot_url
+        self._camera_shares_proxy = camera_shares_proxy
+
+        Logger.log("d", "Set Repetier camera url to %s", self._camera_url)
+        self.cameraUrlChanged.emit()
+        self._updateTimelapse()
+
     def _onUploadProgress(self, bytes_sent: int, bytes_total: int) -> None:
         if not self._progress_message:
             return
@@ -921,16 +1605,47 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
                     return count
             count=count+1
         return rv        
-    def _onUploadFinished(self, reply: QNetworkReply) -> None:
+    def _closeSpooledFile(self) -> None:
+        if self._spooled_file:
+            self._spooled_file.close()
+            self._spooled_file = None
+
+    def _onUploadFinished(self, reply: QNetworkReply, spooled_job: Dict[str, Any]) -> None:
         reply.uploadProgress.disconnect(self._onUploadProgress)
 
         Logger.log("d", "_onUploadFinished %s", reply.url().toString())
         if self._progress_message:
             self._progress_message.hide()
+        self._closeSpooledFile()
+        self._spooled_job = None
 
 #        http_status_code = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
         http_status_code = reply.attribute(QNetworkRequestAttributes.HttpStatusCodeAttribute)
-        Logger.log("d", "_onUploadFinished http_status_code=%d", http_status_code)		
+        if not http_status_code and not self._upload_cancelled:
+            # The server could not be reached; the job stays in the spool, and is sent again after a delay
+            Logger.log("w", "Could not upload %s, trying again in %d seconds", reply.url().toString(), self._spool_retry_delay)
+            self._spool_retry_time = time() + self._spool_retry_delay
+            self._spool_retry_delay = min(self._spool_retry_delay * 2, self._spool_maximum_retry_delay)
+            if not self._unreachable_message:
+                self._unreachable_message = Message(
+                    i18n_catalog.i18nc("@info:status", "Repetier could not be reached. The job is kept, and will be sent when Repetier is back."),
+                    title=i18n_catalog.i18nc("@label", "Repetier")
+                )
+            if not self._unreachable_message.visible:
+                self._unreachable_message.show()
+            return
+        self._spool_retry_delay = self._spool_initial_retry_delay
+        self._spool_retry_time = 0.0
+        if self._unreachable_message:
+            self._unreachable_message.hide()
+        self._spooler.removeJob(spooled_job)
+        if http_status_code in [200, 201] and not self._upload_cancelled and spooled_job["auto_print"] and not spooled_job["forced_queue"]:
+            self._holdSpool()  # until the printer started this job
+        CuraApplication.getInstance().callLater(self._sendSpooledJob)
+        if self._upload_cancelled:
+            return
+
+        Logger.log("d", "_onUploadFinished http_status_code=%d", http_status_code)
         error_string = ""
         if http_status_code == 401:
             error_string = i18n_catalog.i18nc("@info:error", "You are not allowed to upload files to Repetier with the configured API key.")
@@ -952,12 +1667,16 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
             Logger.log("e", error_string)
             return
 
+        self._model_library.invalidate()  # the upload may have added a stored model
+        if self._job_queue.active:
+            self._job_queue.refresh()  # or a job to the queue
+
         #location_url = reply.header(QNetworkRequest.LocationHeader)
         location_url = reply.header(QNetworkRequestKnownHeaders.LocationHeader)
         if location_url:
             Logger.log("d", "Resource created on Repetier instance: %s", location_url.toString())
 
-        if self._forced_queue or not self._auto_print:
+        if spooled_job["forced_queue"] or not spooled_job["auto_print"]:
             if location_url:
                 file_name = location_url.fileName()
                 message = Message(i18n_catalog.i18nc("@info:status", "Saved to Repetier as {0}").format(file_name))
@@ -970,34 +1689,9 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
             )
             message.actionTriggered.connect(self._openRepetierPrint)
             message.show()
-        elif self._auto_print:
-            end_point = location_url.toString().split(self._api_prefix, 1)[1]
-            if self._ufp_supported and end_point.endswith(".ufp"):
-                end_point += ".gcode"
-
-            if not self._wait_for_analysis:
-                self._selectAndPrint(end_point)
-                return
-
-            self._waiting_message = Message(
-                i18n_catalog.i18nc("@info:status", "Waiting for Repetier to complete Gcode analysis..."),
-                title=i18n_catalog.i18nc("@label", "Repetier"),
-                progress=-1, lifetime=0, dismissable=False, use_inactivity_timer=False
-            )
-            self._waiting_message.addAction(
-                "print", i18n_catalog.i18nc("@action:button", "Print now"), "",
-                i18n_catalog.i18nc("@action:tooltip", "Stop waiting for the Gcode analysis and start printing immediately"),
-                button_style=Message.ActionButtonStyle.SECONDARY
-            )
-            self._waiting_message.addAction(
-                "cancel", i18n_catalog.i18nc("@action:button", "Cancel"), "",
-                i18n_catalog.i18nc("@action:tooltip", "Abort the printjob")
-            )
-            self._waiting_message.actionTriggered.connect(self._stopWaitingForAnalysis)
-            self._waiting_message.show()
-
-            self._waiting_for_analysis = True
-            self._polling_end_points.append(end_point)  # start polling the API for information about this file
+        elif self._wait_for_analysis:
+            # The spool is held while waiting, so this is never the upload of a second job to wait for
+            self._startWaitingForAnalysis(spooled_job["file_name"])
 
     def _createPrinterList(self) -> None:
         printer = PrinterOutputModel(output_controller=self._output_controller, number_of_extruders=self._number_of_extruders)
@@ -1005,13 +1699,6 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
         self._printers = [printer]
         self.printersChanged.emit()
 
-    def _selectAndPrint(self, end_point: str) -> None:
-        command = {
-            "command": "select",
-            "print": True
-        }
-        self._sendCommandToApi(end_point, command)
-
     def _showErrorMessage(self, error_string: str) -> None:
         if self._error_message:
             self._error_message.hide()
@@ -1021,9 +1708,11 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
     def _openRepetierPrint(self, message_id: Optional[str] = None, action_id: Optional[str] = None) -> None:
         QDesktopServices.openUrl(QUrl(self._base_url))
 
-    def _createEmptyRequest(self, target: str, content_type: Optional[str] = "application/json") -> QNetworkRequest:
+    ##  \param spooled_job The spooled job that is uploaded, for upload requests; its settings decide whether
+    #   it is printed right away, or only stored
+    def _createEmptyRequest(self, target: str, content_type: Optional[str] = "application/json", spooled_job: Optional[Dict[str, Any]] = None) -> QNetworkRequest:
         if "upload" in target:
-             if self._forced_queue or not self._auto_print:
+             if not spooled_job or spooled_job["forced_queue"] or not spooled_job["auto_print"]:
                   request = QNetworkRequest(QUrl(self._save_url + "?a=" + target))
              else:
                   request = QNetworkRequest(QUrl(self._job_url + "?a=" + target))
@@ -1034,6 +1723,8 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
 
         request.setRawHeader(b"X-Api-Key", self._api_key)
         request.setRawHeader(b"User-Agent", self._user_agent.encode())
+        # Identifies the replies of this device when the network manager is shared
+        request.setAttribute(QNetworkRequestAttributes.User, self._id)
 
         if content_type is not None:
             request.setHeader(QNetworkRequest.KnownHeaders.ContentTypeHeader, content_type)
@@ -1099,4 +1790,29 @@ class RepetierOutputDevice(NetworkedPrinterOutputDevice):
         reply = self._manager.post(request, body)
         if on_progress is not None:
             reply.uploadProgress.connect(on_progress)
-        self._registerOnFinishedCallback(reply, on_finished)
\ No newline at end of file
+        self._registerOnFinishedCallback(reply, on_finished)
+
+    ## Overloaded from NetworkedPrinterOutputDevice.postFormWithParts() to pass the spooled job that is
+    #  uploaded to _createEmptyRequest
+    def postFormWithParts(self, target: str, parts: List[QHttpPart],
+                          on_finished: Optional[Callable[[QNetworkReply], None]],
+                          on_progress: Optional[Callable[[int, int], None]] = None,
+                          spooled_job: Optional[Dict[str, Any]] = None) -> Optional[QNetworkReply]:
+        self._validateManager()
+
+        request = self._createEmptyRequest(target, content_type = None, spooled_job = spooled_job)
+        multi_post_part = QHttpMultiPart(QHttpMultiPart.ContentType.FormDataType)
+        for part in parts:
+            multi_post_part.append(part)
+        self._last_request_time = time()
+
+        if not self._manager:
+            Logger.log("e", "Could not find manager.")
+            return None
+
+        reply = self._manager.post(request, multi_post_part)
+        self._kept_alive_multiparts[reply] = multi_post_part
+        if on_progress is not None:
+            reply.uploadProgress.connect(on_progress)
+        self._registerOnFinishedCallback(reply, on_finished)
+        return reply
\ No newline at end of file
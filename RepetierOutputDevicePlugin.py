@@ -3,34 +3,46 @@
 
 from UM.OutputDevice.OutputDevicePlugin import OutputDevicePlugin
 from .RepetierOutputDevice import RepetierOutputDevice
+from .RepetierInstance import RepetierInstance
+from .RepetierDiscovery import RepetierDiscovery
+from .RepetierServerMonitor import RepetierServerMonitor
+from .RepetierFarmModel import RepetierFarmModel
+from .RepetierFarmOutputDevice import RepetierFarmOutputDevice
+from .RepetierPreferences import RepetierPreferences
 
 from UM.Signal import Signal, signalemitter
 from UM.Application import Application
 from UM.Logger import Logger
 from UM.Util import parseBool
+from UM.Settings.ContainerRegistry import ContainerRegistry
 
 from PyQt6.QtCore import QTimer
 import time
-import json
-import re
 import base64
 import os.path
 import ipaddress
 
+from io import StringIO
+
 from typing import Any, Callable, Dict, List, Optional, TYPE_CHECKING
 if TYPE_CHECKING:
     from cura.PrinterOutput.PrinterOutputModel import PrinterOutputModel
+    from UM.Settings.ContainerStack import ContainerStack
 
 ##      This plugin handles the connection detection & creation of output device objects for Repetier-connected printers.
-#       Zero-Conf is used to detect printers, which are saved in a dict.
+#       Printers are added manually, or found by scanning the local network (see RepetierDiscovery); they are saved in a dict.
 #       If we discover an instance that has the same key as the active machine instance a connection is made.
 @signalemitter
 class RepetierOutputDevicePlugin(OutputDevicePlugin):
+    _server_poll_interval = 10000  # in milliseconds, between polls of a monitored server
+    _minimum_server_poll_spacing = 500  # in milliseconds, between polls of all monitored servers together
+
     def __init__(self) -> None:
         super().__init__()
-        self._zero_conf = None
-        self._browser = None
-        self._instances = {}
+        self._instances = {}  # type: Dict[str, RepetierInstance]
+        self._discovered_instances = {}  # type: Dict[str, tuple[str, int, Dict[bytes, bytes]]]
+        self._found_instances = set()  # type: set[str]  # instances found by the current network scan
+        self._devices = {}  # type: Dict[str, RepetierOutputDevice]
 
         # Because the model needs to be created in the same thread as the QMLEngine, we use a signal.
         self.addInstanceSignal.connect(self.addInstance)
@@ -39,21 +51,35 @@ class RepetierOutputDevicePlugin(OutputDevicePlugin):
 
         # Load custom instances from preferences
         self._preferences = Application.getInstance().getPreferences()
-        self._preferences.addPreference("Repetier/manual_instances", "{}")
-
-        try:
-            self._manual_instances = json.loads(self._preferences.getValue("Repetier/manual_instances"))
-        except ValueError:
-            self._manual_instances = {}
-        if not isinstance(self._manual_instances, dict):
-            self._manual_instances = {}
-
-        self._name_regex = re.compile("Repetier instance (\".*\"\.|on )(.*)\.")
-
-        self._keep_alive_timer = QTimer()
-        self._keep_alive_timer.setInterval(2000)
-        self._keep_alive_timer.setSingleShot(True)
-        self._keep_alive_timer.timeout.connect(self._keepDiscoveryAlive)
+        # Scanning probes every address of the local networks, so it is only done when the user asks for it
+        self._preferences.addPreference("Repetier/scan_network", False)
+        self._preferences.addPreference("Repetier/background_monitoring", False)
+        self._preferences.preferenceChanged.connect(self._onPreferenceChanged)
+
+        self._plugin_preferences = RepetierPreferences.getInstance()
+        self._manual_instances = self._plugin_preferences.getManualInstances()
+
+        self._discovery = RepetierDiscovery()
+        self._discovery.serverFound.connect(self._onServerFound)
+        self._discovery.discoveryFinished.connect(self._onDiscoveryFinished)
+
+        # Every server with a printer that is linked to a machine has a monitor, which polls all its printers at
+        # a low rate and is the connection pool for the server. Background monitoring (see the preference) adds
+        # the farm overview, and keeps the devices of inactive machines, fed by the monitors.
+        self._server_monitors = {}  # type: Dict[str, RepetierServerMonitor]
+        self._monitored_instances = {}  # type: Dict[str, List[tuple[str, str, str]]]  # instance id, name and slug per server
+        self._farm_model = RepetierFarmModel()
+        self._server_monitors_timer = QTimer()
+        self._server_monitors_timer.setInterval(0)
+        self._server_monitors_timer.setSingleShot(True)
+        self._server_monitors_timer.timeout.connect(self._updateServerMonitors)
+
+        # Printing on any idle printer of the type of the active machine, chosen from the monitored printers
+        self._farm_instances = {}  # type: Dict[str, tuple[str, str, str]]  # server key, slug and definition id per instance id
+        self._farm_device = RepetierFarmOutputDevice()
+        self._farm_device.setCandidatesFunction(self._getFarmCandidates)
+        self._farm_device.setSendFunction(self._sendFarmJob)
+        self._farm_device_added = False
 
     addInstanceSignal = Signal()
     removeInstanceSignal = Signal()
@@ -64,13 +90,12 @@ class RepetierOutputDevicePlugin(OutputDevicePlugin):
         self.startDiscovery()
 
     def startDiscovery(self):
-        if self._browser:
-            self._browser.cancel()
-            self._browser = None
-            self._printers = {}
-        instance_keys = list(self._instances.keys())
-        for key in instance_keys:
-            self.removeInstance(key)
+        # Only touch the instances that changed, so instances that are already connected stay connected
+        changed = False
+        for key in list(self._instances.keys()):
+            if key not in self._manual_instances and key not in self._discovered_instances:
+                self.removeInstance(key)
+                changed = True
 
         # Add manual instances from preference
         for name, properties in self._manual_instances.items():
@@ -82,96 +107,406 @@ class RepetierOutputDevicePlugin(OutputDevicePlugin):
 				b'repetier_id': properties.get("repetier_id", "").encode("utf-8"),
                 b"manual": b"true"
             } # These additional properties use bytearrays to mimick the output of zeroconf
-            self.addInstance(name, properties["address"], properties["port"], additional_properties)
+            if self._updateInstance(name, properties["address"], properties["port"], additional_properties):
+                changed = True
 
-        self.instanceListChanged.emit()
-    def _keepDiscoveryAlive(self) -> None:
-        if not self._browser or not self._browser.is_alive():
-            Logger.log("w", "Zeroconf discovery has died, restarting discovery of Repetier instances.")
-            self.startDiscovery()
+        if changed:
+            self.instanceListChanged.emit()
 
-    def addManualInstance(self, name: str, address: str, port: int, path: str, useHttps: bool = False, userName: str = "", password: str = "", repetierid: str = "")-> None:
-        self._manual_instances[name] = {"address": address, "port": port, "path": path, "useHttps": useHttps, "userName": userName, "password": password, "repetier_id":repetierid}
-        self._preferences.setValue("Repetier/manual_instances", json.dumps(self._manual_instances))
+        if parseBool(self._preferences.getValue("Repetier/scan_network")) and not self._discovery.isRunning():
+            self._found_instances = set()
+            self._discovery.start()
+
+    ##  Handler for when a network scan finds a Repetier server; each printer on the server becomes an instance
+    def _onServerFound(self, address: str, port: int, info: Dict[str, Any]) -> None:
+        for printer in info.get("printers", []):
+            slug = printer.get("slug", "")
+            if not slug:
+                continue
+            if any(
+                properties["address"] == address and properties["port"] == port and properties.get("repetier_id", "") == slug
+                for properties in self._manual_instances.values()
+            ):
+                continue  # this printer was already added manually
+
+            name = "%s on %s" % (printer.get("name", slug), address)
+            if name in self._manual_instances:
+                continue
+            properties = {
+                b"path": b"/",
+                b"useHttps": b"false",
+                b"repetier_id": slug.encode("utf-8"),
+                b"version": str(info.get("version", "")).encode("utf-8"),
+                b"manual": b"false"
+            }
+            self._found_instances.add(name)
+            if name in self._instances and self._instances[name].hasSettings(address, port, properties):
+                continue
+
+            self._discovered_instances[name] = (address, port, properties)
+            if name in self._instances:
+                self.removeInstance(name)
+            self.addInstanceSignal.emit(name, address, port, properties)
+
+    ##  Remove the instances that were found before, but not by the scan that just finished
+    def _onDiscoveryFinished(self) -> None:
+        changed = False
+        for name in list(self._discovered_instances.keys()):
+            if name not in self._found_instances:
+                del self._discovered_instances[name]
+                self.removeInstance(name)
+                changed = True
+        if changed:
+            self.instanceListChanged.emit()
 
-        properties = { b"path": path.encode("utf-8"), b"useHttps": b"true" if useHttps else b"false", b'userName': userName.encode("utf-8"), b'password': password.encode("utf-8"), b"manual": b"true",b'repetier_id':repetierid.encode("utf-8")}
+    ##  Create the instance if it does not exist yet, or replace it if its address or properties changed
+    #   \return True if the instance was created or replaced
+    def _updateInstance(self, name: str, address: str, port: int, properties: Dict[bytes, bytes]) -> bool:
+        if name in self._instances and self._instances[name].hasSettings(address, port, properties):
+            return False
 
         if name in self._instances:
             self.removeInstance(name)
-
         self.addInstance(name, address, port, properties)
-        self.instanceListChanged.emit()
+        return True
+
+    def addManualInstance(self, name: str, address: str, port: int, path: str, useHttps: bool = False, userName: str = "", password: str = "", repetierid: str = "")-> None:
+        self.addManualInstances({name: {"address": address, "port": port, "path": path, "useHttps": useHttps, "userName": userName, "password": password, "repetier_id":repetierid}})
+
+    ##  Add or replace several manual instances at once, eg from an import; the instance list is only updated once
+    #   \param instances The properties of the instances (address, port, path, useHttps, userName, password, repetier_id) by name
+    def addManualInstances(self, instances: Dict[str, Dict[str, Any]]) -> None:
+        changed = False
+        for name, settings in instances.items():
+            self._discovered_instances.pop(name, None)
+            self._plugin_preferences.setManualInstance(name, settings)
+
+            properties = {
+                b"path": settings["path"].encode("utf-8"),
+                b"useHttps": b"true" if settings["useHttps"] else b"false",
+                b'userName': settings["userName"].encode("utf-8"),
+                b'password': settings["password"].encode("utf-8"),
+                b"manual": b"true",
+                b'repetier_id': settings["repetier_id"].encode("utf-8")
+            }
+            if self._updateInstance(name, settings["address"], settings["port"], properties):
+                changed = True
+
+        if changed:
+            self.instanceListChanged.emit()
 
     def removeManualInstance(self, name: str) -> None:
         if name in self._instances:
             self.removeInstance(name)
             self.instanceListChanged.emit()
 
-        if name in self._manual_instances:
-            self._manual_instances.pop(name, None)
-            self._preferences.setValue("Repetier/manual_instances", json.dumps(self._manual_instances))
+        self._plugin_preferences.removeManualInstance(name)
 
     ##  Stop looking for devices on network.
     def stop(self) -> None:
-        self._keep_alive_timer.stop()
-        if self._browser:
-            self._browser.cancel()
-        self._browser = None # type: Optional[ServiceBrowser]
-        if self._zero_conf:
-            self._zero_conf.close()
-
-    def getInstances(self) -> Dict[str, Any]:
+        self._plugin_preferences.flush()
+        self._discovery.stop()
+        for monitor in self._server_monitors.values():
+            monitor.stop()
+
+    def getInstances(self) -> Dict[str, RepetierInstance]:
         return self._instances
 
-    def getInstanceById(self, instance_id: str) -> Optional[RepetierOutputDevice]:
+    def getInstanceById(self, instance_id: str) -> Optional[RepetierInstance]:
         instance = self._instances.get(instance_id, None)
         if instance:
             return instance
         Logger.log("w", "No instance found with id %s", instance_id)
         return None
 
+    ##  Get the output device of an instance, if it has been created
+    def getDeviceById(self, instance_id: str) -> Optional[RepetierOutputDevice]:
+        return self._devices.get(instance_id, None)
+
     def reCheckConnections(self) -> None:
         global_container_stack = Application.getInstance().getGlobalContainerStack()
         if not global_container_stack:
             return
 
-        for key in self._instances:
-            if key == global_container_stack.getMetaDataEntry("id"):
-                api_key = global_container_stack.getMetaDataEntry("repetier_api_key", "")
-                self._instances[key].setApiKey(api_key)
-                self._instances[key].setShowCamera(parseBool(global_container_stack.getMetaDataEntry("repetier_show_camera", "true")))
-                self._instances[key].connectionStateChanged.connect(self._onInstanceConnectionStateChanged)
-                self._instances[key].connect()
-            else:
-                if self._instances[key].isConnected():
-                    self._instances[key].close()
+        # Only the active machine has an output device that polls its printer. Devices of other machines are
+        # released, unless their printers are monitored in the background; then they are suspended and fed by
+        # the monitor of their server, so switching back to them does not need to connect again.
+        keep_devices = self._isBackgroundMonitoringEnabled()
+        active_key = global_container_stack.getMetaDataEntry("id")
+        for key in list(self._devices.keys()):
+            if key != active_key:
+                if not keep_devices:
+                    self._releaseDevice(key)
+                elif not self._devices[key].isSuspended():
+                    self.getOutputDeviceManager().removeOutputDevice(key)
+                    self._devices[key].suspend()
+                    self._feedSuspendedDevices()
+
+        if active_key in self._instances:
+            self._connectDevice(active_key, global_container_stack)
+        self._server_monitors_timer.start()
 
     ##  Because the model needs to be created in the same thread as the QMLEngine, we use a signal.
     def addInstance(self, name: str, address: str, port: int, properties: Dict[bytes, bytes]) -> None:
-        instance = RepetierOutputDevice(name, address, port, properties)
+        instance = RepetierInstance(name, address, port, properties)
         self._instances[instance.getId()] = instance
         global_container_stack = Application.getInstance().getGlobalContainerStack()
         if global_container_stack and instance.getId() == global_container_stack.getMetaDataEntry("id"):
-            api_key = global_container_stack.getMetaDataEntry("repetier_api_key", "")
-            instance.setApiKey(api_key)
-            instance.setShowCamera(parseBool(global_container_stack.getMetaDataEntry("repetier_show_camera", "true")))
-            instance.connectionStateChanged.connect(self._onInstanceConnectionStateChanged)
-            instance.connect()
+            self._connectDevice(instance.getId(), global_container_stack)
+        self._server_monitors_timer.start()
 
     def removeInstance(self, name: str) -> None:
-        instance = self._instances.pop(name, None)
-        if instance:
-            if instance.isConnected():
-                instance.connectionStateChanged.disconnect(self._onInstanceConnectionStateChanged)
-                instance.disconnect()
+        self._instances.pop(name, None)
+        self._releaseDevice(name)
+        self._server_monitors_timer.start()
+
+    ##  A compact overview of the state of all monitored printers
+    def getFarmModel(self) -> RepetierFarmModel:
+        return self._farm_model
+
+    def _isBackgroundMonitoringEnabled(self) -> bool:
+        return parseBool(self._preferences.getValue("Repetier/background_monitoring"))
+
+    def _onPreferenceChanged(self, preference: str) -> None:
+        if preference == "Repetier/scan_network":
+            if parseBool(self._preferences.getValue("Repetier/scan_network")):
+                self.startDiscovery()
+            else:
+                self._discovery.stop()  # the printers that were found so far are kept until Cura is restarted
+        elif preference == "Repetier/background_monitoring":
+            if not self._isBackgroundMonitoringEnabled():
+                self.reCheckConnections()  # release the devices of inactive machines
+            self._server_monitors_timer.start()
+
+    ##  Start or stop monitoring the servers of the instances that are linked to a machine
+    #   Every server is monitored at the same time, regardless of which machine is active; the monitors of
+    #   servers without linked machines are removed, unless a device still uses them as connection pool.
+    def _updateServerMonitors(self) -> None:
+        monitored_instances = {}  # type: Dict[str, List[tuple[str, str, str]]]
+        api_keys = {}  # type: Dict[str, tuple[str, str]]
+        farm_instances = {}  # type: Dict[str, tuple[str, str, str]]
+        registry = ContainerRegistry.getInstance()
+        for key, instance in self._instances.items():
+            stacks = registry.findContainerStacks(id = key)
+            if not stacks:
+                continue  # this instance is not linked to a machine
+            self._applyImportedSettings(key, stacks[0])
+            metadata = stacks[0].getMetaData()
+            slug = metadata.get("repetier_id", "") or instance.repetier_id
+            if not slug:
+                continue
+            server_key = self._getServerKey(instance)
+            monitored_instances.setdefault(server_key, []).append((key, metadata.get("name", instance.name), slug))
+            api_key = metadata.get("repetier_api_key", "")
+            if api_key and server_key not in api_keys:
+                api_keys[server_key] = (slug, api_key)
+            farm_instances[key] = (server_key, slug, stacks[0].getBottom().getId())
+
+        device_servers = {self._getServerKey(self._instances[key]) for key in self._devices if key in self._instances}
+        for server_key in list(self._server_monitors.keys()):
+            if server_key not in monitored_instances:
+                if server_key in device_servers:
+                    self._server_monitors[server_key].stop()  # keep the connection pool of the device
+                else:
+                    self._server_monitors.pop(server_key).stop()
+
+        # Spread the polls of all servers evenly, and slow them down when there are many servers,
+        # so the total number of requests stays bounded
+        poll_interval = max(self._server_poll_interval, len(monitored_instances) * self._minimum_server_poll_spacing)
+        for index, (server_key, instances) in enumerate(monitored_instances.items()):
+            monitor = self._getServerMonitor(self._instances[instances[0][0]])
+            (slug, api_key) = api_keys.get(server_key, (instances[0][2], ""))
+            monitor.setPrinter(slug, api_key)
+            monitor.setPollInterval(poll_interval)
+            monitor.start(index * poll_interval // len(monitored_instances))
+
+        self._monitored_instances = monitored_instances
+        self._farm_instances = farm_instances
+        self._updateFarmModel()
+        self._updateFarmDevice()
+
+    ##  Instances on the same server (with the same credentials) share a monitor
+    def _getServerKey(self, instance: RepetierInstance) -> str:
+        return "%s|%s" % (instance.baseURL, instance.getProperty("userName"))
+
+    ##  Get the monitor of the server of an instance, which is also the connection pool for the server
+    def _getServerMonitor(self, instance: RepetierInstance) -> RepetierServerMonitor:
+        server_key = self._getServerKey(instance)
+        monitor = self._server_monitors.get(server_key)
+        if monitor is None:
+            monitor = RepetierServerMonitor(instance.baseURL, RepetierOutputDevice.getUserAgent(), instance.getProperty("userName"), instance.getProperty("password"))
+            monitor.printersUpdated.connect(self._onServerPrintersUpdated)
+            self._server_monitors[server_key] = monitor
+        return monitor
+
+    def _onServerPrintersUpdated(self) -> None:
+        self._updateFarmModel()
+        self._feedSuspendedDevices()
+
+    ##  Pass the state the monitors received to the devices of inactive machines
+    def _feedSuspendedDevices(self) -> None:
+        for server_key, instances in self._monitored_instances.items():
+            monitor = self._server_monitors.get(server_key)
+            for (instance_id, _, slug) in instances:
+                device = self._devices.get(instance_id)
+                if device and device.isSuspended():
+                    device.applyMonitorState(monitor.printers().get(slug) if monitor and monitor.isOnline() else None)
+
+    def _getActiveKey(self) -> str:
+        global_container_stack = Application.getInstance().getGlobalContainerStack()
+        return global_container_stack.getMetaDataEntry("id") if global_container_stack else ""
+
+    def _updateFarmModel(self) -> None:
+        active_key = self._getActiveKey()
+
+        items = []  # type: List[Dict[str, Any]]
+        if not self._isBackgroundMonitoringEnabled():
+            self._farm_model.updateItems(items)  # the overview is part of background monitoring
+            return
+        for server_key, instances in self._monitored_instances.items():
+            monitor = self._server_monitors.get(server_key)
+            printers = monitor.printers() if monitor else {}
+            for (instance_id, name, slug) in instances:
+                items.append(RepetierFarmModel.createItem(instance_id, name, printers.get(slug), instance_id == active_key))
+        self._farm_model.updateItems(items)
+
+    ##  Offer printing on any idle printer when more than one monitored printer has the type of the active machine
+    def _updateFarmDevice(self) -> None:
+        show_device = self._isBackgroundMonitoringEnabled() and len(self._getFarmInstanceIds()) > 1
+        if show_device != self._farm_device_added:
+            self._farm_device_added = show_device
+            if show_device:
+                self.getOutputDeviceManager().addOutputDevice(self._farm_device)
+            else:
+                self.getOutputDeviceManager().removeOutputDevice(self._farm_device.getId())
+
+    ##  The monitored instances with the same machine definition as the active machine
+    def _getFarmInstanceIds(self) -> List[str]:
+        global_container_stack = Application.getInstance().getGlobalContainerStack()
+        if not global_container_stack:
+            return []
+        definition_id = global_container_stack.getBottom().getId()
+        return [key for key, farm_instance in self._farm_instances.items() if farm_instance[2] == definition_id and key in self._instances]
+
+    ##  The printers the farm output device can choose from, with the state their server monitors last received
+    def _getFarmCandidates(self) -> List[Dict[str, Any]]:
+        candidates = []  # type: List[Dict[str, Any]]
+        for key in self._getFarmInstanceIds():
+            (server_key, slug, _) = self._farm_instances[key]
+            monitor = self._server_monitors.get(server_key)
+            if monitor is None:
+                continue
+            names = [name for (instance_id, name, _) in self._monitored_instances.get(server_key, []) if instance_id == key]
+            candidates.append({
+                "instanceId": key,
+                "name": names[0] if names else self._instances[key].name,
+                "printer": monitor.printers().get(slug),
+                "idleSince": monitor.idleSince(slug)
+            })
+        return candidates
+
+    ##  Spool a print job on the printer the farm output device chose
+    #   The job is sent by the output device of the printer, with the print settings of its machine; a
+    #   printer without an output device gets one, which is suspended like the devices of inactive machines.
+    #   \return Whether the job was spooled
+    def _sendFarmJob(self, key: str, file_name: str, gcode_stream: StringIO) -> bool:
+        stacks = ContainerRegistry.getInstance().findContainerStacks(id = key)
+        if not stacks or key not in self._instances:
+            return False
+        device = self._devices.get(key)
+        if device is None:
+            device = self._createDevice(key)
+            device.setNetworkManager(self._getServerMonitor(self._instances[key]).networkManager())
+            self._applyImportedSettings(key, stacks[0])
+            self._applyMachineSettings(device, stacks[0])
+            device.connect()  # to learn the configuration of the printer
+            device.suspend()  # fed by the monitor of its server from now on
+        return device.spoolJob(file_name, gcode_stream, {
+            "auto_print": parseBool(stacks[0].getMetaDataEntry("repetier_auto_print", True)),
+            "store_print": parseBool(stacks[0].getMetaDataEntry("repetier_store_print", False)),
+            "store_group": stacks[0].getMetaDataEntry("repetier_store_group", "#")
+        })
+
+    def _createDevice(self, key: str) -> RepetierOutputDevice:
+        instance = self._instances[key]
+        device = RepetierOutputDevice(key, instance.ipAddress, instance.port, instance.getProperties())
+        device.connectionStateChanged.connect(self._onInstanceConnectionStateChanged)
+        device.setFarmModel(self._farm_model)
+        self._devices[key] = device
+        return device
+
+    ##  Create the output device of an instance (if it does not exist yet), and connect it
+    def _connectDevice(self, key: str, global_container_stack: "ContainerStack") -> None:
+        device = self._devices.get(key)
+        if device is None:
+            device = self._createDevice(key)
+
+        # Share the connections to the server with its monitor and the devices of its other printers
+        device.setNetworkManager(self._getServerMonitor(self._instances[key]).networkManager())
+
+        self._applyImportedSettings(key, global_container_stack)
+        self._applyMachineSettings(device, global_container_stack)
+        if device.isSuspended() and device.isConnected():
+            device.resume()
+            self.getOutputDeviceManager().addOutputDevice(device)
+        else:
+            device.connect()
+
+    def _releaseDevice(self, key: str) -> None:
+        device = self._devices.pop(key, None)
+        if device:
+            device.connectionStateChanged.disconnect(self._onInstanceConnectionStateChanged)
+            if device.isConnected():
+                device.disconnect()
+            device.setNetworkManager(None)
+            self.getOutputDeviceManager().removeOutputDevice(key)
+
+    ##  Store the settings that were imported for an instance before a machine was linked to it (see
+    #   DiscoverRepetierAction.importInstances) in the metadata of the machine, once it is linked
+    def _applyImportedSettings(self, key: str, global_container_stack: "ContainerStack") -> None:
+        settings = self._plugin_preferences.getImportedSettings(key)
+        if not settings:
+            return
+        Logger.log("d", "Applying the imported settings of %s to its machine", key)
+        for setting_key, value in settings.items():
+            global_container_stack.setMetaDataEntry(setting_key, value)
+        self._plugin_preferences.removeImportedSettings(key)
+
+    ##  Pass the settings that are stored in the metadata of the machine to its output device
+    def _applyMachineSettings(self, instance: RepetierOutputDevice, global_container_stack: "ContainerStack") -> None:
+        api_key = global_container_stack.getMetaDataEntry("repetier_api_key", "")
+        instance.setApiKey(api_key)
+        instance.setShowCamera(parseBool(global_container_stack.getMetaDataEntry("repetier_show_camera", "true")))
+        try:
+            maximum_fps = max(0.0, float(global_container_stack.getMetaDataEntry("repetier_webcam_max_fps", 15)))
+        except ValueError:
+            maximum_fps = 15.0
+        instance.setCameraMaximumFps(maximum_fps)
+        try:
+            snapshot_interval = max(0, int(float(global_container_stack.getMetaDataEntry("repetier_webcam_snapshot_interval", 0)) * 1000))
+        except ValueError:
+            snapshot_interval = 0
+        instance.setCameraSnapshotMode(
+            parseBool(global_container_stack.getMetaDataEntry("repetier_webcam_snapshot", False)),
+            snapshot_interval
+        )
+        try:
+            timelapse_interval = max(0.0, float(global_container_stack.getMetaDataEntry("repetier_timelapse_interval", 0)))
+        except ValueError:
+            timelapse_interval = 0.0
+        instance.setTimelapse(
+            parseBool(global_container_stack.getMetaDataEntry("repetier_timelapse", False)),
+            timelapse_interval
+        )
 
     ##  Handler for when the connection state of one of the detected instances changes
     def _onInstanceConnectionStateChanged(self, key: str) -> None:
-        if key not in self._instances:
+        if key not in self._devices:
             return
 
-        if self._instances[key].isConnected():
-            self.getOutputDeviceManager().addOutputDevice(self._instances[key])
+        if self._devices[key].isConnected():
+            if key == self._getActiveKey():
+                self.getOutputDeviceManager().addOutputDevice(self._devices[key])
         else:
             self.getOutputDeviceManager().removeOutputDevice(key)
 
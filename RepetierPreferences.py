@@ -0,0 +1,140 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierPreferences is released under the terms of the AGPLv3 or higher.
+
+from PyQt6.QtCore import QTimer
+
+from UM.Application import Application
+from UM.Logger import Logger
+
+import base64
+import binascii
+import json
+
+from typing import Any, Dict
+
+#
+# The preferences of the plugin that hold collections: the manually added instances, the API keys
+# of instances that are not linked to the active machine, and the machine settings that were imported for
+# instances that are not linked to a machine yet. All of them are keyed by the key of the instance, which is
+# also the id of the machine that is linked to it.
+#
+# The preferences are read once, when the store is created. Changes are made to the copy in memory, and
+# are written back after a short delay, so a series of changes (eg an import of many instances) results
+# in a single write per preference. Each preference has a single encoding, used for reading and writing:
+# the manual instances are stored as JSON, the keys cache and the imported settings as base64-encoded JSON
+# so the API keys are not stored in plain sight. Older versions of the plugin stored the keys cache as plain JSON; that is still
+# read.
+#
+class RepetierPreferences:
+    _save_delay = 500  # in milliseconds
+
+    _manual_instances_preference = "Repetier/manual_instances"
+    _keys_cache_preference = "Repetier/keys_cache"
+    _imported_settings_preference = "Repetier/imported_settings"
+
+    __instance = None  # type: RepetierPreferences | None
+
+    @classmethod
+    def getInstance(cls) -> "RepetierPreferences":
+        if cls.__instance is None:
+            cls.__instance = RepetierPreferences()
+        return cls.__instance
+
+    def __init__(self) -> None:
+        application = Application.getInstance()
+        self._preferences = application.getPreferences()
+        self._preferences.addPreference(self._manual_instances_preference, "{}")
+        self._preferences.addPreference(self._keys_cache_preference, "")
+        self._preferences.addPreference(self._imported_settings_preference, "")
+
+        self._manual_instances = self._readDict(self._manual_instances_preference)  # type: Dict[str, Dict[str, Any]]
+        self._keys_cache = self._readDict(self._keys_cache_preference)  # type: Dict[str, str]
+        self._imported_settings = self._readDict(self._imported_settings_preference)  # type: Dict[str, Dict[str, str]]
+
+        self._changed_preferences = set()  # type: set[str]
+        self._save_timer = QTimer()
+        self._save_timer.setInterval(self._save_delay)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.timeout.connect(self.flush)
+
+        application.applicationShuttingDown.connect(self.flush)
+
+    ##  The manually added instances by name; the returned dict must not be changed
+    def getManualInstances(self) -> Dict[str, Dict[str, Any]]:
+        return self._manual_instances
+
+    def setManualInstance(self, name: str, properties: Dict[str, Any]) -> None:
+        if self._manual_instances.get(name) == properties:
+            return
+        self._manual_instances[name] = properties
+        self._scheduleSave(self._manual_instances_preference)
+
+    def removeManualInstance(self, name: str) -> None:
+        if name not in self._manual_instances:
+            return
+        del self._manual_instances[name]
+        self._scheduleSave(self._manual_instances_preference)
+
+    def getCachedApiKey(self, instance_id: str) -> str:
+        return self._keys_cache.get(instance_id, "")
+
+    def setCachedApiKey(self, instance_id: str, api_key: str) -> None:
+        if self._keys_cache.get(instance_id) == api_key:
+            return
+        self._keys_cache[instance_id] = api_key
+        self._scheduleSave(self._keys_cache_preference)
+
+    ##  The machine settings (metadata entries) that were imported for an instance that is not linked to a
+    #   machine yet; the returned dict must not be changed
+    def getImportedSettings(self, instance_id: str) -> Dict[str, str]:
+        return self._imported_settings.get(instance_id, {})
+
+    def setImportedSettings(self, instance_id: str, settings: Dict[str, str]) -> None:
+        if self._imported_settings.get(instance_id) == settings:
+            return
+        self._imported_settings[instance_id] = settings
+        self._scheduleSave(self._imported_settings_preference)
+
+    def removeImportedSettings(self, instance_id: str) -> None:
+        if instance_id not in self._imported_settings:
+            return
+        del self._imported_settings[instance_id]
+        self._scheduleSave(self._imported_settings_preference)
+
+    ##  Write the changed preferences right away
+    def flush(self) -> None:
+        self._save_timer.stop()
+        changed_preferences = self._changed_preferences
+        self._changed_preferences = set()
+
+        if self._manual_instances_preference in changed_preferences:
+            self._preferences.setValue(self._manual_instances_preference, json.dumps(self._manual_instances))
+        if self._keys_cache_preference in changed_preferences:
+            keys_cache = base64.b64encode(json.dumps(self._keys_cache).encode("utf-8")).decode("ascii")
+            self._preferences.setValue(self._keys_cache_preference, keys_cache)
+        if self._imported_settings_preference in changed_preferences:
+            imported_settings = base64.b64encode(json.dumps(self._imported_settings).encode("utf-8")).decode("ascii")
+            self._preferences.setValue(self._imported_settings_preference, imported_settings)
+
+    def _scheduleSave(self, preference: str) -> None:
+        self._changed_preferences.add(preference)
+        if not self._save_timer.isActive():
+            self._save_timer.start()
+
+    def _readDict(self, preference: str) -> Dict[str, Any]:
+        value = self._preferences.getValue(preference)
+        if not value:
+            return {}
+
+        try:
+            data = json.loads(value)
+        except ValueError:
+            try:
+                data = json.loads(base64.b64decode(value.encode("ascii"), validate = True).decode("utf-8"))
+            except (ValueError, binascii.Error, UnicodeError):
+                Logger.log("w", "Could not read preference %s, it is reset", preference)
+                data = {}
+
+        if not isinstance(data, dict):
+            return {}
+        return data
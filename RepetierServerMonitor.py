@@ -0,0 +1,176 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierServerMonitor is released under the terms of the AGPLv3 or higher.
+
+from PyQt6.QtCore import QObject, QUrl, QTimer, pyqtSignal
+from PyQt6.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest, QSslConfiguration, QSslSocket
+
+from UM.Logger import Logger
+
+from .NetworkReplyTimeout import NetworkReplyTimeout
+
+import base64
+import json
+
+from time import monotonic
+
+from typing import Any, Dict, Optional
+
+#
+# Keeps an eye on all printers of a single Repetier server, at a low rate.
+#
+# A single listPrinter request returns the state of every printer on the server, so the
+# printers of a server share both the request and the connection, no matter how many of them
+# are monitored. Polls are skipped while the previous poll is still running, so a slow server
+# never has more than one outstanding request from the monitor.
+#
+# The network manager of the monitor is the connection pool for the server: output devices for
+# printers on the same server use it too, so the number of connections to a server stays bounded
+# no matter how many of its printers are connected.
+#
+# The monitor also remembers since when every printer is idle, so a job can be sent to the printer
+# that has been waiting longest without asking the server.
+#
+class RepetierServerMonitor(QObject):
+    _poll_interval = 10000  # in milliseconds
+    _poll_timeout = 5000  # in milliseconds
+
+    printersUpdated = pyqtSignal()
+
+    def __init__(self, base_url: str, user_agent: str = "", basic_auth_username: str = "", basic_auth_password: str = "", parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+
+        self._base_url = base_url
+        self._user_agent = user_agent.encode()
+        self._basic_auth_data = None  # type: Optional[bytes]
+        if basic_auth_username and basic_auth_password:
+            data = base64.b64encode(("%s:%s" % (basic_auth_username, basic_auth_password)).encode()).decode("utf-8")
+            self._basic_auth_data = ("basic %s" % data).encode()
+
+        self._api_key = b""
+        self._slug = ""  # any printer on the server; listPrinter returns all printers regardless
+
+        self._network_manager = QNetworkAccessManager()
+        self._reply = None  # type: Optional[QNetworkReply]
+        self._reply_timeout = None  # type: Optional[NetworkReplyTimeout]
+
+        self._printers = {}  # type: Dict[str, Dict[str, Any]]
+        self._idle_since = {}  # type: Dict[str, float]  # monotonic time, by slug
+        self._online = False
+
+        self._poll_timer = QTimer()
+        self._poll_timer.setInterval(self._poll_interval)
+        self._poll_timer.timeout.connect(self._poll)
+        self._start_timer = QTimer()
+        self._start_timer.setSingleShot(True)
+        self._start_timer.timeout.connect(self._startPolling)
+
+    def baseUrl(self) -> str:
+        return self._base_url
+
+    ##  Set the credentials to use; any printer on the server and an API key for it will do
+    def setPrinter(self, slug: str, api_key: str) -> None:
+        self._slug = slug
+        self._api_key = api_key.encode()
+
+    def setPollInterval(self, interval: int) -> None:
+        if interval != self._poll_timer.interval():
+            self._poll_timer.setInterval(interval)
+
+    ##  The connection pool of the server, to be shared with the output devices of its printers
+    def networkManager(self) -> QNetworkAccessManager:
+        return self._network_manager
+
+    def isOnline(self) -> bool:
+        return self._online
+
+    ##  The last known state of every printer on the server, by slug, as returned by listPrinter
+    def printers(self) -> Dict[str, Dict[str, Any]]:
+        return self._printers
+
+    ##  Since when a printer is idle (in monotonic time), as far as the monitor knows, or None if it is not idle
+    def idleSince(self, slug: str) -> Optional[float]:
+        return self._idle_since.get(slug)
+
+    ##  Whether a listPrinter entry describes a printer that is online and not printing
+    @staticmethod
+    def isIdle(printer: Optional[Dict[str, Any]]) -> bool:
+        return bool(printer and printer.get("online", 0) and printer.get("job", "none") == "none")
+
+    ##  Start polling the server
+    #   \param delay Time in milliseconds before the first poll, so monitors of several servers can be staggered
+    def start(self, delay: int = 0) -> None:
+        if self._poll_timer.isActive() or self._start_timer.isActive():
+            return
+        self._start_timer.setInterval(delay)
+        self._start_timer.start()
+
+    def _startPolling(self) -> None:
+        self._poll_timer.start()
+        self._poll()
+
+    def stop(self) -> None:
+        self._start_timer.stop()
+        self._poll_timer.stop()
+        if self._reply:
+            try:
+                self._reply.finished.disconnect(self._onPollFinished)
+                if self._reply.isRunning():
+                    self._reply.abort()
+            except (RuntimeError, TypeError):
+                pass  # It can happen that the wrapped c++ object is already deleted.
+            self._reply = None
+            self._reply_timeout = None
+
+    def _poll(self) -> None:
+        if not self._slug:
+            return
+        if self._reply is not None:
+            return  # the previous poll has not finished yet
+
+        request = QNetworkRequest(QUrl("%sprinter/api/%s?a=listPrinter" % (self._base_url, self._slug)))
+        request.setRawHeader(b"X-Api-Key", self._api_key)
+        request.setRawHeader(b"User-Agent", self._user_agent)
+        if self._basic_auth_data:
+            request.setRawHeader(b"Authorization", self._basic_auth_data)
+
+        # ignore SSL errors (eg for self-signed certificates)
+        ssl_configuration = QSslConfiguration.defaultConfiguration()
+        ssl_configuration.setPeerVerifyMode(QSslSocket.PeerVerifyMode.VerifyNone)
+        request.setSslConfiguration(ssl_configuration)
+
+        self._reply = self._network_manager.get(request)
+        self._reply.finished.connect(self._onPollFinished)
+        self._reply_timeout = NetworkReplyTimeout(self._reply, self._poll_timeout)
+
+    def _onPollFinished(self) -> None:
+        reply = self._reply
+        if reply is None:
+            return
+        self._reply = None
+        self._reply_timeout = None
+
+        printers = {}  # type: Dict[str, Dict[str, Any]]
+        http_status_code = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        if reply.error() == QNetworkReply.NetworkError.NoError and http_status_code == 200:
+            try:
+                json_data = json.loads(bytes(reply.readAll()).decode("utf-8"))
+            except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+                Logger.log("w", "Received invalid JSON from Repetier server %s.", self._base_url)
+                json_data = []
+            if isinstance(json_data, list):
+                for printer in json_data:
+                    if isinstance(printer, dict) and "slug" in printer:
+                        printers[printer["slug"]] = printer
+            self._online = True
+        else:
+            self._online = False
+        reply.deleteLater()
+
+        now = monotonic()
+        self._idle_since = {
+            slug: self._idle_since.get(slug, now) for slug, printer in printers.items() if self.isIdle(printer)
+        }
+
+        if printers != self._printers or not self._online:
+            self._printers = printers
+            self.printersUpdated.emit()
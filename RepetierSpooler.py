@@ -0,0 +1,113 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# RepetierSpooler is released under the terms of the AGPLv3 or higher.
+
+from UM.Logger import Logger
+
+import json
+import os
+import shutil
+
+from time import time
+from typing import Any, Dict, IO, Optional
+
+#
+# A spool on disk for the print jobs that are sent to a printer, so no job is lost when the printer is
+# offline, busy or unreachable at the moment it is sent.
+#
+# Every job is written to the spool first, and uploaded from there; it is only removed from the spool
+# when the server accepted it. Jobs that could not be uploaded stay in the spool (also when Cura is
+# restarted) and are uploaded in the order they were sent.
+#
+# A job consists of the g-code file and a small JSON file with the name and settings of the job. The
+# JSON file is written last, so a job that was not completely written is ignored. The g-code is only
+# read from disk while it is uploaded; the spool itself only keeps the settings of the jobs in memory.
+#
+class RepetierSpooler:
+    def __init__(self, folder: str) -> None:
+        self._folder = folder
+        self._jobs = []  # type: list[Dict[str, Any]]
+        self._last_job_id = ""
+
+        if os.path.isdir(folder):
+            self._readJobs()
+
+    def hasJobs(self) -> bool:
+        return bool(self._jobs)
+
+    def jobCount(self) -> int:
+        return len(self._jobs)
+
+    ##  The oldest job in the spool, or None if the spool is empty
+    def firstJob(self) -> Optional[Dict[str, Any]]:
+        return self._jobs[0] if self._jobs else None
+
+    ##  The path of the g-code file of a job
+    def getGCodePath(self, job: Dict[str, Any]) -> str:
+        return os.path.join(self._folder, job["id"] + ".gcode")
+
+    ##  Add a job to the spool
+    #   \param gcode_stream The g-code of the job; it is copied to disk in chunks
+    #   \param settings How to send the job, eg whether to print it right away or to store it
+    #   \return The job that was added
+    def addJob(self, file_name: str, gcode_stream: IO[str], settings: Dict[str, Any]) -> Dict[str, Any]:
+        os.makedirs(self._folder, exist_ok = True)
+
+        job_id = "%013d" % int(time() * 1000)
+        if job_id <= self._last_job_id:
+            job_id = "%013d" % (int(self._last_job_id) + 1)  # keep the jobs in the order they were added
+        self._last_job_id = job_id
+
+        job = dict(settings)
+        job["id"] = job_id
+        job["file_name"] = file_name
+
+        gcode_stream.seek(0)
+        with open(os.path.join(self._folder, job_id + ".gcode"), "w", encoding = "utf-8", newline = "") as gcode_file:
+            shutil.copyfileobj(gcode_stream, gcode_file)
+        job_path = os.path.join(self._folder, job_id + ".json")
+        with open(job_path + ".tmp", "w", encoding = "utf-8") as job_file:
+            json.dump(job, job_file)
+        os.replace(job_path + ".tmp", job_path)
+
+        self._jobs.append(job)
+        Logger.log("d", "Spooled print job %s as %s", file_name, job_id)
+        return job
+
+    ##  Remove a job from the spool, eg because it was uploaded
+    def removeJob(self, job: Dict[str, Any]) -> None:
+        self._jobs = [spooled_job for spooled_job in self._jobs if spooled_job["id"] != job["id"]]
+        for extension in (".json", ".gcode"):
+            try:
+                os.remove(os.path.join(self._folder, job["id"] + extension))
+            except OSError:
+                pass
+
+    def _readJobs(self) -> None:
+        job_ids = set()
+        for entry in sorted(os.listdir(self._folder)):
+            (job_id, extension) = os.path.splitext(entry)
+            if extension != ".json":
+                continue
+            try:
+                with open(os.path.join(self._folder, entry), encoding = "utf-8") as job_file:
+                    job = json.load(job_file)
+            except (OSError, ValueError):
+                Logger.log("w", "Could not read spooled print job %s", entry)
+                continue
+            if not isinstance(job, dict) or job.get("id") != job_id or not os.path.isfile(os.path.join(self._folder, job_id + ".gcode")):
+                continue
+            self._jobs.append(job)
+            job_ids.add(job_id)
+            self._last_job_id = max(self._last_job_id, job_id)
+
+        # Remove g-code of jobs that were not completely written
+        for entry in os.listdir(self._folder):
+            (job_id, extension) = os.path.splitext(entry)
+            if job_id not in job_ids and extension in (".gcode", ".tmp"):
+                try:
+                    os.remove(os.path.join(self._folder, entry))
+                except OSError:
+                    pass
+
+        if self._jobs:
+            Logger.log("i", "Found %d spooled print jobs in %s", len(self._jobs), self._folder)
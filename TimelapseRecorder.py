@@ -0,0 +1,194 @@
+# Copyright (c) 2020 Aldo Hoeben / fieldOfView & Shane Bumpurs
+# TimelapseRecorder is released under the terms of the LGPLv3 or higher.
+
+import os
+import queue
+import re
+import threading
+
+from PyQt6.QtCore import QObject, QUrl, QSize
+
+from UM.Logger import Logger
+
+from .NetworkMJPGStream import NetworkMJPGStream
+
+from time import monotonic, strftime
+from typing import Optional
+
+#
+# Records the frames of a camera to disk, for instance to find out afterwards why a print failed.
+#
+# The jpeg frames are written exactly as they were received from the camera, without decoding
+# or encoding them again. Frames are concatenated into .mjpeg files, which most video tools
+# (eg ffmpeg, VLC) can read as is. When a file grows too large, recording continues in the
+# next file of the set; the oldest files are removed when the set grows beyond its maximum size.
+#
+# A frame is recorded at a fixed interval, or (with an interval of 0) whenever captureFrame()
+# is called, for instance on every layer change.
+#
+# The files are written by a background thread, so a slow disk never blocks the GUI. If the
+# disk can not keep up, frames are dropped instead of buffered without limit.
+#
+class TimelapseRecorder(QObject):
+    _maximum_file_size = 64 * 1024 * 1024  # in bytes, before recording continues in the next file
+    _maximum_file_count = 16  # files per recording, before the oldest file is removed
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+
+        self._stream = None  # type: Optional[NetworkMJPGStream]
+        self._writer = None  # type: Optional[_TimelapseWriter]
+
+        self._interval = 0.0  # in seconds, 0 means only record frames when captureFrame() is called
+        self._capture_pending = False
+        self._last_capture_time = 0.0
+
+    ##  Time between recorded frames in seconds; 0 to only record when captureFrame() is called
+    def setInterval(self, interval: float) -> None:
+        self._interval = max(0.0, interval)
+        self._updateStreamOptions()
+
+    def interval(self) -> float:
+        return self._interval
+
+    def isRecording(self) -> bool:
+        return self._stream is not None
+
+    ##  Start a new recording
+    #   \param folder The folder to create the files of the recording in
+    #   \param name Name of the recording, eg the name of the print job
+    def start(self, source_url: QUrl, snapshot_url: Optional[QUrl], folder: str, name: str) -> None:
+        self.stop()
+
+        try:
+            os.makedirs(folder, exist_ok = True)
+        except OSError as e:
+            Logger.log("w", "Could not create timelapse folder %s: %s", folder, str(e))
+            return
+
+        safe_name = re.sub(r"[^\w\-. ]", "_", name).strip() or "timelapse"
+        base_path = os.path.join(folder, "%s_%s" % (safe_name, strftime("%Y%m%d-%H%M%S")))
+        Logger.log("i", "Recording timelapse to %s", base_path)
+
+        self._writer = _TimelapseWriter(base_path, self._maximum_file_size, self._maximum_file_count)
+        self._writer.start()
+
+        self._capture_pending = True  # record the first frame that arrives
+        self._last_capture_time = 0.0
+        self._stream = NetworkMJPGStream.acquire(self, source_url, snapshot_url)
+        self._stream.jpegReceived.connect(self._onJpegReceived)
+        self._updateStreamOptions()
+
+    def stop(self) -> None:
+        if self._stream:
+            try:
+                self._stream.jpegReceived.disconnect(self._onJpegReceived)
+            except TypeError:
+                pass
+            self._stream.release(self)
+            self._stream = None
+
+        if self._writer:
+            # The writer closes its file when it has written the frames it still has; don't wait for that
+            self._writer.close()
+            self._writer = None
+
+    ##  Record the next frame, regardless of the interval
+    def captureFrame(self) -> None:
+        self._capture_pending = True
+
+    def _onJpegReceived(self, jpg_data: bytes) -> None:
+        if self._writer is None:
+            return
+
+        now = monotonic()
+        if not self._capture_pending and (self._interval == 0 or now - self._last_capture_time < self._interval):
+            return
+        self._capture_pending = False
+        self._last_capture_time = now
+
+        self._writer.write(jpg_data)
+
+    ##  The recorder only needs the raw frames; it does not need them to be decoded
+    def _updateStreamOptions(self) -> None:
+        if not self._stream:
+            return
+        self._stream.setSubscriberOptions(self, QSize(), 0.0, round(self._interval * 1000), decode = False)
+
+
+##  Writes frames to a set of files on a background thread
+class _TimelapseWriter(threading.Thread):
+    _maximum_queued_frames = 100
+
+    def __init__(self, base_path: str, maximum_file_size: int, maximum_file_count: int) -> None:
+        super().__init__(daemon = True)
+
+        self._base_path = base_path
+        self._maximum_file_size = maximum_file_size
+        self._maximum_file_count = maximum_file_count
+
+        self._queue = queue.Queue(maxsize = self._maximum_queued_frames)  # type: queue.Queue
+        self._dropped_frames = 0
+        self._file_paths = []  # type: list[str]
+        self._file_index = 0
+
+    ##  Queue a frame to be written; never blocks
+    def write(self, jpg_data: bytes) -> None:
+        try:
+            self._queue.put_nowait(jpg_data)
+        except queue.Full:
+            self._dropped_frames += 1
+
+    ##  Stop the thread after the queued frames are written; never blocks
+    def close(self) -> None:
+        while True:
+            try:
+                self._queue.put_nowait(None)
+                return
+            except queue.Full:
+                # Make room for the end marker; losing the last frame is better than blocking
+                try:
+                    self._queue.get_nowait()
+                    self._dropped_frames += 1
+                except queue.Empty:
+                    pass
+
+    def run(self) -> None:
+        file = None
+        file_size = 0
+        try:
+            while True:
+                jpg_data = self._queue.get()
+                if jpg_data is None:
+                    break
+
+                if file is None or file_size + len(jpg_data) > self._maximum_file_size:
+                    if file is not None:
+                        file.close()
+                    file = self._openNextFile()
+                    file_size = 0
+
+                file.write(jpg_data)
+                file_size += len(jpg_data)
+        except OSError as e:
+            Logger.log("w", "Could not write timelapse frames to %s: %s", self._base_path, str(e))
+        finally:
+            if file is not None:
+                file.close()
+
+        if self._dropped_frames:
+            Logger.log("w", "Dropped %d timelapse frames because they could not be written fast enough", self._dropped_frames)
+
+    def _openNextFile(self):
+        self._file_index += 1
+        file_path = "%s_%03d.mjpeg" % (self._base_path, self._file_index)
+        self._file_paths.append(file_path)
+
+        if len(self._file_paths) > self._maximum_file_count:
+            oldest_file_path = self._file_paths.pop(0)
+            try:
+                os.remove(oldest_file_path)
+            except OSError:
+                pass
+
+        return open(file_path, "wb", buffering = 1024 * 1024)
@@ -10,6 +10,8 @@ Component
 
     Item
     {
+        UM.I18nCatalog { id: catalog; name: "repetier" }
+
         RepetierIntegration.NetworkMJPGImage
         {
             id: cameraImage
@@ -17,44 +19,16 @@ Component
 
             property real maximumWidthMinusSidebar: maximumWidth - sidebar.width - 2 * UM.Theme.getSize("default_margin").width
             property real maximumZoom: 2
-            property bool rotatedImage: (OutputDevice.cameraOrientation.rotation / 90) % 2
             property bool proportionalHeight:
             {
                 if (imageHeight == 0 || maximumHeight == 0)
                 {
                     return true;
                 }
-                if (!rotatedImage)
-                {
-                    return (imageWidth / imageHeight) > (maximumWidthMinusSidebar / maximumHeight);
-                }
-                else
-                {
-                    return (imageWidth / imageHeight) > (maximumHeight / maximumWidthMinusSidebar);
-                }
-            }
-            property real _width:
-            {
-                if (!rotatedImage)
-                {
-                    return Math.min(maximumWidthMinusSidebar, imageWidth * screenScaleFactor * maximumZoom);
-                }
-                else
-                {
-                    return Math.min(maximumHeight, imageWidth * screenScaleFactor * maximumZoom);
-                }
-            }
-            property real _height:
-            {
-                if (!rotatedImage)
-                {
-                    return Math.min(maximumHeight, imageHeight * screenScaleFactor * maximumZoom);
-                }
-                else
-                {
-                    return Math.min(maximumWidth, imageHeight * screenScaleFactor * maximumZoom);
-                }
+                return (imageWidth / imageHeight) > (maximumWidthMinusSidebar / maximumHeight);
             }
+            property real _width: Math.min(maximumWidthMinusSidebar, imageWidth * screenScaleFactor * maximumZoom)
+            property real _height: Math.min(maximumHeight, imageHeight * screenScaleFactor * maximumZoom)
             width: proportionalHeight ? _width : imageWidth * _height / imageHeight
             height: !proportionalHeight ? _height : imageHeight * _width / imageWidth
             anchors.horizontalCenter: horizontalCenterItem.horizontalCenter
@@ -78,9 +52,368 @@ Component
                 }
             }
             source: OutputDevice.cameraUrl
+            snapshotSource: OutputDevice.cameraSnapshotUrl
+            snapshotMode: OutputDevice.cameraSnapshotMode
+            snapshotInterval: OutputDevice.cameraSnapshotInterval
 
-            rotation: OutputDevice.cameraOrientation.rotation
+            imageRotation: OutputDevice.cameraOrientation.rotation
             mirror: OutputDevice.cameraOrientation.mirror
+            maximumFps: OutputDevice.cameraMaximumFps
+        }
+
+        UM.Label
+        {
+            id: timelapseStatus
+            anchors.left: cameraImage.left
+            anchors.bottom: cameraImage.bottom
+            anchors.margins: UM.Theme.getSize("default_margin").width
+            // The timelapse is recorded by the output device; this only shows that it is
+            visible: cameraImage.visible && OutputDevice != null && OutputDevice.timelapseRecording
+            text: catalog.i18nc("@info:status", "Recording timelapse")
+        }
+
+        UM.Label
+        {
+            id: cameraStatus
+            anchors.horizontalCenter: horizontalCenterItem.horizontalCenter
+            anchors.verticalCenter: parent.verticalCenter
+            visible: cameraImage.visible && (cameraImage.connectionHealth == "connecting" || cameraImage.connectionHealth == "reconnecting")
+            text:
+            {
+                if (cameraImage.connectionHealth == "reconnecting")
+                {
+                    return catalog.i18nc("@info:status", "The webcam stream was interrupted, reconnecting...");
+                }
+                return catalog.i18nc("@info:status", "Connecting to the webcam...");
+            }
+        }
+
+        Cura.ComboBox
+        {
+            id: cameraSelector
+            anchors.top: parent.top
+            anchors.topMargin: UM.Theme.getSize("default_margin").height
+            anchors.horizontalCenter: horizontalCenterItem.horizontalCenter
+            width: UM.Theme.getSize("setting_control").width
+            height: UM.Theme.getSize("setting_control").height
+
+            // Only the selected webcam is streamed; the others are not connected to
+            visible: OutputDevice != null && OutputDevice.showCamera && OutputDevice.cameras.count > 1
+            model: OutputDevice != null ? OutputDevice.cameras : null
+            textRole: "name"
+            currentIndex: OutputDevice != null ? OutputDevice.activeCameraIndex : 0
+            onActivated: OutputDevice.setActiveCameraIndex(index)
+        }
+
+        Cura.SecondaryButton
+        {
+            id: storedModelsButton
+            anchors.top: parent.top
+            anchors.topMargin: UM.Theme.getSize("default_margin").height
+            anchors.left: parent.left
+            anchors.leftMargin: UM.Theme.getSize("default_margin").width
+            visible: OutputDevice != null && OutputDevice.modelLibrary != null
+            text: catalog.i18nc("@action:button", "Stored models...")
+            onClicked:
+            {
+                OutputDevice.modelLibrary.refresh();
+                storedModelsPopup.open();
+            }
+        }
+
+        Popup
+        {
+            id: storedModelsPopup
+            x: storedModelsButton.x
+            y: storedModelsButton.y + storedModelsButton.height + UM.Theme.getSize("default_margin").height
+            width: UM.Theme.getSize("print_setup_widget").width
+            height: parent.height / 2
+            padding: UM.Theme.getSize("default_margin").width
+
+            property var library: OutputDevice != null ? OutputDevice.modelLibrary : null
+
+            background: Cura.RoundedRectangle
+            {
+                color: UM.Theme.getColor("main_background")
+                border.width: UM.Theme.getSize("default_lining").width
+                border.color: UM.Theme.getColor("lining")
+                radius: UM.Theme.getSize("default_radius").width
+            }
+
+            Column
+            {
+                anchors.fill: parent
+                spacing: UM.Theme.getSize("default_margin").height
+
+                Row
+                {
+                    width: parent.width
+                    spacing: UM.Theme.getSize("default_margin").width
+
+                    Cura.ComboBox
+                    {
+                        id: storedModelsGroup
+                        width: parent.width - storedModelsReload.width - parent.spacing
+                        height: UM.Theme.getSize("setting_control").height
+                        model: storedModelsPopup.library != null ? [catalog.i18nc("@item:inlistbox", "All groups")].concat(storedModelsPopup.library.groups) : []
+                        onActivated: storedModelsPopup.library.setGroup(index == 0 ? "" : storedModelsPopup.library.groups[index - 1])
+                    }
+
+                    Cura.SecondaryButton
+                    {
+                        id: storedModelsReload
+                        text: catalog.i18nc("@action:button", "Reload")
+                        enabled: storedModelsPopup.library != null && !storedModelsPopup.library.loading
+                        onClicked: storedModelsPopup.library.reload()
+                    }
+                }
+
+                Cura.TextField
+                {
+                    id: storedModelsSearch
+                    width: parent.width
+                    placeholderText: catalog.i18nc("@label:textbox", "Search, eg: bracket group:fixtures after:2024-01-01 smaller:5")
+                    text: storedModelsPopup.library != null ? storedModelsPopup.library.searchText : ""
+                    onTextChanged:
+                    {
+                        if (storedModelsPopup.library != null)
+                        {
+                            storedModelsPopup.library.setSearchText(text);
+                        }
+                    }
+                }
+
+                ListView
+                {
+                    id: storedModelsList
+                    width: parent.width
+                    height: parent.height - storedModelsGroup.height - storedModelsSearch.height - storedModelsPaging.height - 3 * parent.spacing
+                    clip: true
+                    ScrollBar.vertical: UM.ScrollBar {}
+                    model: storedModelsPopup.library
+
+                    delegate: Item
+                    {
+                        width: storedModelsList.width
+                        height: storedModelPrintButton.height + UM.Theme.getSize("narrow_margin").height
+
+                        UM.Label
+                        {
+                            anchors.left: parent.left
+                            anchors.right: storedModelPrintButton.left
+                            anchors.rightMargin: UM.Theme.getSize("default_margin").width
+                            anchors.verticalCenter: parent.verticalCenter
+                            elide: Text.ElideRight
+                            text: model.group != "" ? "%1 (%2)".arg(model.name).arg(model.group) : model.name
+                        }
+
+                        Cura.SecondaryButton
+                        {
+                            id: storedModelPrintButton
+                            anchors.right: parent.right
+                            anchors.verticalCenter: parent.verticalCenter
+                            text: catalog.i18nc("@action:button", "Print")
+                            enabled: OutputDevice.acceptsCommands
+                            onClicked: OutputDevice.printStoredModel(model.id)
+                        }
+                    }
+                }
+
+                Row
+                {
+                    id: storedModelsPaging
+                    spacing: UM.Theme.getSize("default_margin").width
+
+                    Cura.SecondaryButton
+                    {
+                        text: "<"
+                        enabled: storedModelsPopup.library != null && storedModelsPopup.library.page > 0
+                        onClicked: storedModelsPopup.library.setPage(storedModelsPopup.library.page - 1)
+                    }
+
+                    UM.Label
+                    {
+                        anchors.verticalCenter: parent.verticalCenter
+                        text: storedModelsPopup.library != null ? catalog.i18nc("@label", "Page %1 of %2 (%3 models)").arg(storedModelsPopup.library.page + 1).arg(storedModelsPopup.library.pageCount).arg(storedModelsPopup.library.totalCount) : ""
+                    }
+
+                    Cura.SecondaryButton
+                    {
+                        text: ">"
+                        enabled: storedModelsPopup.library != null && storedModelsPopup.library.page < storedModelsPopup.library.pageCount - 1
+                        onClicked: storedModelsPopup.library.setPage(storedModelsPopup.library.page + 1)
+                    }
+                }
+            }
+        }
+
+        Cura.SecondaryButton
+        {
+            id: jobQueueButton
+            anchors.top: storedModelsButton.top
+            anchors.left: storedModelsButton.right
+            anchors.leftMargin: UM.Theme.getSize("default_margin").width
+            visible: OutputDevice != null && OutputDevice.jobQueue != null
+            text: catalog.i18nc("@action:button", "Job queue...")
+            onClicked: jobQueuePopup.open()
+        }
+
+        Popup
+        {
+            id: jobQueuePopup
+            x: jobQueueButton.x
+            y: jobQueueButton.y + jobQueueButton.height + UM.Theme.getSize("default_margin").height
+            width: UM.Theme.getSize("print_setup_widget").width
+            height: parent.height / 2
+            padding: UM.Theme.getSize("default_margin").width
+
+            property var queue: OutputDevice != null ? OutputDevice.jobQueue : null
+
+            // The queue is only synchronised while it is shown
+            onOpened: queue.setActive(true)
+            onClosed: queue.setActive(false)
+
+            background: Cura.RoundedRectangle
+            {
+                color: UM.Theme.getColor("main_background")
+                border.width: UM.Theme.getSize("default_lining").width
+                border.color: UM.Theme.getColor("lining")
+                radius: UM.Theme.getSize("default_radius").width
+            }
+
+            Column
+            {
+                anchors.fill: parent
+                spacing: UM.Theme.getSize("default_margin").height
+
+                ListView
+                {
+                    id: jobQueueList
+                    width: parent.width
+                    height: parent.height - jobQueueStartButton.height - parent.spacing
+                    clip: true
+                    ScrollBar.vertical: UM.ScrollBar {}
+                    model: jobQueuePopup.queue
+
+                    delegate: Item
+                    {
+                        width: jobQueueList.width
+                        height: jobRemoveButton.height + UM.Theme.getSize("narrow_margin").height
+
+                        UM.Label
+                        {
+                            anchors.left: parent.left
+                            anchors.right: jobUpButton.left
+                            anchors.rightMargin: UM.Theme.getSize("default_margin").width
+                            anchors.verticalCenter: parent.verticalCenter
+                            elide: Text.ElideRight
+                            text: model.name
+                        }
+
+                        Cura.SecondaryButton
+                        {
+                            id: jobUpButton
+                            anchors.right: jobDownButton.left
+                            anchors.verticalCenter: parent.verticalCenter
+                            text: "\u25B2"
+                            enabled: index > 0
+                            onClicked: jobQueuePopup.queue.moveJob(model.id, index - 1)
+                        }
+
+                        Cura.SecondaryButton
+                        {
+                            id: jobDownButton
+                            anchors.right: jobRemoveButton.left
+                            anchors.verticalCenter: parent.verticalCenter
+                            text: "\u25BC"
+                            enabled: index < jobQueueList.count - 1
+                            onClicked: jobQueuePopup.queue.moveJob(model.id, index + 1)
+                        }
+
+                        Cura.SecondaryButton
+                        {
+                            id: jobRemoveButton
+                            anchors.right: parent.right
+                            anchors.verticalCenter: parent.verticalCenter
+                            text: catalog.i18nc("@action:button", "Remove")
+                            onClicked: jobQueuePopup.queue.removeJob(model.id)
+                        }
+                    }
+                }
+
+                Cura.SecondaryButton
+                {
+                    id: jobQueueStartButton
+                    text: catalog.i18nc("@action:button", "Start next job")
+                    enabled: OutputDevice.acceptsCommands && jobQueueList.count > 0 && OutputDevice.activePrinter != null && OutputDevice.activePrinter.activePrintJob != null && OutputDevice.activePrinter.activePrintJob.state != "printing" && OutputDevice.activePrinter.activePrintJob.state != "paused"
+                    onClicked: jobQueuePopup.queue.startNext()
+                }
+            }
+        }
+
+        ListView
+        {
+            id: farmOverview
+            anchors
+            {
+                left: parent.left
+                leftMargin: UM.Theme.getSize("default_margin").width
+                bottom: parent.bottom
+                bottomMargin: UM.Theme.getSize("default_margin").height
+            }
+            width: UM.Theme.getSize("print_setup_widget").width
+            height: Math.min(contentHeight, parent.height / 3)
+            clip: true
+            interactive: contentHeight > height
+
+            // Only shown when the printers are monitored in the background
+            visible: OutputDevice != null && OutputDevice.farmPrinters != null && count > 1
+            model: (OutputDevice != null && OutputDevice.farmPrinters != null) ? OutputDevice.farmPrinters : null
+
+            delegate: Cura.RoundedRectangle
+            {
+                width: farmOverview.width
+                height: farmPrinterLabel.height + UM.Theme.getSize("default_margin").height
+                color: model.active ? UM.Theme.getColor("secondary") : UM.Theme.getColor("main_background")
+                border.width: UM.Theme.getSize("default_lining").width
+                border.color: UM.Theme.getColor("lining")
+                radius: UM.Theme.getSize("default_radius").width
+
+                UM.Label
+                {
+                    id: farmPrinterLabel
+                    anchors.left: parent.left
+                    anchors.leftMargin: UM.Theme.getSize("default_margin").width
+                    anchors.right: farmStateLabel.left
+                    anchors.verticalCenter: parent.verticalCenter
+                    elide: Text.ElideRight
+                    text: model.name
+                }
+
+                UM.Label
+                {
+                    id: farmStateLabel
+                    anchors.right: parent.right
+                    anchors.rightMargin: UM.Theme.getSize("default_margin").width
+                    anchors.verticalCenter: parent.verticalCenter
+                    text:
+                    {
+                        if (model.state != "printing" && model.state != "paused")
+                        {
+                            return model.state;
+                        }
+                        var minutes = Math.round(model.timeRemaining / 60);
+                        return "%1 %2% - %3:%4".arg(model.state).arg(Math.round(model.progress)).arg(Math.floor(minutes / 60)).arg(("0" + (minutes % 60)).slice(-2));
+                    }
+                }
+
+                MouseArea
+                {
+                    anchors.fill: parent
+                    enabled: !model.active
+                    onClicked: Cura.MachineManager.setActiveMachine(model.instanceId)
+                }
+            }
         }
 
         Item